@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import HomeData, MonthlyTarget
+from .models import HomeData, MonthlyTarget, DailyRollup, MonthlyRollup, ArchivedMonth, DetachedMonth
 
 # Django管理画面の設定
 # モデルの表示方法や検索・フィルタリング機能を定義
@@ -18,3 +18,30 @@ class MonthlyTargetAdmin(admin.ModelAdmin):
     list_display = ('user', 'year_month', 'target_acquisition')
     list_filter = ('year_month', 'user')
     search_fields = ('user__username',)
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    """日別集計の管理画面設定（HomeDataから自動更新されるため参照用）"""
+    list_display = ('user', 'date', 'catch_count', 'acquisition_count')
+    list_filter = ('user',)
+    search_fields = ('user__username',)
+    date_hierarchy = 'date'
+
+@admin.register(MonthlyRollup)
+class MonthlyRollupAdmin(admin.ModelAdmin):
+    """月別集計の管理画面設定（HomeDataから自動更新されるため参照用）"""
+    list_display = ('user', 'year_month', 'catch_count', 'acquisition_count')
+    list_filter = ('year_month', 'user')
+    search_fields = ('user__username',)
+
+@admin.register(ArchivedMonth)
+class ArchivedMonthAdmin(admin.ModelAdmin):
+    """アーカイブ済みの月の管理画面設定（archive_months/restore_archiveコマンドで更新されるため参照用）"""
+    list_display = ('user', 'year_month', 'row_count', 'archived_at')
+    list_filter = ('year_month', 'user')
+    search_fields = ('user__username',)
+
+@admin.register(DetachedMonth)
+class DetachedMonthAdmin(admin.ModelAdmin):
+    """パーティションを切り離した月の管理画面設定（detach_partitionコマンドで更新されるため参照用）"""
+    list_display = ('year_month', 'table_name', 'dropped', 'detached_at')
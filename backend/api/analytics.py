@@ -0,0 +1,273 @@
+# 営業実績の指標計算（NumPyによるベクトル演算）
+# 比率・進捗・月末予測などの指標を配列単位でまとめて計算する
+# 月間サマリーAPI（1ユーザー分）と管理者向けの一括集計（多数ユーザー×複数月、monthly_reportコマンド）で共通して使用
+
+from calendar import monthrange
+
+import numpy as np
+
+from . import archive
+from .models import COUNTER_FIELDS, DailyRollup, MonthlyTarget
+
+# 指標名と行列の列番号の対応
+FIELD_INDEX = {field: index for index, field in enumerate(COUNTER_FIELDS)}
+
+# 比率名と分子の指標（分母はいずれも電話応対数 catch_count）
+RATE_NUMERATORS = {
+    're_call_rate': 're_call_count',
+    'prospective_rate': 'prospective_count',
+    'approach_ng_rate': 'approach_ng_count',
+    'product_ng_rate': 'product_explanation_ng_count',
+    'acquisition_rate': 'acquisition_count',
+}
+
+
+def round1(values):
+    """
+    小数第1位への丸めをPythonのround(x, 1)と同じ結果で配列に適用
+    np.roundはx*10の丸め誤差により63.15→63.2のように結果が異なる場合があるため、
+    乗算の誤差を求めてちょうど0.5になる場合のみ真の値で切り上げ／切り捨てを判定する
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * 10
+    # Dekkerの分割で values * 10 の丸め誤差を算出
+    split = values * 134217729.0
+    high = split - (split - values)
+    low = values - high
+    error = (high * 10 - scaled) + low * 10
+
+    rounded = np.rint(scaled)  # 偶数丸め（真の値がちょうど0.5の場合もPythonと同じ）
+    floor = np.floor(scaled)
+    tie = (scaled - floor) == 0.5
+    rounded = np.where(tie & (error > 0), floor + 1, rounded)
+    rounded = np.where(tie & (error < 0), floor, rounded)
+    return rounded / 10
+
+
+class CounterMatrix:
+    """
+    (ユーザー, 日付, 7指標) の行列
+    user_ids・datesは行ごとの値、countsは行×指標（COUNTER_FIELDSの順）の整数配列
+    """
+    def __init__(self, user_ids, dates, counts):
+        self.user_ids = user_ids
+        self.dates = dates
+        self.counts = counts
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def month_keys(self):
+        """各行の年月（YYYY-MM）"""
+        return np.datetime_as_string(self.dates.astype('datetime64[M]'))
+
+    def group_totals(self, *keys):
+        """
+        キー配列の組み合わせごとに指標を合計
+        戻り値は（キーの組み合わせのリスト, グループ×指標の合計配列）
+        """
+        if not len(self):
+            return [], np.zeros((0, len(COUNTER_FIELDS)), dtype=np.int64)
+        records = np.rec.fromarrays(keys)
+        groups, inverse = np.unique(records, return_inverse=True)
+        totals = np.zeros((len(groups), len(COUNTER_FIELDS)), dtype=np.int64)
+        np.add.at(totals, inverse.ravel(), self.counts)
+        return [tuple(group) for group in groups.tolist()], totals
+
+
+def load_matrix(user_ids=None, date_from=None, date_to=None):
+    """
+    日別集計テーブルから (ユーザー, 日付, 7指標) の行列を1回のクエリで読み込む
+    アーカイブ済みの月の行はアーカイブファイルから読み込んで結合する（ユーザーID・日付順）
+    date_toは含まない（date_from <= 日付 < date_to）
+    """
+    queryset = DailyRollup.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    if date_from is not None:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(date__lt=date_to)
+
+    rows = list(queryset.order_by('user_id', 'date').values_list('user_id', 'date', *COUNTER_FIELDS))
+    if rows:
+        columns = list(zip(*rows))
+        matrix = CounterMatrix(
+            np.array(columns[0], dtype=np.int64),
+            np.array(columns[1], dtype='datetime64[D]'),
+            np.array(columns[2:], dtype=np.int64).T,
+        )
+    else:
+        matrix = CounterMatrix(
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0, dtype='datetime64[D]'),
+            np.zeros((0, len(COUNTER_FIELDS)), dtype=np.int64),
+        )
+
+    archived = list(archive.iter_columns(user_ids, date_from, date_to))
+    if not archived:
+        return matrix
+    user_column = np.concatenate(
+        [matrix.user_ids] + [np.full(len(columns['date']), item.user_id, dtype=np.int64) for item, columns in archived]
+    )
+    date_column = np.concatenate([matrix.dates] + [columns['date'] for _, columns in archived])
+    counts = np.concatenate([matrix.counts] + [
+        np.column_stack([columns[field] for field in COUNTER_FIELDS]).astype(np.int64) for _, columns in archived
+    ])
+    order = np.lexsort((date_column, user_column))
+    return CounterMatrix(user_column[order], date_column[order], counts[order])
+
+
+def rate_arrays(counts):
+    """
+    行×指標の配列から電話応対数に対する各種比率（%、小数第1位で四捨五入）を計算
+    電話応対数が0の行は0とする
+    """
+    counts = np.atleast_2d(np.asarray(counts, dtype=np.float64))
+    catch = counts[:, FIELD_INDEX['catch_count']]
+    has_catch = catch > 0
+    safe_catch = np.where(has_catch, catch, 1)
+    return {
+        name: np.where(has_catch, round1(counts[:, FIELD_INDEX[field]] / safe_catch * 100), 0)
+        for name, field in RATE_NUMERATORS.items()
+    }, has_catch
+
+
+def month_days(year, month, today):
+    """
+    月の日数（最低30日）と経過日数
+    当月は今日の日付、過去月は月の日数、未来月は0を経過日数とする
+    """
+    num_days = max(monthrange(year, month)[1], 30)
+    if (year, month) < (today.year, today.month):
+        return num_days, num_days
+    if (year, month) > (today.year, today.month):
+        return num_days, 0
+    return num_days, max(today.day, 1)
+
+
+def pacing_arrays(acquisition, catch, target, num_days, current_day):
+    """
+    目標に対する進捗と月末予測を計算（引数はいずれも配列またはスカラー）
+    戻り値の各値は小数第1位で四捨五入済みの配列
+    """
+    acquisition = np.asarray(acquisition, dtype=np.float64)
+    catch = np.asarray(catch, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    num_days = np.asarray(num_days, dtype=np.float64)
+    current_day = np.asarray(current_day, dtype=np.float64)
+
+    def divide(numerator, denominator):
+        """ゼロ除算の場合は0"""
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), 0)
+
+    # 獲得率（丸めた値を必要キャッチ数の計算にも使用）
+    acquisition_rate = np.where(catch > 0, round1(divide(acquisition, catch) * 100), 0)
+    # 一日あたりの必要獲得数・必要キャッチ数
+    daily_required_acquisition = divide(target, num_days)
+    daily_required_catch = divide(daily_required_acquisition * 100, acquisition_rate)
+    # 進捗率（時間経過に対する目標達成率）
+    time_progress = divide(current_day, num_days)
+    progress_rate = divide(divide(acquisition, target), time_progress) * 100
+    # 仮想進捗件数（時間経過に応じた理想的な獲得数）
+    virtual_progress_count = time_progress * target
+    # 一日あたり平均獲得数と月末獲得予測
+    average_daily_acquisition = divide(acquisition, current_day)
+    predicted_month_end_acquisition = average_daily_acquisition * num_days
+
+    return {
+        'daily_required_acquisition': round1(daily_required_acquisition),
+        'daily_required_catch': round1(daily_required_catch),
+        'progress_rate': round1(progress_rate),
+        'virtual_progress_count': round1(virtual_progress_count),
+        'average_daily_acquisition': round1(average_daily_acquisition),
+        'predicted_month_end_acquisition': round1(predicted_month_end_acquisition),
+    }, acquisition_rate > 0
+
+
+def rates(values):
+    """
+    集計行の値（指標名をキーとする辞書）から各種比率を計算（1行分）
+    電話応対数が0の場合はAPIの従来の値に合わせて整数の0を返す
+    """
+    counts = [[values.get(field) or 0 for field in COUNTER_FIELDS]]
+    results, has_catch = rate_arrays(counts)
+    if not has_catch[0]:
+        return dict.fromkeys(RATE_NUMERATORS, 0)
+    return {name: float(array[0]) for name, array in results.items()}
+
+
+def pacing(acquisition, catch, target, today):
+    """当月の進捗・予測指標を計算（1ユーザー分）"""
+    num_days, current_day = month_days(today.year, today.month, today)
+    results, has_rate = pacing_arrays(acquisition, catch, target, num_days, current_day)
+    values = {name: float(array) for name, array in results.items()}
+    if not has_rate:
+        # 獲得率が0の場合の必要キャッチ数は従来どおり整数の0
+        values['daily_required_catch'] = 0
+    return values
+
+
+def monthly_report(year_months, today, user_ids=None):
+    """
+    複数ユーザー×複数月の月間指標を一括計算（管理者向けレポート用）
+    year_monthsは 'YYYY-MM' のリスト。データも目標もないユーザー・月は含まない
+    戻り値はユーザーID・年月順の辞書のリスト
+    """
+    if not year_months:
+        return []
+    months = sorted(set(year_months))
+    first_year, first_month = (int(part) for part in months[0].split('-'))
+    last_year, last_month = (int(part) for part in months[-1].split('-'))
+    date_from = np.datetime64(f'{first_year}-{first_month:02}', 'M').astype('datetime64[D]')
+    date_to = (np.datetime64(f'{last_year}-{last_month:02}', 'M') + 1).astype('datetime64[D]')
+
+    matrix = load_matrix(user_ids, date_from.item(), date_to.item())
+    keys, totals = matrix.group_totals(matrix.user_ids, matrix.month_keys())
+    totals_by_key = {
+        (int(user_id), str(year_month)): totals[index]
+        for index, (user_id, year_month) in enumerate(keys)
+        if str(year_month) in months
+    }
+
+    targets = MonthlyTarget.objects.filter(year_month__in=months)
+    if user_ids is not None:
+        targets = targets.filter(user_id__in=user_ids)
+    target_by_key = {
+        (user_id, year_month): target or 0
+        for user_id, year_month, target in targets.values_list('user_id', 'year_month', 'target_acquisition')
+    }
+
+    report_keys = sorted(set(totals_by_key) | set(target_by_key))
+    if not report_keys:
+        return []
+
+    zero = np.zeros(len(COUNTER_FIELDS), dtype=np.int64)
+    counts = np.array([totals_by_key.get(key, zero) for key in report_keys], dtype=np.int64)
+    target = np.array([target_by_key.get(key, 0) for key in report_keys], dtype=np.int64)
+    days = np.array([
+        month_days(*(int(part) for part in year_month.split('-')), today)
+        for _, year_month in report_keys
+    ])
+
+    rate_values, _ = rate_arrays(counts)
+    pacing_values, _ = pacing_arrays(
+        counts[:, FIELD_INDEX['acquisition_count']],
+        counts[:, FIELD_INDEX['catch_count']],
+        target,
+        days[:, 0],
+        days[:, 1],
+    )
+
+    report = []
+    for index, (user_id, year_month) in enumerate(report_keys):
+        row = {
+            'user_id': user_id,
+            'year_month': year_month,
+            'target_acquisition': int(target[index]),
+            **{field: int(counts[index, column]) for field, column in FIELD_INDEX.items()},
+        }
+        row.update({name: float(values[index]) for name, values in rate_values.items()})
+        row.update({name: float(values[index]) for name, values in pacing_values.items()})
+        report.append(row)
+    return report
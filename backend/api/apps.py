@@ -10,8 +10,14 @@ class ApiConfig(AppConfig):
     
     Djangoアプリケーション設定を定義
     自動フィールドの種類とアプリ名を指定
+    起動時にシグナルハンドラーを登録
     """
     # デフォルトの主キーフィールドタイプ
     default_auto_field = 'django.db.models.BigAutoField'
     # アプリケーション名
     name = 'api'
+
+
+    def ready(self):
+        # シグナルハンドラーの登録
+        from . import signals  # noqa: F401
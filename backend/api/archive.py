@@ -0,0 +1,200 @@
+# 過去月の営業データのアーカイブ
+# 締め済みの月の生データ（HomeData）をユーザー・月ごとに列指向の圧縮ファイル（.npz、指標ごとに1列）へ移し、
+# テーブルからは削除する。月別の合計はMonthlyRollupに残し、日別の値はファイルから読み取る
+
+import datetime
+import os
+import tempfile
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import leaderboard, summary_cache
+from .models import COUNTER_FIELDS, ArchivedMonth, DailyRollup, HomeData, MonthlyRollup, month_bounds
+from .rollups import refresh_dates, year_month_of
+
+# 指標列の型（獲得数は負数を取り得るため符号付き）
+COUNTER_DTYPE = np.int32
+
+
+def archive_dir():
+    return settings.ARCHIVE_DIR
+
+
+def archived_months(user_ids=None, date_from=None, date_to=None):
+    """期間 [date_from, date_to) と重なるアーカイブ済みの月（ユーザーID・年月順）"""
+    queryset = ArchivedMonth.objects.select_related('user').order_by('user_id', 'year_month')
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    if date_from is not None:
+        queryset = queryset.filter(year_month__gte=year_month_of(date_from))
+    if date_to is not None:
+        queryset = queryset.filter(year_month__lte=year_month_of(date_to - datetime.timedelta(days=1)))
+    return queryset
+
+
+def archived_year_months(user):
+    """ユーザーのアーカイブ済みの年月の集合（書き込みの拒否判定用）"""
+    return set(
+        ArchivedMonth.objects.filter(user_id=getattr(user, 'pk', user)).values_list('year_month', flat=True)
+    )
+
+
+def _as_utc(value):
+    """日時をUTCの（タイムゾーン情報なしの）日時に変換（datetime64に格納するため）"""
+    if value is not None and timezone.is_aware(value):
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def write_file(user_id, year, month, rows):
+    """
+    1ユーザー・1か月分の行を列ごとの配列として圧縮保存し、ARCHIVE_DIRからの相対パスを返す
+    未入力（None）の指標は集計時と同じく0として保存する
+    """
+    relative = os.path.join(f'{year:04d}-{month:02d}', f'{user_id}.npz')
+    path = os.path.join(archive_dir(), relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    columns = {
+        'id': np.array([row['id'] for row in rows], dtype=np.int64),
+        'day': np.array([row['date'].day for row in rows], dtype=np.uint8),
+        'operation_date': np.array([row['operation_date'] for row in rows], dtype='datetime64[D]'),
+        'updated_at': np.array([_as_utc(row['updated_at']) for row in rows], dtype='datetime64[us]'),
+        'input_name': np.array([row['input_name'] or '' for row in rows], dtype=str),
+        **{
+            field: np.array([row[field] or 0 for row in rows], dtype=COUNTER_DTYPE)
+            for field in COUNTER_FIELDS
+        },
+    }
+    # 書き込み途中のファイルを読み取らないよう、一時ファイルに書いてから置き換える
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as output:
+        np.savez_compressed(output, **columns)
+    os.replace(temporary, path)
+    return relative
+
+
+def read_columns(archived):
+    """アーカイブファイルの列を読み込む（dateに記録日のdatetime64[D]配列を追加）"""
+    with np.load(os.path.join(archive_dir(), archived.path)) as data:
+        columns = {name: data[name] for name in data.files}
+    columns['date'] = np.datetime64(f'{archived.year_month}-01') + (columns['day'].astype(np.int64) - 1)
+    return columns
+
+
+def iter_columns(user_ids=None, date_from=None, date_to=None):
+    """期間 [date_from, date_to) のアーカイブ済みの行を、ファイルごとに (ArchivedMonth, 列の辞書) として順に返す"""
+    for archived in archived_months(user_ids, date_from, date_to):
+        columns = read_columns(archived)
+        mask = np.ones(len(columns['date']), dtype=bool)
+        if date_from is not None:
+            mask &= columns['date'] >= np.datetime64(date_from, 'D')
+        if date_to is not None:
+            mask &= columns['date'] < np.datetime64(date_to, 'D')
+        if mask.any():
+            yield archived, {name: values[mask] for name, values in columns.items()}
+
+
+def iter_rows(user_ids=None, date_from=None, date_to=None):
+    """
+    期間 [date_from, date_to) のアーカイブ済みの行を辞書として（ユーザーID・記録日順に）返す
+    キーはHomeDataのvalues()と同じ（user__usernameを含む）
+    """
+    for archived, columns in iter_columns(user_ids, date_from, date_to):
+        values = {name: columns[name].tolist() for name in ('id', 'date', 'input_name', *COUNTER_FIELDS)}
+        for index, day in enumerate(values['date']):
+            yield {
+                'id': values['id'][index],
+                'user_id': archived.user_id,
+                'user__username': archived.user.username,
+                'date': day,
+                'input_name': values['input_name'][index],
+                **{field: values[field][index] for field in COUNTER_FIELDS},
+            }
+
+
+def _delete_rows(user_id, start, end):
+    """集計テーブルからの差し引き（post_deleteシグナル）を発生させずに生データを削除"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {connection.ops.quote_name(HomeData._meta.db_table)} '
+            'WHERE user_id = %s AND date >= %s AND date < %s',
+            [user_id, start, end],
+        )
+
+
+def archive_month(user_id, year, month):
+    """
+    1ユーザー・1か月分の生データをアーカイブし、アーカイブした行数を返す（データなし・アーカイブ済みは0）
+    月別の合計は生データから再計算してMonthlyRollupに保存し、HomeDataとDailyRollupの該当月の行を削除する
+    """
+    start, end = month_bounds(year, month)
+    year_month = f'{year}-{month:02}'
+    with transaction.atomic():
+        if ArchivedMonth.objects.filter(user_id=user_id, year_month=year_month).exists():
+            return 0
+        rows = list(
+            HomeData.objects.for_user_range(user_id, start, end).select_for_update().order_by('date', 'id').values(
+                'id', 'date', 'operation_date', 'input_name', 'updated_at', *COUNTER_FIELDS
+            )
+        )
+        if not rows:
+            return 0
+
+        # ファイルを先に書き込む（DBの更新に失敗した場合も生データは残る）
+        path = write_file(user_id, year, month, rows)
+        MonthlyRollup.objects.update_or_create(
+            user_id=user_id,
+            year_month=year_month,
+            defaults={field: sum(row[field] or 0 for row in rows) for field in COUNTER_FIELDS},
+        )
+        ArchivedMonth.objects.create(user_id=user_id, year_month=year_month, path=path, row_count=len(rows))
+        DailyRollup.objects.for_user_range(user_id, start, end).delete()
+        _delete_rows(user_id, start, end)
+        summary_cache.invalidate(user_id)
+        leaderboard.invalidate(year_month)
+    return len(rows)
+
+
+def restore_month(archived, keep_file=False):
+    """
+    アーカイブ済みの月の生データをHomeDataに戻し（IDも元の値）、日別・月別の集計を再計算する
+    戻した行数を返す。keep_file=Falseの場合、コミット後にアーカイブファイルを削除する
+    """
+    columns = read_columns(archived)
+    dates = columns['date'].tolist()
+    operation_dates = columns['operation_date'].tolist()
+    updated_at = [
+        timezone.make_aware(value, datetime.timezone.utc) if settings.USE_TZ else value
+        for value in columns['updated_at'].tolist()
+    ]
+    counters = {field: columns[field].tolist() for field in COUNTER_FIELDS}
+    objects = [
+        HomeData(
+            id=row_id,
+            user_id=archived.user_id,
+            date=dates[index],
+            input_name=input_name,
+            **{field: counters[field][index] for field in COUNTER_FIELDS},
+        )
+        for index, (row_id, input_name) in enumerate(zip(columns['id'].tolist(), columns['input_name'].tolist()))
+    ]
+
+    path = os.path.join(archive_dir(), archived.path)
+    with transaction.atomic():
+        HomeData.objects.bulk_create(objects, batch_size=1000)
+        # bulk_createは営業日・更新日時を現在日時で上書きするため、アーカイブ時の値に戻す
+        for index, instance in enumerate(objects):
+            instance.operation_date = operation_dates[index]
+            instance.updated_at = updated_at[index]
+        HomeData.objects.bulk_update(objects, ['operation_date', 'updated_at'], batch_size=1000)
+
+        archived.delete()
+        refresh_dates(archived.user_id, dates)
+        summary_cache.invalidate(archived.user_id)
+        leaderboard.invalidate(archived.year_month)
+        if not keep_file:
+            transaction.on_commit(lambda: os.remove(path))
+    return len(objects)
@@ -0,0 +1,285 @@
+# 非同期APIビュー定義
+# ASGIサーバー上でイベントループをブロックせずに応答する読み取り専用API
+# DRFは非同期ビューに対応していないため、Django標準の非同期ビューとして実装する
+
+import asyncio
+import json
+import logging
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import AuthenticationFailed
+from .authentication import CachedJWTAuthentication
+
+from . import events, ingestion, summary_cache
+from .models import HomeData, month_bounds
+from .routers import aread_alias_for, reading_from
+from .serializers import HomeDataSerializer
+from .views import MonthlySummaryAPI
+
+logger = logging.getLogger(__name__)
+
+STREAM_RETRY_MS = 5000  # 切断時にブラウザが再接続するまでの待ち時間（SSEのretryフィールド）
+
+
+async def authenticate(request):
+    """
+    AuthorizationヘッダーのJWTを検証してユーザーを返す（認証失敗時はNone）
+    ユーザーはトークンのクレームから組み立てるためDBにはアクセスしない
+    """
+    result = _credentials(request)
+    return result[0] if result else None
+
+
+def _credentials(request):
+    """AuthorizationヘッダーのJWTを検証して (ユーザー, トークン) を返す（認証失敗時はNone）"""
+    try:
+        return CachedJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+
+
+def unauthorized():
+    return JsonResponse(
+        {'detail': '認証情報が含まれていません。'}, status=401, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+async def monthly_summary(request):
+    """
+    MonthlySummaryAPIの非同期版
+    独立した4つのクエリ（当月集計・月次目標・当日集計・日毎集計）をasyncio.gatherで同時に発行する
+    ※Django 5.1の非同期ORMは内部で1つのスレッドにDB処理を集約するため、
+      効果は主にイベントループを占有しない点にある（benchmark_async_summaryコマンドで計測可能）
+    """
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'メソッド "{request.method}" は許されていません。'}, status=405)
+    user = await authenticate(request)
+    if user is None:
+        return unauthorized()
+
+    today = timezone.now()
+    today_date = timezone.localdate()
+    api = MonthlySummaryAPI()
+
+    read_alias = await aread_alias_for(user.pk)
+    # 書き込みバッファに未書き込みの加算があれば、キャッシュを使わずに集計して合算する（同期版と同じ）
+    pending = ingestion.buffer.pending(
+        user.pk, *month_bounds(today.year, today.month)
+    ) if ingestion.enabled() else {}
+
+    async def compute():
+        monthly_query, target_query, daily_query, records_query = api.summary_querysets(user, today, today_date)
+        with reading_from(read_alias):
+            monthly_rollup, target_acquisition, daily_rollup, daily_records = await asyncio.gather(
+                monthly_query.afirst(),
+                target_query.afirst(),
+                daily_query.afirst(),
+                _alist(records_query),
+            )
+        monthly_rollup, daily_rollup = monthly_rollup or {}, daily_rollup or {}
+        if pending:
+            monthly_rollup, daily_rollup, daily_records = api.merge_pending(
+                today_date, monthly_rollup, daily_rollup, daily_records, pending
+            )
+        return api.assemble_summary(today, monthly_rollup, target_acquisition or 0, daily_rollup, daily_records)
+
+    try:
+        if pending:
+            results = await compute()
+        else:
+            results = await summary_cache.aget_or_compute(
+                user.pk, f"{today.year}-{today.month:02}", today_date, compute
+            )
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    return JsonResponse(results, json_dumps_params={'ensure_ascii': False})
+
+
+async def monthly_summary_stream(request):
+    """
+    月間サマリーの配信ストリーム（Server-Sent Events）
+    接続時に現在のサマリーを summary イベントで送り、以降はユーザーの営業データ・月間目標の変更時に
+    変化した項目のみを delta イベントで送る。変更がない間は一定間隔でハートビート（コメント行）のみを送る
+    変更通知は接続ごとに1つにまとめるため、受信の遅いクライアントがいても未送信のデータは溜まらない
+    最大継続時間・トークンの有効期限で切断する（クライアントは再接続して summary から受信し直す）
+    """
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'メソッド "{request.method}" は許されていません。'}, status=405)
+    credentials = _credentials(request)
+    if credentials is None:
+        return unauthorized()
+    user, token = credentials
+    # WSGIでは応答の完了までワーカーを占有するため受け付けない（クライアントは通常のGETで取得する）
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'detail': 'このAPIはASGIサーバーでのみ利用できます。'}, status=501, json_dumps_params={'ensure_ascii': False}
+        )
+    if events.broker().count(user.pk) >= settings.SUMMARY_STREAM_MAX_PER_USER:
+        return JsonResponse(
+            {'detail': '同時接続数の上限を超えています。'}, status=429, json_dumps_params={'ensure_ascii': False}
+        )
+
+    lifetime = min(settings.SUMMARY_STREAM_MAX_AGE, token['exp'] - time.time())
+    response = StreamingHttpResponse(
+        _summary_events(user, time.monotonic() + lifetime), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # リバースプロキシ（nginx）でのバッファリングを無効化
+    return response
+
+
+async def _summary_events(user, deadline):
+    """サマリーの配信ストリームの本体（クライアントの切断時はキャンセルされ、購読を解除する）"""
+    # 初回の集計中の変更を取りこぼさないよう、集計より先に購読する
+    subscription = events.broker().subscribe(user.pk)
+    api = MonthlySummaryAPI()
+    try:
+        day, summary = await _current_summary(api, user)
+        yield f'retry: {STREAM_RETRY_MS}\n'.encode() + _event('summary', summary)
+        while (remaining := deadline - time.monotonic()) > 0:
+            changed = await subscription.wait(
+                min(settings.SUMMARY_STREAM_HEARTBEAT, remaining), settings.SUMMARY_STREAM_DEBOUNCE
+            )
+            # 変更がなく日付も変わっていなければハートビートのみ送る
+            if not changed and timezone.localdate() == day:
+                yield b': heartbeat\n\n'
+                continue
+            try:
+                current_day, current = await _current_summary(api, user)
+            except Exception:
+                logger.exception('サマリーの配信ストリームで集計に失敗しました user_id=%s', user.pk)
+                return
+            if current_day != day:
+                # 日付・月が変わった場合は全体を送り直す
+                yield _event('summary', current)
+            else:
+                delta = _summary_delta(summary, current)
+                if delta:
+                    yield _event('delta', delta)
+                else:
+                    yield b': heartbeat\n\n'
+            day, summary = current_day, current
+    finally:
+        subscription.close()
+
+
+async def _current_summary(api, user):
+    """現時点のサマリーを集計して (当日の日付, サマリー) を返す"""
+    today = timezone.now()
+    today_date = timezone.localdate()
+    # 書き込み直後はプライマリに固定されるため、集計のたびに接続先を決める
+    read_alias = await aread_alias_for(user.pk)
+
+    def compute():
+        with reading_from(read_alias):
+            return api.current_summary(user, today, today_date)
+
+    return today_date, await sync_to_async(compute)()
+
+
+def _summary_delta(previous, current):
+    """
+    前回送信したサマリーからの変化分
+    monthly・dailyは変化したキーのみ、日毎の集計行は変化した日の行（daily_records）と削除された日付（removed_dates）
+    """
+    delta = {}
+    for key in ('monthly', 'daily'):
+        changes = _changed_items(previous[key], current[key])
+        if changes:
+            delta[key] = changes
+    before = {record['date']: record for record in previous['daily_records']}
+    after = {record['date']: record for record in current['daily_records']}
+    records = [record for day, record in after.items() if before.get(day) != record]
+    removed = [day for day in before if day not in after]
+    if records:
+        delta['daily_records'] = records
+    if removed:
+        delta['removed_dates'] = removed
+    return delta
+
+
+def _changed_items(previous, current):
+    """辞書の値が変化したキーのみを抽出（入れ子の辞書は再帰的に比較）"""
+    changes = {}
+    for key, value in current.items():
+        before = previous.get(key)
+        if isinstance(value, dict) and isinstance(before, dict):
+            nested = _changed_items(before, value)
+            if nested:
+                changes[key] = nested
+        elif value != before:
+            changes[key] = value
+    return changes
+
+
+def _event(name, data):
+    """SSEのイベント（dataはJSON）"""
+    payload = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f'event: {name}\ndata: {payload}\n\n'.encode()
+
+
+async def daily_record_list(request):
+    """
+    営業データ一覧（HomeDataListCreateAPIViewのGET）の非同期版
+
+    GET: date（完全一致）または date_from/date_to（両端を含む）で絞り込み
+         after=YYYY-MM-DD を指定するとその日付より後のデータを返す（next のURLで次ページを取得）
+    """
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'メソッド "{request.method}" は許されていません。'}, status=405)
+    user = await authenticate(request)
+    if user is None:
+        return unauthorized()
+
+    params = {}
+    for name in ('date', 'date_from', 'date_to', 'after'):
+        value = request.GET.get(name)
+        if value:
+            try:
+                params[name] = parse_date(value)
+            except ValueError:
+                params[name] = None
+            if params[name] is None:
+                return JsonResponse({name: '日付はYYYY-MM-DD形式で指定してください'}, status=400)
+    try:
+        page_size = min(max(int(request.GET.get('page_size', 100)), 1), 1000)
+    except ValueError:
+        return JsonResponse({'page_size': '整数で指定してください'}, status=400)
+
+    queryset = HomeData.objects.for_user(user).filter(date__isnull=False)
+    if 'date' in params:
+        queryset = queryset.filter(date=params['date'])
+    if 'date_from' in params:
+        queryset = queryset.filter(date__gte=params['date_from'])
+    if 'date_to' in params:
+        queryset = queryset.filter(date__lt=params['date_to'] + timedelta(days=1))
+    if 'after' in params:
+        queryset = queryset.filter(date__gt=params['after'])
+
+    # 1件多く取得して次ページの有無を判定
+    with reading_from(await aread_alias_for(user.pk)):
+        records = await _alist(queryset.order_by('date', 'id')[:page_size + 1])
+    next_url = None
+    if len(records) > page_size:
+        records = records[:page_size]
+        query = request.GET.copy()
+        query['after'] = records[-1].date.isoformat()
+        next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+    return JsonResponse(
+        {'next': next_url, 'results': HomeDataSerializer(records, many=True).data},
+        json_dumps_params={'ensure_ascii': False}
+    )
+
+
+async def _alist(queryset):
+    """クエリセットを非同期に反復してリスト化"""
+    return [item async for item in queryset]
@@ -3,17 +3,19 @@
 ユーザー登録とログイン機能を提供
 """
 
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth.models import User
 from django.db import IntegrityError
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
+from api.serializers import ClaimsTokenObtainPairSerializer
+from api.throttling import AUTH_THROTTLE_CLASSES, HashingBusy, hashing_slot
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 
 @api_view(['POST'])
+@throttle_classes(AUTH_THROTTLE_CLASSES)
 def register(request):
     """
     ユーザー登録処理
@@ -33,8 +35,16 @@ def register(request):
         # パスワードの検証
         validate_password(password)
         
-        # ユーザー作成
-        User.objects.create_user(username=username, password=password)
+        # ユーザー名重複チェック（ハッシュ計算の前に判定）
+        if User.objects.filter(username=username).exists():
+            return Response(
+                {'message': 'このユーザー名は既に使用されています'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # ユーザー作成（パスワードのハッシュ計算は同時実行数を制限）
+        with hashing_slot():
+            User.objects.create_user(username=username, password=password)
         return Response(
             {'message': '登録が完了しました'}, 
             status=status.HTTP_201_CREATED
@@ -51,6 +61,9 @@ def register(request):
             {'message': 'このユーザー名は既に使用されています'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
+    except HashingBusy:
+        # 混雑時は429としてDRFの例外処理に任せる
+        raise
     except Exception as e:
         # その他のエラー
         return Response(
@@ -59,6 +72,7 @@ def register(request):
         )
 
 @api_view(['POST'])
+@throttle_classes(AUTH_THROTTLE_CLASSES)
 def login(request):
     """
     ユーザーログイン処理
@@ -75,14 +89,15 @@ def login(request):
         )
     
     # ユーザー認証
-    user = authenticate(username=username, password=password)
+    with hashing_slot():
+        user = authenticate(username=username, password=password)
     
     if user is not None:
         # 認証成功時、JWTトークン生成
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsTokenObtainPairSerializer.get_token(user)
         return Response({
             'refresh': str(refresh),
-            'access': str(refresh.access_token),
+            'access': str(ClaimsTokenObtainPairSerializer.get_access_token(user, refresh)),
         })
     else:
         # 認証失敗
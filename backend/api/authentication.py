@@ -0,0 +1,135 @@
+# JWT認証の高速化
+# トークンのクレームからユーザーを組み立て、API呼び出しごとのユーザー検索（DBアクセス）を省略する
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+
+class LRUCache:
+    """
+    有効期限付きのスレッドセーフなLRUキャッシュ（プロセス内）
+    上限件数を超えると最も長く参照されていないエントリから破棄する
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """有効期限内の値を返す（なければNone）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        """値を有効期限（UNIX時刻）付きで保存"""
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# 検証済みトークン（署名検証・デコード済み）のキャッシュ。トークンの有効期限まで保持
+verified_tokens = LRUCache(getattr(settings, 'JWT_VERIFIED_TOKEN_CACHE_SIZE', 4096))
+
+# ユーザーオブジェクトのキャッシュ。短時間のみ保持
+user_objects = LRUCache(getattr(settings, 'JWT_USER_CACHE_SIZE', 1024))
+USER_CACHE_TTL = getattr(settings, 'JWT_USER_CACHE_TTL', 60)  # 秒
+
+
+def validate_token(token_class, raw_token):
+    """
+    トークンを検証して返す（検証済みのトークンは署名検証・デコードを省略）
+    検証に失敗した場合はTokenErrorを送出する
+    """
+    if isinstance(raw_token, bytes):
+        raw_token = raw_token.decode()
+    key = (token_class, raw_token)
+    token = verified_tokens.get(key)
+    if token is None:
+        token = token_class(raw_token)
+        verified_tokens.set(key, token, token.payload.get('exp', time.time()))
+    return token
+
+
+def get_cached_user(user_id):
+    """ユーザーオブジェクトを取得（短時間キャッシュ、存在しなければNone）"""
+    user = user_objects.get(user_id)
+    if user is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            user_objects.set(user_id, user, time.time() + USER_CACHE_TTL)
+    return user
+
+
+class ClaimsUser(TokenUser):
+    """
+    トークンのクレーム（user_id, username, is_staff）から組み立てるユーザー
+    クレームを持たない旧形式のトークンの場合のみ、キャッシュ経由でDBのユーザー情報を参照する
+    """
+    @cached_property
+    def full_user(self):
+        """DBのユーザーオブジェクト（必要なビューのみ使用、短時間キャッシュ）"""
+        return get_cached_user(self.id)
+
+    def _claim(self, name, default):
+        if name in self.token:
+            return self.token[name]
+        user = self.full_user
+        return getattr(user, name) if user is not None else default
+
+    @cached_property
+    def username(self):
+        return self._claim('username', '')
+
+    @cached_property
+    def is_staff(self):
+        return self._claim('is_staff', False)
+
+    @cached_property
+    def is_superuser(self):
+        return self._claim('is_superuser', False)
+
+
+class CachedJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    DBアクセスなしでリクエストユーザーを決定するJWT認証
+    ユーザーはトークンのクレームから組み立て（TOKEN_USER_CLASS）、
+    検証済みトークンはLRUキャッシュから再利用する
+    """
+    def get_validated_token(self, raw_token):
+        messages = []
+        for token_class in api_settings.AUTH_TOKEN_CLASSES:
+            try:
+                return validate_token(token_class, raw_token)
+            except TokenError as e:
+                messages.append({
+                    'token_class': token_class.__name__,
+                    'token_type': token_class.token_type,
+                    'message': e.args[0],
+                })
+        raise InvalidToken({
+            'detail': 'Given token not valid for any token type',
+            'messages': messages,
+        })
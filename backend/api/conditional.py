@@ -0,0 +1,121 @@
+# 条件付きGET（ETag / Last-Modified）の検証子
+# 変更のないリソースはシリアライザーや集計を実行せずに304を返す
+
+import datetime
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import ingestion
+from .models import HomeData, MonthlyTarget, User
+
+
+def _aggregate_subquery(model, expression):
+    """ユーザー単位の集計値を返すサブクエリ"""
+    return Subquery(
+        model.objects.filter(user_id=OuterRef('pk')).order_by().values('user_id').annotate(
+            value=expression
+        ).values('value')[:1]
+    )
+
+
+def data_versions(request):
+    """
+    ログインユーザーのHomeData・MonthlyTargetの最終更新日時と件数を取得
+    (user, updated_at) インデックスを使う1クエリで取得し、リクエスト内で再利用する
+    """
+    versions = getattr(request, '_data_versions', None)
+    if versions is None:
+        versions = User.objects.filter(pk=request.user.pk).annotate(
+            home_data_updated=_aggregate_subquery(HomeData, Max('updated_at')),
+            home_data_count=_aggregate_subquery(HomeData, Count('id')),
+            target_updated=_aggregate_subquery(MonthlyTarget, Max('updated_at')),
+            target_count=_aggregate_subquery(MonthlyTarget, Count('id')),
+        ).values('home_data_updated', 'home_data_count', 'target_updated', 'target_count').first() or {}
+        request._data_versions = versions
+    return versions
+
+
+def _make_etag(*parts):
+    return hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def home_data_etag(request, *args, **kwargs):
+    """営業データ一覧のETag（クエリパラメータごとに異なる）"""
+    versions = data_versions(request)
+    return _make_etag(
+        'home_data', request.user.pk, versions.get('home_data_updated'),
+        versions.get('home_data_count'), request.get_full_path()
+    )
+
+
+def home_data_last_modified(request, *args, **kwargs):
+    """営業データ一覧の最終更新日時"""
+    return data_versions(request).get('home_data_updated')
+
+
+def monthly_target_etag(request, *args, **kwargs):
+    """月間目標のETag（対象年月ごとに異なる）"""
+    versions = data_versions(request)
+    return _make_etag(
+        'monthly_target', request.user.pk, versions.get('target_updated'),
+        versions.get('target_count'), request.get_full_path()
+    )
+
+
+def monthly_target_last_modified(request, *args, **kwargs):
+    """月間目標の最終更新日時"""
+    return data_versions(request).get('target_updated')
+
+
+def _pending_version(request):
+    """書き込みバッファの未書き込みの加算の通番（なければNone）"""
+    return ingestion.buffer.pending_version(request.user.pk) if ingestion.enabled() else None
+
+
+def monthly_summary_etag(request, *args, **kwargs):
+    """月間サマリーのETag（データ・書き込みバッファの未書き込みの加算に加え、当月・当日が変わると変化する）"""
+    versions = data_versions(request)
+    now = timezone.now()
+    return _make_etag(
+        'monthly_summary', request.user.pk, f"{now.year}-{now.month:02}", timezone.localdate(),
+        versions.get('home_data_updated'), versions.get('home_data_count'),
+        versions.get('target_updated'), versions.get('target_count'),
+        _pending_version(request)
+    )
+
+
+def monthly_summary_last_modified(request, *args, **kwargs):
+    """
+    月間サマリーの最終更新日時（日付が変わると経過日数が変わるため当日0時以降とする）
+    書き込みバッファに未書き込みの加算があれば現在時刻とする
+    """
+    if _pending_version(request) is not None:
+        return timezone.now()
+    versions = data_versions(request)
+    start_of_today = timezone.make_aware(
+        datetime.datetime.combine(timezone.localdate(), datetime.time.min)
+    )
+    candidates = [versions.get('home_data_updated'), versions.get('target_updated'), start_of_today]
+    return max(value for value in candidates if value is not None)
+
+
+def conditional_get(etag_func, last_modified_func):
+    """
+    If-None-Match / If-Modified-Since に応じて304を返すデコレーター
+    ブラウザが必ず再検証するよう Cache-Control: private, no-cache を付与する
+    """
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
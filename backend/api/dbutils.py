@@ -0,0 +1,56 @@
+# データベース接続関連のユーティリティ
+# 集計クエリ用のstatement_timeoutとコネクションプールの利用状況取得を提供する
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .routers import current_read_alias
+
+
+@contextmanager
+def statement_timeout(milliseconds=None, using=None):
+    """
+    ブロック内のクエリに実行時間の上限を設定（PostgreSQLのみ、SET LOCALのためトランザクション内で有効）
+    上限を超えたクエリはOperationalError（QueryCanceled）となる
+    usingを省略した場合は処理中のリクエストの読み取り先（プライマリまたはレプリカ）に設定する
+    SQLite等では何もしない
+    """
+    if milliseconds is None:
+        milliseconds = getattr(settings, 'SUMMARY_STATEMENT_TIMEOUT_MS', 0)
+    if using is None:
+        using = current_read_alias()
+    connection = connections[using]
+    if not milliseconds or connection.vendor != 'postgresql':
+        yield
+        return
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL statement_timeout = %s', [int(milliseconds)])
+        yield
+
+
+def pool_stats():
+    """
+    接続先ごとのコネクションプールの利用状況（ワーカープロセス単位）
+    requests_wait_ms: 空き接続待ちの累計時間、requests_waiting: 現在の待ち件数 など（psycopg_poolの統計値）
+    プールを使用していない接続先はenabled=Falseのみ返す
+    """
+    stats = {}
+    for alias in connections:
+        connection = connections[alias]
+        pool = getattr(connection, 'pool', None) if connection.vendor == 'postgresql' else None
+        if pool is None:
+            stats[alias] = {'enabled': False}
+            continue
+        values = pool.get_stats()
+        requests = values.get('requests_num', 0)
+        stats[alias] = {
+            'enabled': True,
+            'min_size': pool.min_size,
+            'max_size': pool.max_size,
+            'mean_wait_ms': round(values.get('requests_wait_ms', 0) / requests, 2) if requests else 0,
+            **values,
+        }
+    return stats
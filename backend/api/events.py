@@ -0,0 +1,163 @@
+# サマリー更新イベントの配信（pub/sub）
+# ユーザーのデータ変更を、そのユーザーの購読者（月間サマリーのSSE接続）へ通知する
+# 通知は「変更があった」ことのみを伝え、購読者ごとに未処理の通知を1つにまとめる（遅い購読者の分も溜まらない）
+# 配信方式はSUMMARY_EVENTS_BACKENDで差し替え可能（既定はプロセス内。複数ワーカー構成ではCacheVersionBrokerを使用）
+
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import summary_cache
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """1購読者分の通知（イベントループ上で待機し、任意のスレッドから通知される）"""
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def notify(self):
+        """未処理の通知がある状態にする（既に通知済みなら何もしない）"""
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            # イベントループが終了済み（接続の終了処理中）
+            pass
+
+    async def wait(self, timeout, settle=0):
+        """
+        通知があればTrue、timeout秒以内に通知がなければFalse
+        settle秒は通知後も待ち、その間の通知を同じ1回の通知として扱う
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        if settle:
+            await asyncio.sleep(settle)
+        self._event.clear()
+        return True
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """
+    プロセス内の配信
+    同じワーカーで処理された書き込みのみ通知される（単一ワーカー構成・テスト用）
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_ids(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    def publish(self, user_id):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.notify()
+
+    def count(self, user_id=None):
+        """購読者数（user_idを指定した場合はそのユーザーの購読者数）"""
+        with self._lock:
+            if user_id is not None:
+                return len(self._subscribers.get(user_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+class CacheVersionBroker(LocalBroker):
+    """
+    共有キャッシュ経由の配信（複数ワーカー構成用）
+    書き込み時に進むサマリーキャッシュの世代（全ワーカーで共有）を、購読中のユーザー分だけ
+    SUMMARY_EVENTS_POLL_INTERVAL秒ごとにまとめて取得し、変化したユーザーの購読者へ通知する
+    取得は購読者数によらずワーカーあたり1回のget_manyで、同じワーカーでの書き込みは即時に通知する
+    比較の基準となる世代は購読の登録時に取得する（登録直後の最初の変更も通知される）
+    """
+    def __init__(self):
+        super().__init__()
+        self._versions = {}  # user_id -> 前回取得した世代（世代キーがなかった場合はNone）
+        self._thread = None
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        # 世代キーがなければ初期化して基準とする（以降の書き込みで世代が進めば変化として検出できる）
+        version = summary_cache.current_version(user_id)
+        with self._lock:
+            self._versions.setdefault(user_id, version)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='summary-events', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def _run(self):
+        stop = threading.Event()
+        while not stop.wait(getattr(settings, 'SUMMARY_EVENTS_POLL_INTERVAL', 2.0)):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('サマリーキャッシュの世代の取得に失敗しました')
+
+    def poll(self):
+        """
+        購読中のユーザーの世代を取得し、前回（初回は購読の登録時）から変化したユーザーへ通知する
+        世代キーの有無が変わった場合（消えた・新たに設定された）も変化として扱う
+        """
+        user_ids = self.subscriber_ids()
+        current = summary_cache.versions(user_ids) if user_ids else {}
+        changed = []
+        with self._lock:
+            for user_id in user_ids:
+                version = current.get(user_id)
+                if user_id in self._versions and self._versions[user_id] != version:
+                    changed.append(user_id)
+                self._versions[user_id] = version
+            # 購読が解除されたユーザーの世代は保持しない
+            for user_id in set(self._versions) - set(self._subscribers):
+                del self._versions[user_id]
+        for user_id in changed:
+            super().publish(user_id)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    """設定（SUMMARY_EVENTS_BACKEND）の配信方式のインスタンス（プロセスで1つ）"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'SUMMARY_EVENTS_BACKEND', 'api.events.LocalBroker'))()
+    return _broker
+
+
+def publish(user_id):
+    """ユーザーの購読者へ変更を通知（購読者がいなければ何もしない）"""
+    broker().publish(user_id)
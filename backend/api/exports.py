@@ -0,0 +1,72 @@
+# データエクスポート処理
+# 大量の営業データを一定メモリでCSV/NDJSONとして逐次出力する
+
+import csv
+import datetime
+import heapq
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+EXPORT_CHUNK_SIZE = 2000  # DBから一度に取得する行数
+
+
+class _Echo:
+    """csv.writerの出力先として、書き込まれた文字列をそのまま返す疑似バッファ"""
+    def write(self, value):
+        return value
+
+
+def _to_json_value(value):
+    """日付をISO形式の文字列に変換"""
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def queryset_rows(queryset, fields):
+    """クエリセットを出力列の値のタプルとして一定件数ずつ読み出す"""
+    return queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def dict_rows(rows, fields):
+    """辞書の行を出力列の値のタプルに変換"""
+    for row in rows:
+        yield tuple(row[field] for field in fields)
+
+
+def merge_rows(fields, key_fields, *sources):
+    """同じ順序（key_fieldsの昇順）に並んだ複数の行の列を、順序を保って1つに結合"""
+    positions = [fields.index(field) for field in key_fields]
+    return heapq.merge(*sources, key=lambda row: tuple(row[position] for position in positions))
+
+
+def iter_csv(rows, fields):
+    """行（出力列の値のタプル）をCSVとして順に出力（1行目はヘッダー）"""
+    writer = csv.writer(_Echo())
+    yield '\ufeff' + writer.writerow(fields)  # Excelで文字化けしないようBOMを付与
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(rows, fields):
+    """行（出力列の値のタプル）を1行1オブジェクトのJSON（NDJSON）として順に出力"""
+    for row in rows:
+        yield json.dumps(
+            {field: _to_json_value(value) for field, value in zip(fields, row)},
+            ensure_ascii=False
+        ) + '\n'
+
+
+async def aiter_batches(chunks, size=EXPORT_CHUNK_SIZE):
+    """
+    出力（文字列のイテレーター）を一定件数ずつ結合して非同期に出力（ASGI用）
+    ASGIではStreamingHttpResponseに同期イテレーターを渡すと全件をメモリに読み込んでから送信するため、
+    DBからの読み出しを含む同期イテレーターの処理は一定件数ごとにスレッドで行う
+    （thread_sensitiveのため常に同じスレッド・DB接続で読み出す）
+    """
+    iterator = iter(chunks)
+    next_batch = sync_to_async(lambda: list(islice(iterator, size)))
+    while batch := await next_batch():
+        yield ''.join(batch)
@@ -0,0 +1,340 @@
+# 営業データの書き込みバッファ（指標の加算の集約）
+# 当日の指標への加算を (ユーザー, 日付) ごとにプロセス内で合算し、一定間隔・一定件数ごとに1トランザクションでDBへ書き込む
+# 加算はメモリに反映する前にWAL（先行書き込みログ）ファイルへ追記し、ワーカーが異常終了しても失われないようにする
+# 終了したワーカーが残したWALは、次に書き込みを開始したワーカー（またはrecover_ingestionコマンド）が適用する
+
+import atexit
+import datetime
+import json
+import logging
+import operator
+import os
+import socket
+import threading
+import uuid
+from functools import partial, reduce
+
+try:
+    import fcntl
+except ImportError:  # Windows等（WALの排他ロックを取得できないためバッファは使用しない）
+    fcntl = None
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import events, leaderboard, summary_cache, timeseries
+from .models import COUNTER_FIELDS, NON_NEGATIVE_COUNTER_FIELDS, HomeData, IngestionBatch, User
+from .rollups import refresh_keys, year_month_of
+
+logger = logging.getLogger(__name__)
+
+WAL_SUFFIX = '.wal'
+BATCH_SIZE = 200  # 1回のUPDATEでまとめる（ユーザー, 日付）の件数
+BATCH_RETENTION = datetime.timedelta(days=7)  # 適用済みの記録の保持期間
+
+
+def enabled():
+    return getattr(settings, 'INGESTION_BUFFER_ENABLED', False) and fcntl is not None
+
+
+def wal_dir():
+    return settings.INGESTION_WAL_DIR
+
+
+def add_deltas(values, deltas):
+    """指標の値に差分を加算（負数を取り得ない指標は0を下限とする。DBへの書き込み時と同じ規則）"""
+    result = {field: values.get(field) or 0 for field in COUNTER_FIELDS}
+    for field, delta in deltas.items():
+        result[field] += delta
+        if field in NON_NEGATIVE_COUNTER_FIELDS:
+            result[field] = max(result[field], 0)
+    return result
+
+
+class Segment:
+    """
+    WALファイル1つ分の加算（1回のDB書き込みの単位）
+    deltas: {user_id: {日付: {指標: 差分}}}。ファイルは作成・適用するプロセスが排他ロックを保持する
+    """
+    def __init__(self, path, file):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.file = file
+        self.deltas = {}
+        self.input_names = {}  # user_id -> 行の作成時に設定する入力者名
+        self.sequences = {}  # user_id -> 最後に追加した加算の通番（ETag用）
+
+    @classmethod
+    def create(cls):
+        os.makedirs(wal_dir(), exist_ok=True)
+        name = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex}{WAL_SUFFIX}'
+        path = os.path.join(wal_dir(), name)
+        file = open(path, 'a', encoding='utf-8')
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return cls(path, file)
+
+    @classmethod
+    def claim(cls, path):
+        """
+        他のプロセスが残したWALファイルを読み込む
+        作成したプロセスが動作中（ロックを取得できない）または適用済みで削除された場合はNone
+        """
+        try:
+            file = open(path, 'r+', encoding='utf-8')
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return None
+        if not os.path.exists(path):
+            file.close()
+            return None
+
+        segment = cls(path, file)
+        for number, line in enumerate(file, 1):
+            try:
+                record = json.loads(line)
+                day = datetime.date.fromisoformat(record['date'])
+            except (ValueError, KeyError):
+                # 異常終了時に書きかけの最終行が残る場合がある
+                logger.warning('WAL %s の%d行目を読み取れないためスキップしました', segment.name, number)
+                continue
+            segment.merge(record['user'], record['name'], day, record['deltas'])
+        return segment
+
+    def merge(self, user_id, input_name, day, deltas, sequence=None):
+        totals = self.deltas.setdefault(user_id, {}).setdefault(day, {})
+        for field, delta in deltas.items():
+            totals[field] = totals.get(field, 0) + delta
+        self.input_names[user_id] = input_name
+        if sequence is not None:
+            self.sequences[user_id] = sequence
+
+    def append(self, user_id, input_name, day, deltas, sequence):
+        """WALに追記してから加算を合算（追記に失敗した加算はメモリにも反映しない）"""
+        record = {'user': user_id, 'name': input_name, 'date': day.isoformat(), 'deltas': deltas}
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        if getattr(settings, 'INGESTION_WAL_FSYNC', False):
+            os.fsync(self.file.fileno())
+        self.merge(user_id, input_name, day, deltas, sequence)
+
+    def keys(self):
+        return [(user_id, day) for user_id, days in self.deltas.items() for day in days]
+
+    def remove(self):
+        """適用済みのWALファイルを削除してロックを解放"""
+        os.remove(self.path)
+        self.file.close()
+
+    def release(self):
+        """WALファイルを残したままロックを解放（適用に失敗した場合）"""
+        self.file.close()
+
+
+def _increment(field, keys, deltas):
+    """指定の行の指標に行ごとの差分を加算する式（負数を取り得ない指標は0を下限とする）"""
+    whens = [
+        When(user_id=user_id, date=day, then=Value(deltas[user_id][day][field]))
+        for user_id, day in keys
+        if deltas[user_id][day].get(field)
+    ]
+    if not whens:
+        return None
+    total = Coalesce(F(field), Value(0)) + Case(*whens, default=Value(0))
+    return Greatest(total, Value(0)) if field in NON_NEGATIVE_COUNTER_FIELDS else total
+
+
+def apply(segment, on_commit=None):
+    """
+    WAL1つ分の加算を1トランザクションでDBへ書き込み、加算した（ユーザー, 日付）の件数を返す
+    当日の行がなければ0で作成してから全行をまとめて加算し、集計テーブルを再計算する（適用済みの場合は何もしない）
+    on_commitはコミット直後（集計テーブルの更新が見えるようになった時点）に、キャッシュの無効化より先に呼び出す
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        if on_commit is not None:
+            transaction.on_commit(on_commit)
+        # 書き込みまでに削除されたユーザーの加算は破棄する
+        existing = set(User.objects.filter(pk__in=segment.deltas).values_list('pk', flat=True))
+        keys = [(user_id, day) for user_id, day in segment.keys() if user_id in existing]
+        if not keys:
+            return 0
+        try:
+            with transaction.atomic():
+                IngestionBatch.objects.create(name=segment.name, row_count=len(keys))
+        except IntegrityError:
+            # 適用後、WALファイルの削除前に異常終了していた場合
+            return 0
+
+        HomeData.objects.bulk_create(
+            [
+                HomeData(user_id=user_id, date=day, operation_date=day, input_name=segment.input_names[user_id])
+                for user_id, day in keys
+            ],
+            ignore_conflicts=True,
+            batch_size=BATCH_SIZE,
+        )
+        for start in range(0, len(keys), BATCH_SIZE):
+            chunk = keys[start:start + BATCH_SIZE]
+            expressions = {field: _increment(field, chunk, segment.deltas) for field in COUNTER_FIELDS}
+            HomeData.objects.filter(
+                reduce(operator.or_, (Q(user_id=user_id, date=day) for user_id, day in chunk))
+            ).update(
+                updated_at=now,
+                **{field: expression for field, expression in expressions.items() if expression is not None},
+            )
+
+        # save()・シグナルを経由しないため、集計テーブルとキャッシュを明示的に更新
+        refresh_keys(keys)
+        for user_id in existing:
+            summary_cache.invalidate(user_id)
+            timeseries.record_saved(user_id, segment.deltas[user_id])
+        for year_month in {year_month_of(day) for _, day in keys}:
+            leaderboard.invalidate(year_month)
+    return len(keys)
+
+
+def recover():
+    """
+    終了したプロセスが残したWALファイルを適用して削除し、加算した件数を返す
+    動作中のプロセスのWALファイルは排他ロックにより対象外となる
+    """
+    if fcntl is None or not os.path.isdir(wal_dir()):
+        return 0
+
+    count = 0
+    for name in sorted(os.listdir(wal_dir())):
+        if not name.endswith(WAL_SUFFIX):
+            continue
+        segment = Segment.claim(os.path.join(wal_dir(), name))
+        if segment is None:
+            continue
+        try:
+            count += apply(segment)
+        except Exception:
+            logger.exception('WAL %s の適用に失敗しました', name)
+            segment.release()
+            continue
+        segment.remove()
+        logger.info('終了したプロセスのWAL %s を適用しました', name)
+
+    # 適用済みの記録はWALファイルの削除後は不要
+    IngestionBatch.objects.filter(applied_at__lt=timezone.now() - BATCH_RETENTION).delete()
+    return count
+
+
+class IngestionBuffer:
+    """
+    プロセス内の書き込みバッファ
+    加算は追記中のWALに合算し、書き込み時に新しいWALへ切り替えて、切り替え前のWALをDBへ適用する
+    初回の加算時にバックグラウンドの書き込みスレッドを開始し、プロセス終了時に残りを書き込む
+    """
+    def __init__(self):
+        self._lock = threading.Lock()  # WAL・未書き込みの加算の参照用
+        self._flush_lock = threading.Lock()  # DBへの書き込みの直列化
+        self._wakeup = threading.Event()
+        self._segment = None  # 追記中のWAL
+        self._flushing = []  # 切り替え済みで未適用のWAL（適用に失敗したものを含む）
+        self._sequence = 0
+        self._thread = None
+
+    def add(self, user_id, input_name, day, deltas):
+        """加算をWALに追記してバッファに合算（一定件数を超えたら書き込みスレッドを起こす）"""
+        with self._lock:
+            if self._segment is None:
+                self._segment = Segment.create()
+            self._sequence += 1
+            self._segment.append(user_id, input_name, day, deltas, self._sequence)
+            full = sum(len(days) for days in self._segment.deltas.values()) >= settings.INGESTION_FLUSH_SIZE
+            self._start()
+        if full:
+            self._wakeup.set()
+        # 未書き込みの加算もサマリーに合算されるため、DBへの書き込みを待たずに購読者へ通知する
+        events.publish(user_id)
+
+    def _segments(self):
+        return [*self._flushing, self._segment] if self._segment is not None else list(self._flushing)
+
+    def pending(self, user_id, date_from=None, date_to=None):
+        """ユーザーの未書き込みの加算（{日付: {指標: 差分}}、期間は [date_from, date_to)）"""
+        result = {}
+        with self._lock:
+            for segment in self._segments():
+                for day, deltas in segment.deltas.get(user_id, {}).items():
+                    if (date_from is not None and day < date_from) or (date_to is not None and day >= date_to):
+                        continue
+                    totals = result.setdefault(day, {})
+                    for field, delta in deltas.items():
+                        totals[field] = totals.get(field, 0) + delta
+        return result
+
+    def pending_version(self, user_id):
+        """ユーザーの未書き込みの加算の通番（なければNone、ETagの計算に使用）"""
+        with self._lock:
+            sequences = [segment.sequences[user_id] for segment in self._segments() if user_id in segment.sequences]
+        return max(sequences, default=None)
+
+    def flush(self):
+        """追記中のWALを切り替え、未適用のWALを順にDBへ書き込んで、加算した件数を返す"""
+        with self._flush_lock:
+            with self._lock:
+                if self._segment is not None and self._segment.deltas:
+                    self._flushing.append(self._segment)
+                    self._segment = None
+                targets = list(self._flushing)
+
+            count = 0
+            for segment in targets:
+                try:
+                    # 集計テーブルの更新が見えるのと同時に未書き込みの加算から除く（二重に合算されないように）
+                    count += apply(segment, on_commit=partial(self._settle, segment))
+                except Exception:
+                    # WALを残して次回に再試行（順序を保つため後続のWALも適用しない）
+                    logger.exception('書き込みバッファの書き込みに失敗しました（WAL %s）', segment.name)
+                    break
+                segment.remove()
+            return count
+
+    def _settle(self, segment):
+        """DBへの適用がコミットされたWALを未書き込みの加算から除く"""
+        with self._lock:
+            if segment in self._flushing:
+                self._flushing.remove(segment)
+
+    def _start(self):
+        """書き込みスレッドを開始（初回のみ、self._lockを保持して呼び出す）"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='ingestion-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        try:
+            recover()
+        except Exception:
+            logger.exception('残されたWALの適用に失敗しました')
+        while True:
+            self._wakeup.wait(settings.INGESTION_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # スレッド専用のDB接続を保持し続けないよう、書き込みごとに返却する
+                connections.close_all()
+
+    def close(self):
+        """プロセス終了時に未書き込みの加算をすべて書き込む（失敗したWALは次のプロセスが適用する）"""
+        self.flush()
+        with self._lock:
+            segment, self._segment = self._segment, None
+        if segment is not None and not segment.deltas:
+            segment.remove()
+
+buffer = IngestionBuffer()
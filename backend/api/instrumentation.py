@@ -0,0 +1,216 @@
+# リクエスト単位の性能計測
+# 処理時間・SQL件数/時間・シリアライザー処理時間を計測し、Server-Timingヘッダーと低速リクエストのログに出力する
+# ルート別の応答時間ヒストグラムをプロセス内に集計し、管理者用APIから参照できるようにする
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger('api.performance')
+
+# ヒストグラムの区間上限（ミリ秒）。最後の区間は上限なし
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """1リクエスト分の計測値"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self._serializer_depth = 0
+
+    def record_query(self, duration):
+        self.sql_count += 1
+        self.sql_time += duration
+
+    @contextmanager
+    def serializer_section(self):
+        """シリアライザー処理時間を計測（入れ子の呼び出しは最も外側のみ加算）"""
+        self._serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._serializer_depth -= 1
+            if self._serializer_depth == 0:
+                self.serializer_time += time.perf_counter() - started
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+@contextmanager
+def serializer_timing():
+    """処理中のリクエストのシリアライザー処理時間として計測"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    with metrics.serializer_section():
+        yield
+
+
+class TimedSerializerMixin:
+    """入力検証と出力変換の時間をシリアライザー処理時間として計測するシリアライザー用Mixin"""
+
+    def run_validation(self, *args, **kwargs):
+        with serializer_timing():
+            return super().run_validation(*args, **kwargs)
+
+    def to_representation(self, *args, **kwargs):
+        with serializer_timing():
+            return super().to_representation(*args, **kwargs)
+
+
+class RouteHistograms:
+    """ルート別の応答時間ヒストグラム（プロセス内、スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def observe(self, route, duration_ms, sql_count):
+        index = bisect_left(HISTOGRAM_BUCKETS_MS, duration_ms)
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = {
+                    'count': 0,
+                    'sum_ms': 0.0,
+                    'max_ms': 0.0,
+                    'sql_count': 0,
+                    'buckets': [0] * (len(HISTOGRAM_BUCKETS_MS) + 1),
+                }
+            stats['count'] += 1
+            stats['sum_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            stats['sql_count'] += sql_count
+            stats['buckets'][index] += 1
+
+    def snapshot(self):
+        """ルートごとの件数・平均・最大・区間別件数を返す"""
+        labels = [f'le_{bound}ms' for bound in HISTOGRAM_BUCKETS_MS] + ['inf']
+        with self._lock:
+            return {
+                route: {
+                    'count': stats['count'],
+                    'mean_ms': round(stats['sum_ms'] / stats['count'], 2),
+                    'max_ms': round(stats['max_ms'], 2),
+                    'mean_sql_count': round(stats['sql_count'] / stats['count'], 2),
+                    'buckets': dict(zip(labels, stats['buckets'])),
+                }
+                for route, stats in sorted(self._routes.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+histograms = RouteHistograms()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    SQL実行時間を計測するexecute_wrapper
+    接続作成時に常設し、計測中のリクエストがある場合のみ記録する
+    （非同期ビューのORM呼び出しは別スレッドの接続で実行されるが、コンテキスト変数は引き継がれる）
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(time.perf_counter() - started)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """DB接続作成時（connection_createdシグナル）にSQL計測用のexecute_wrapperを登録"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _route_of(request):
+    match = getattr(request, 'resolver_match', None)
+    route = match.route if match is not None else 'unresolved'
+    return f'{request.method} /{route}'
+
+
+class PerformanceMiddleware:
+    """
+    リクエストごとの処理時間・SQL件数/時間・シリアライザー処理時間を計測するミドルウェア
+    Server-Timingヘッダーに出力し、閾値（SLOW_REQUEST_THRESHOLD_MS）を超えたリクエストはログに記録する
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_threshold_ms = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500)
+        self.histograms_enabled = getattr(settings, 'REQUEST_METRICS_HISTOGRAMS', False)
+        # ASGIでは非同期のまま処理し、スレッドへの切り替えを発生させない
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process_metrics(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process_metrics(request, response, metrics)
+
+    def process_metrics(self, request, response, metrics):
+        """計測値をServer-Timingヘッダー・ヒストグラム・低速リクエストログに出力"""
+        total_ms = metrics.elapsed() * 1000
+        sql_ms = metrics.sql_time * 1000
+        serializer_ms = metrics.serializer_time * 1000
+        response['Server-Timing'] = ', '.join((
+            f'total;dur={total_ms:.1f}',
+            f'db;dur={sql_ms:.1f};desc="{metrics.sql_count} queries"',
+            f'serializer;dur={serializer_ms:.1f}',
+        ))
+
+        route = _route_of(request)
+        if self.histograms_enabled:
+            histograms.observe(route, total_ms, metrics.sql_count)
+        if total_ms >= self.slow_threshold_ms:
+            logger.warning(
+                '低速リクエスト route="%s" path="%s" status=%s total_ms=%.1f sql_count=%d sql_ms=%.1f serializer_ms=%.1f',
+                route, request.path, response.status_code, total_ms, metrics.sql_count, sql_ms, serializer_ms,
+                extra={
+                    'route': route,
+                    'path': request.path,
+                    'status_code': response.status_code,
+                    'total_ms': round(total_ms, 1),
+                    'sql_count': metrics.sql_count,
+                    'sql_ms': round(sql_ms, 1),
+                    'serializer_ms': round(serializer_ms, 1),
+                },
+            )
+        return response
@@ -0,0 +1,126 @@
+# チームランキング（リーダーボード）の集計
+# 月別集計テーブルと月間目標を結合し、ウィンドウ関数で全ユーザーの順位を1クエリで算出する
+
+import time
+from calendar import monthrange
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import (
+    Case, Exists, F, FloatField, IntegerField, OuterRef, Subquery, Value, When, Window,
+)
+from django.db.models.functions import Cast, Coalesce, Rank
+
+from .dbutils import statement_timeout
+from .models import MonthlyRollup, MonthlyTarget, User
+
+
+def _cache():
+    return caches[getattr(settings, 'SUMMARY_CACHE_ALIAS', 'default')]
+
+
+def _version_key(year_month):
+    return f'leaderboard:version:{year_month}'
+
+
+def time_progress(year_month, today):
+    """
+    月の経過率（MonthlySummaryAPIの進捗率と同じく月の日数は最低30日とする）
+    過去月は1、未来月は0
+    """
+    year, month = (int(part) for part in year_month.split('-'))
+    num_days = max(monthrange(year, month)[1], 30)
+    if (year, month) < (today.year, today.month):
+        return 1.0
+    if (year, month) > (today.year, today.month):
+        return 0.0
+    return max(today.day, 1) / num_days
+
+
+def compute(year_month, today):
+    """指定年月の全ユーザーの順位を集計（獲得数・獲得率・目標進捗率）"""
+    rollups = MonthlyRollup.objects.filter(user_id=OuterRef('pk'), year_month=year_month)
+    targets = MonthlyTarget.objects.filter(user_id=OuterRef('pk'), year_month=year_month)
+    progress = time_progress(year_month, today)
+
+    def rollup_value(field):
+        return Coalesce(Subquery(rollups.values(field)[:1]), Value(0), output_field=IntegerField())
+
+    # 進捗率 = (獲得数 / 目標数) / 月の経過率 × 100
+    progress_rate = Value(0.0, output_field=FloatField())
+    if progress > 0:
+        progress_rate = Case(
+            When(
+                target_acquisition__gt=0,
+                then=Cast('acquisition_count', FloatField()) * 100 / (F('target_acquisition') * Value(progress)),
+            ),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+
+    queryset = User.objects.filter(is_active=True).filter(
+        Exists(rollups) | Exists(targets)
+    ).annotate(
+        acquisition_count=rollup_value('acquisition_count'),
+        catch_count=rollup_value('catch_count'),
+        target_acquisition=Coalesce(
+            Subquery(targets.values('target_acquisition')[:1]), Value(0), output_field=IntegerField()
+        ),
+    ).annotate(
+        acquisition_rate=Case(
+            When(catch_count__gt=0, then=Cast('acquisition_count', FloatField()) * 100 / F('catch_count')),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+        progress_rate=progress_rate,
+    ).annotate(
+        acquisition_rank=Window(Rank(), order_by=F('acquisition_count').desc()),
+        acquisition_rate_rank=Window(Rank(), order_by=F('acquisition_rate').desc()),
+        progress_rank=Window(Rank(), order_by=F('progress_rate').desc()),
+    ).order_by('acquisition_rank', 'username').values(
+        'id', 'username', 'acquisition_count', 'catch_count', 'target_acquisition',
+        'acquisition_rate', 'progress_rate',
+        'acquisition_rank', 'acquisition_rate_rank', 'progress_rank',
+    )
+
+    with statement_timeout():
+        rows = list(queryset)
+    return [
+        {
+            'user_id': row['id'],
+            'username': row['username'],
+            'acquisition_count': row['acquisition_count'],
+            'catch_count': row['catch_count'],
+            'target_acquisition': row['target_acquisition'],
+            'acquisition_rate': round(row['acquisition_rate'], 1),
+            'progress_rate': round(row['progress_rate'], 1),
+            'acquisition_rank': row['acquisition_rank'],
+            'acquisition_rate_rank': row['acquisition_rate_rank'],
+            'progress_rank': row['progress_rank'],
+        }
+        for row in rows
+    ]
+
+
+def get(year_month, today):
+    """キャッシュ済みのランキングを返す（なければ集計して月・当日単位で保存）"""
+    cache = _cache()
+    version = cache.get(_version_key(year_month))
+    if version is None:
+        cache.add(_version_key(year_month), time.time_ns(), None)
+        version = cache.get(_version_key(year_month))
+
+    key = f'leaderboard:{year_month}:{version}:{today.isoformat()}'
+    rankings = cache.get(key)
+    if rankings is None:
+        rankings = compute(year_month, today)
+        cache.set(key, rankings, getattr(settings, 'LEADERBOARD_CACHE_TIMEOUT', 300))
+    return rankings
+
+
+def invalidate(year_month):
+    """指定年月のランキングキャッシュをコミット後に無効化"""
+    transaction.on_commit(
+        lambda: _cache().set(_version_key(year_month), time.time_ns(), None)
+    )
@@ -0,0 +1,107 @@
+# ログ出力の構成部品
+# リクエスト処理スレッドではログをキューに積むのみとし、出力は専用スレッド（QueueListener）で行う
+# 出力形式は1行1レコードのJSON、大量に出力されるロガーはサンプリングして間引く
+
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# LogRecordの標準属性（これ以外の属性はextraとしてJSONに含める）
+_STANDARD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """ログレコードを1行のJSONに変換するフォーマッター"""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    ロガー名ごとの割合でINFO以下のログを間引くフィルター
+    rates: {'django.db.backends': 0.01} のようにロガー名（前方一致）と出力割合を指定
+    （'django.db.backends=0.01,api=0.5' 形式の文字列も可）。WARNING以上は常に出力する
+    """
+    def __init__(self, rates=None):
+        super().__init__()
+        if isinstance(rates, str):
+            rates = parse_sample_rates(rates)
+        # 長い（具体的な）ロガー名を優先して照合する
+        self.rates = sorted((rates or {}).items(), key=lambda item: -len(item[0]))
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        for name, rate in self.rates:
+            if record.name == name or record.name.startswith(name + '.'):
+                return random.random() < rate
+        return True
+
+
+def parse_sample_rates(value):
+    """'logger=割合,logger=割合' 形式の文字列を辞書に変換"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, rate = item.partition('=')
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    キューに積むだけのハンドラー（出力はバックグラウンドスレッドで実行）
+    キューが満杯の場合は待機せずに破棄し、破棄件数をdroppedに記録する
+    """
+    def __init__(self, stream=None, maxsize=10000, formatter=None):
+        # SimpleQueueはロックを使わないC実装のため、呼び出し側の負担が最も小さい
+        super().__init__(queue.SimpleQueue())
+        self.maxsize = maxsize
+        target = logging.StreamHandler(stream or sys.stderr)
+        target.setFormatter(formatter or JSONFormatter())
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, target, respect_handler_level=False)
+        self.listener.start()
+
+    def prepare(self, record):
+        """
+        キューに積む前にメッセージを確定（引数の後からの変更に影響されないよう文字列化）
+        JSONへの整形は出力スレッドで行う
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.maxsize and self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+    def close(self):
+        """未出力のログを書き出してから出力スレッドを停止（終了時のlogging.shutdownから呼ばれる）"""
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
@@ -0,0 +1,69 @@
+# 過去月の営業データのアーカイブコマンド
+# 締め済みの古い月の生データをユーザー・月ごとのアーカイブファイルに移し、テーブルから削除する（定期実行する想定）
+
+import datetime
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import TruncMonth
+
+from api.archive import archive_dir, archive_month
+from api.models import ArchivedMonth, HomeData
+from api.periods import add_months
+
+
+class Command(BaseCommand):
+    help = '古い月の営業データ（HomeData）をアーカイブファイルに移して削除します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            help='この年月（YYYY-MM形式、含まない）より前の月を対象とする（省略時は当月のARCHIVE_AFTER_MONTHSか月前）',
+        )
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='対象ユーザーID（複数指定可、省略時は全ユーザー）',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='対象の月を表示するのみで実行しない')
+
+    def handle(self, *args, **options):
+        today = datetime.date.today()
+        if options['before']:
+            match = re.fullmatch(r'(\d{4})-(\d{2})', options['before'])
+            if not match or not 1 <= int(match.group(2)) <= 12:
+                raise CommandError('年月はYYYY-MM形式で指定してください')
+            year, month = int(match.group(1)), int(match.group(2))
+            if (year, month) > (today.year, today.month):
+                raise CommandError('当月以降の月はアーカイブできません')
+        else:
+            year, month = add_months(today.year, today.month, -settings.ARCHIVE_AFTER_MONTHS)
+        cutoff = datetime.date(year, month, 1)
+
+        source = HomeData.objects.filter(date__isnull=False, date__lt=cutoff)
+        if options['user_ids']:
+            source = source.filter(user_id__in=options['user_ids'])
+        targets = source.annotate(month=TruncMonth('date')).values_list('user_id', 'month').distinct().order_by(
+            'month', 'user_id'
+        )
+        archived = set(ArchivedMonth.objects.values_list('user_id', 'year_month'))
+
+        archived_count = row_count = 0
+        for user_id, month_start in targets:
+            year_month = f'{month_start.year}-{month_start.month:02}'
+            if (user_id, year_month) in archived:
+                self.stderr.write(f'ユーザー{user_id} {year_month}: アーカイブ済みの月に生データがあるためスキップしました')
+                continue
+            if options['dry_run']:
+                self.stdout.write(f'ユーザー{user_id} {year_month}')
+                continue
+            count = archive_month(user_id, month_start.year, month_start.month)
+            if count:
+                archived_count += 1
+                row_count += count
+                self.stdout.write(f'ユーザー{user_id} {year_month}: {count}件')
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'{archived_count}件の月（{row_count}行）をアーカイブしました（保存先: {archive_dir()}）'
+            ))
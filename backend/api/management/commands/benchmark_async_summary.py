@@ -0,0 +1,75 @@
+# 同期版・非同期版サマリーAPIのベンチマークコマンド
+# ASGIハンドラー経由でリクエストを発行し、応答時間を比較する
+
+import asyncio
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+ENDPOINTS = (
+    ('同期版 monthly-summary/', '/api/monthly-summary/'),
+    ('非同期版 monthly-summary/async/', '/api/monthly-summary/async/'),
+    ('同期版 daily-record/', '/api/daily-record/'),
+    ('非同期版 daily-record/async/', '/api/daily-record/async/'),
+)
+
+
+def percentile(values, ratio):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * ratio), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'ASGI経由で同期版・非同期版のサマリーAPI/一覧APIの応答時間を比較します（キャッシュ無効）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='計測に使用する既存ユーザー名')
+        parser.add_argument('--requests', type=int, default=200, help='エンドポイントごとのリクエスト数')
+        parser.add_argument('--concurrency', type=int, default=20, help='同時リクエスト数')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"ユーザー {options['username']} が存在しません")
+        token = str(AccessToken.for_user(user))
+
+        # サマリーキャッシュを無効化し、毎回集計処理を実行させる
+        with override_settings(
+            ALLOWED_HOSTS=['*'],
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        ):
+            for label, path in ENDPOINTS:
+                latencies, wall_time = asyncio.run(
+                    self.run_endpoint(path, token, options['requests'], options['concurrency'])
+                )
+                self.stdout.write(
+                    f'{label}: p50={percentile(latencies, 0.5) * 1000:.1f}ms '
+                    f'p95={percentile(latencies, 0.95) * 1000:.1f}ms '
+                    f'mean={statistics.mean(latencies) * 1000:.1f}ms '
+                    f'合計={wall_time:.2f}s ({options["requests"] / wall_time:.0f} req/s)'
+                )
+
+    async def run_endpoint(self, path, token, total, concurrency):
+        """同時実行数を制限しながらリクエストを発行し、各応答時間と全体の所要時間を返す"""
+        client = AsyncClient()
+        headers = {'Authorization': f'Bearer {token}'}
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def request_once():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f'{path} が {response.status_code} を返しました')
+
+        await client.get(path, headers=headers)  # ウォームアップ
+        started = time.perf_counter()
+        await asyncio.gather(*(request_once() for _ in range(total)))
+        return latencies, time.perf_counter() - started
@@ -0,0 +1,137 @@
+# 主要APIのベンチマークコマンド
+# データ量ごとに合成データを投入し、応答時間（p50/p95）と1リクエストあたりのクエリ数を計測する
+# クエリ数が上限（QUERY_BUDGETS）を超えた場合は異常終了するため、CIでのN+1検出にも使用できる
+
+import statistics
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.seeding import discard, seed
+from api.serializers import ClaimsTokenObtainPairSerializer
+
+PREFIX = 'bench'  # 合成データのユーザー名の接頭辞（実行ごとに識別子を付け、作成したユーザーのみ削除する）
+PASSWORD = 'benchpass123'
+
+# エンドポイントごとの1リクエストあたりの最大クエリ数（PostgreSQLでの最も多い場合の件数）
+# api/tests.py のQueryBudgetTestsでassertNumQueriesにより同じ件数であることを確認している
+# 集計クエリのstatement_timeout設定（BEGIN/SET LOCAL/COMMIT）の件数（STATEMENT_TIMEOUT_QUERIES）を含む
+QUERY_BUDGETS = {
+    'monthly-summary/': 7,
+    'daily-record/ (一覧)': 2,
+    'daily-record/ (作成)': 18,  # 月初・日初の書き込みで日別・月別の集計行を作成する場合（BEGIN/SAVEPOINT等を含む）
+    'daily-record/today/increment/': 21,  # 当日初回は行の作成（作成APIと同じ処理）を含む。以降は切り離した月の確認、加算と集計行の更新のみ（7件）
+    'monthly-target/': 2,
+    'login/': 1,
+}
+STATEMENT_TIMEOUT_QUERIES = {'monthly-summary/': 3}  # PostgreSQL以外では発行されない件数
+
+
+def percentile(values, ratio):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * ratio), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = '主要APIの応答時間とクエリ数をデータ量ごとに計測します（クエリ数の上限超過で異常終了）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', default='30,90,365',
+            help='計測するデータ量（ユーザーあたりの日数、カンマ区切り）',
+        )
+        parser.add_argument('--users', type=int, default=5, help='データ量ごとに作成するユーザー数')
+        parser.add_argument('--requests', type=int, default=50, help='エンドポイントごとのリクエスト数')
+        parser.add_argument('--keep', action='store_true', help='計測後に合成データを削除しない')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(value) for value in options['days'].split(',')]
+        except ValueError:
+            raise CommandError('--days はカンマ区切りの整数で指定してください')
+
+        over_budget = []
+        run_id = uuid.uuid4().hex[:8]
+        # キャッシュを無効化し、毎回DBから集計させる（スロットリングの状態も保存されない）
+        with override_settings(
+            ALLOWED_HOSTS=['*'],
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        ):
+            for days in sizes:
+                users = seed(options['users'], days, timezone.localdate(), prefix=f'{PREFIX}{run_id}d{days}-',
+                             password=PASSWORD, random_seed=days)
+                try:
+                    self.stdout.write(self.style.MIGRATE_HEADING(
+                        f'データ量: {len(users)}ユーザー × {days}日'
+                    ))
+                    for label, latencies, queries in self.run_size(users[0], options['requests']):
+                        budget = QUERY_BUDGETS[label]
+                        max_queries = max(queries)
+                        line = (
+                            f'  {label}: p50={percentile(latencies, 0.5) * 1000:.1f}ms '
+                            f'p95={percentile(latencies, 0.95) * 1000:.1f}ms '
+                            f'mean={statistics.mean(latencies) * 1000:.1f}ms '
+                            f'クエリ数={max_queries}（上限{budget}）'
+                        )
+                        if max_queries > budget:
+                            over_budget.append(f'{label}（{days}日）: {max_queries} > {budget}')
+                            self.stdout.write(self.style.ERROR(line))
+                        else:
+                            self.stdout.write(line)
+                finally:
+                    # 今回作成したユーザーのみ削除
+                    if not options['keep']:
+                        discard(users)
+
+        if over_budget:
+            raise CommandError('クエリ数の上限を超えました: ' + ', '.join(over_budget))
+        self.stdout.write(self.style.SUCCESS('すべてのエンドポイントがクエリ数の上限内です'))
+
+    def run_size(self, user, total):
+        """1つのデータ量について各エンドポイントを計測し、(ラベル, 応答時間, クエリ数)を返す"""
+        client = Client()
+        headers = {'Authorization': f'Bearer {ClaimsTokenObtainPairSerializer.get_access_token(user)}'}
+        # 作成APIは既存データと重複しない未来の日付に登録する
+        today = timezone.localdate()
+        target_path = f'/api/monthly-target/{today.year}-{today.month:02}/'
+        next_dates = iter(today + timedelta(days=offset) for offset in range(1, total + 2))
+
+        requests = (
+            ('monthly-summary/', lambda: client.get('/api/monthly-summary/', headers=headers), (200,)),
+            ('daily-record/ (一覧)', lambda: client.get('/api/daily-record/', headers=headers), (200,)),
+            ('daily-record/ (作成)', lambda: client.post(
+                '/api/daily-record/',
+                {'date': next(next_dates).isoformat(), 'call_count': 10, 'catch_count': 3},
+                content_type='application/json', headers=headers,
+            ), (201,)),
+            # 初回は当日の行を作成する（201）、以降は既存の行に加算する（200）。書き込みバッファの使用時は202
+            ('daily-record/today/increment/', lambda: client.post(
+                '/api/daily-record/today/increment/', {'call_count': 1},
+                content_type='application/json', headers=headers,
+            ), (200, 201, 202)),
+            ('monthly-target/', lambda: client.get(target_path, headers=headers), (200,)),
+            ('login/', lambda: client.post(
+                '/api/login/', {'username': user.username, 'password': PASSWORD},
+                content_type='application/json',
+            ), (200,)),
+        )
+        for label, send, expected_statuses in requests:
+            latencies, queries = [], []
+            for _ in range(total):
+                # レプリカを設定している場合も含め、全接続先のクエリを数える
+                with ExitStack() as stack:
+                    captured = [stack.enter_context(CaptureQueriesContext(conn)) for conn in connections.all()]
+                    started = time.perf_counter()
+                    response = send()
+                    latencies.append(time.perf_counter() - started)
+                if response.status_code not in expected_statuses:
+                    raise CommandError(f'{label} が {response.status_code} を返しました: {response.content[:200]!r}')
+                queries.append(sum(len(context) for context in captured))
+            yield label, latencies, queries
@@ -0,0 +1,145 @@
+# ログ出力のオーバーヘッド計測コマンド
+# 従来の構成（ルートDEBUG・同期StreamHandler）と現在の構成（キュー経由のJSON出力）で
+# ログ1件あたりの呼び出し時間と、SQLログを含むAPI1リクエストあたりの処理時間を比較する
+
+import copy
+import logging
+import logging.config
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from api.serializers import ClaimsTokenObtainPairSerializer
+
+# 変更前のLOGGING設定（ルートロガーをDEBUGで同期出力）
+LEGACY_LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': 'DEBUG',
+    },
+}
+
+
+class SlowStream:
+    """書き込みごとに一定時間待機する出力先（低速な標準エラー出力の模擬）"""
+
+    def __init__(self, stream, latency):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, text):
+        time.sleep(self.latency)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def percentile(values, ratio):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * ratio), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = '従来のログ構成と現在のログ構成で、ログ出力のオーバーヘッドを比較します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='API計測に使用する既存ユーザー名')
+        parser.add_argument('--requests', type=int, default=200, help='API計測のリクエスト数')
+        parser.add_argument('--records', type=int, default=20000, help='ログ呼び出し計測の件数')
+        parser.add_argument(
+            '--write-latency-us', type=int, default=0,
+            help='出力先への書き込み1回あたりの遅延（µs、パイプ詰まり等の低速な出力先を模擬）',
+        )
+        parser.add_argument(
+            '--sql-debug', action='store_true',
+            help='DEBUG=True時と同様にSQLログ（django.db.backends）を発生させる',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"ユーザー {options['username']} が存在しません")
+        token = str(ClaimsTokenObtainPairSerializer.get_access_token(user))
+
+        results = []
+        # 出力先は実ファイル（端末への大量出力を避けつつ、書き込みの待ち時間は計測に含める）
+        with tempfile.TemporaryFile('w+') as output:
+            if options['write_latency_us']:
+                output = SlowStream(output, options['write_latency_us'] / 1e6)
+            for label, config in (('従来（同期・DEBUG）', LEGACY_LOGGING), ('現在（キュー・JSON）', settings.LOGGING)):
+                self.configure(config, output)
+                try:
+                    latencies = self.measure_requests(token, options['requests'], options['sql_debug'])
+                    self.drain()
+                    per_record = self.measure_records(options['records'])
+                    self.drain()
+                finally:
+                    logging.config.dictConfig(settings.LOGGING)
+                results.append((label, per_record, latencies))
+
+        for label, per_record, latencies in results:
+            self.stdout.write(
+                f'{label}: ログ1件={per_record * 1e6:.2f}µs  '
+                f'API p50={percentile(latencies, 0.5) * 1000:.2f}ms '
+                f'p95={percentile(latencies, 0.95) * 1000:.2f}ms '
+                f'mean={statistics.mean(latencies) * 1000:.2f}ms'
+            )
+
+    def configure(self, config, output):
+        """ログ設定を適用し、全ハンドラーの出力先を計測用ファイルに差し替える"""
+        config = copy.deepcopy(config)
+        for handler in config.get('handlers', {}).values():
+            handler['stream'] = output
+        logging.config.dictConfig(config)
+
+    def drain(self):
+        """キュー経由のハンドラーの出力待ちがなくなるまで待機（計測区間の混在を防ぐ）"""
+        for handler in logging.getLogger().handlers:
+            pending = getattr(handler, 'queue', None)
+            while pending is not None and pending.qsize():
+                time.sleep(0.001)
+
+    def measure_records(self, count):
+        """INFOログ1件あたりの呼び出し時間（リクエスト処理スレッド側の負担）"""
+        logger = logging.getLogger('api.benchmark')
+        started = time.perf_counter()
+        for index in range(count):
+            logger.info('benchmark record %d user=%s', index, 'user')
+        return (time.perf_counter() - started) / count
+
+    def measure_requests(self, token, total, sql_debug):
+        """月間サマリーAPIの応答時間（SQLログ・asyncio等のDEBUGログを含む）"""
+        client = Client()
+        headers = {'Authorization': f'Bearer {token}'}
+        latencies = []
+        connection.force_debug_cursor = sql_debug
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=['*'],
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            ):
+                client.get('/api/monthly-summary/', headers=headers)  # ウォームアップ
+                for _ in range(total):
+                    started = time.perf_counter()
+                    response = client.get('/api/monthly-summary/', headers=headers)
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        raise CommandError(f'monthly-summary/ が {response.status_code} を返しました')
+        finally:
+            connection.force_debug_cursor = False
+        return latencies
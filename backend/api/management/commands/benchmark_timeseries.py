@@ -0,0 +1,80 @@
+# 時系列キャッシュのベンチマークコマンド
+# 合成データに対してランダムな期間の合計を、DBの日別集計（DailyRollup）への集計クエリと
+# プロセス内の時系列キャッシュ（累積和）の両方で求め、1回あたりの所要時間と結果の一致を確認する
+
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from django.utils import timezone
+
+from api.models import COUNTER_FIELDS, DailyRollup
+from api.seeding import discard, seed
+from api.timeseries import SeriesStore
+
+PREFIX = 'tsbench'  # 合成データのユーザー名の接頭辞（実行ごとに識別子を付け、作成したユーザーのみ削除する）
+
+
+class Command(BaseCommand):
+    help = 'ランダムな期間の合計をDB集計と時系列キャッシュで比較します（結果不一致で異常終了）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='ユーザーあたりの日数')
+        parser.add_argument('--users', type=int, default=3, help='作成するユーザー数')
+        parser.add_argument('--ranges', type=int, default=500, help='ユーザーごとの期間数')
+        parser.add_argument('--keep', action='store_true', help='計測後に合成データを削除しない')
+
+    def handle(self, *args, **options):
+        end_date = timezone.localdate()
+        users = seed(options['users'], options['days'], end_date, prefix=f'{PREFIX}{uuid.uuid4().hex[:8]}-',
+                     random_seed=options['days'])
+        # 共有のストアに影響しないよう、計測用のストアを使用する
+        store = SeriesStore()
+        rng = random.Random(options['days'])
+        first_date = end_date - timedelta(days=options['days'])
+        mismatches = []
+        try:
+            database_time = series_time = load_time = 0.0
+            operations = 0
+            for user in users:
+                started = time.perf_counter()
+                series = store.get(user.pk)
+                load_time += time.perf_counter() - started
+
+                for _ in range(options['ranges']):
+                    start = first_date + timedelta(days=rng.randrange(options['days']))
+                    end = start + timedelta(days=rng.randint(1, options['days']))
+
+                    started = time.perf_counter()
+                    aggregated = DailyRollup.objects.for_user_range(user, start, end).aggregate(
+                        **{field: Sum(field) for field in COUNTER_FIELDS}
+                    )
+                    database_time += time.perf_counter() - started
+
+                    started = time.perf_counter()
+                    totals = series.totals(start, end)
+                    series_time += time.perf_counter() - started
+
+                    expected = {field: aggregated[field] or 0 for field in COUNTER_FIELDS}
+                    if totals != expected:
+                        mismatches.append(f'{user.username} {start}〜{end}')
+                    operations += 1
+
+            stats = store.stats()
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'データ量: {len(users)}ユーザー × {options["days"]}日、{operations}期間'
+            ))
+            self.stdout.write(f'  DB集計: {database_time / operations * 1e6:.1f}µs/回')
+            self.stdout.write(f'  時系列キャッシュ: {series_time / operations * 1e6:.1f}µs/回')
+            self.stdout.write(f'  初回読み込み: {load_time / len(users) * 1000:.1f}ms/ユーザー')
+            self.stdout.write(f'  メモリ使用量: {stats["bytes"] / len(users) / 1024:.1f}KiB/ユーザー')
+        finally:
+            if not options['keep']:
+                discard(users)
+
+        if mismatches:
+            raise CommandError('DB集計と結果が一致しません: ' + ', '.join(mismatches[:10]))
+        self.stdout.write(self.style.SUCCESS('すべての期間でDB集計と結果が一致しました'))
@@ -0,0 +1,30 @@
+# HomeDataの月別パーティション作成コマンド
+# 当月から指定月数先までのパーティションを事前に作成する（月初より前に定期実行する想定）
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api import partitioning
+
+
+class Command(BaseCommand):
+    help = 'HomeDataの当月以降の月別パーティションを事前に作成します（PostgreSQLのみ）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int,
+            help='当月より先に作成する月数（省略時はHOMEDATA_PARTITIONS_AHEAD）',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql' or not partitioning.is_partitioned(connection):
+            raise CommandError(
+                'HomeDataはパーティション化されていません（PostgreSQLでHOMEDATA_PARTITIONING=Trueとしてmigrateを実行してください）'
+            )
+
+        created = partitioning.ensure_partitions(connection, ahead=options['months'])
+        for name in created:
+            self.stdout.write(f'作成: {name}')
+        for name, bounds in partitioning.list_partitions(connection):
+            self.stdout.write(f'  {name}  {bounds}')
+        self.stdout.write(self.style.SUCCESS(f'パーティションを{len(created)}件作成しました'))
@@ -0,0 +1,38 @@
+# HomeDataの月別パーティション切り離しコマンド
+# 過去月のパーティションをテーブルから切り離す（行の削除を伴わないため短時間で完了する）
+# 切り離した月の日次データは一覧APIに表示されなくなるが、集計テーブルの値は残る（rebuild_rollupsでも再計算しない）
+
+import datetime
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api import partitioning
+
+
+class Command(BaseCommand):
+    help = 'HomeDataの過去月のパーティションを切り離します（PostgreSQLのみ）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('year_month', help='切り離す年月（YYYY-MM形式、当月より前のみ）')
+        parser.add_argument('--drop', action='store_true', help='切り離したテーブルを削除する')
+
+    def handle(self, *args, **options):
+        match = re.fullmatch(r'(\d{4})-(\d{2})', options['year_month'])
+        if not match or not 1 <= int(match.group(2)) <= 12:
+            raise CommandError('年月はYYYY-MM形式で指定してください')
+        year, month = int(match.group(1)), int(match.group(2))
+        today = datetime.date.today()
+        if (year, month) >= (today.year, today.month):
+            raise CommandError('当月以降のパーティションは切り離せません')
+        if connection.vendor != 'postgresql' or not partitioning.is_partitioned(connection):
+            raise CommandError('HomeDataはパーティション化されていません')
+
+        if not partitioning.detach_partition(connection, year, month, drop=options['drop']):
+            raise CommandError(f'{options["year_month"]} のパーティションがありません')
+        name = partitioning.partition_name(year, month)
+        if options['drop']:
+            self.stdout.write(self.style.SUCCESS(f'{name} を切り離して削除しました'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{name} を切り離しました（独立したテーブルとして残っています）'))
@@ -0,0 +1,40 @@
+# 月間実績レポートコマンド（管理者向け）
+# 複数ユーザー×複数月の月間指標（実績・比率・目標に対する進捗と月末予測）を一括計算してCSV・NDJSONで出力する
+
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.analytics import monthly_report
+from api.exports import iter_csv, iter_ndjson
+
+
+class Command(BaseCommand):
+    help = '複数ユーザー×複数月の月間実績レポートを出力します（値は月間サマリーAPIと同じ計算）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('year_months', nargs='+', help='対象の年月（YYYY-MM形式、複数指定可）')
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='対象ユーザーID（複数指定可、省略時は全ユーザー）',
+        )
+        parser.add_argument('--format', default='csv', choices=['csv', 'ndjson'], help='出力形式')
+
+    def handle(self, *args, **options):
+        for year_month in options['year_months']:
+            match = re.fullmatch(r'(\d{4})-(\d{2})', year_month)
+            if not match or not 1 <= int(match.group(2)) <= 12:
+                raise CommandError('年月はYYYY-MM形式で指定してください')
+
+        # 当月の進捗・月末予測は今日の日付、過去月は月末時点の値になる
+        report = monthly_report(options['year_months'], timezone.localdate(), options['user_ids'])
+        if not report:
+            self.stderr.write('対象のデータがありません')
+            return
+
+        fields = list(report[0])
+        rows = ([row[field] for field in fields] for row in report)
+        iterate = iter_csv if options['format'] == 'csv' else iter_ndjson
+        for chunk in iterate(rows, fields):
+            self.stdout.write(chunk, ending='')
@@ -0,0 +1,60 @@
+# プロファイル一覧・集計コマンド
+# ProfilingMiddlewareが保存したプロファイルを一覧表示し、指定した結果の上位関数・メモリ割り当てを表示する
+
+import io
+import os
+import pstats
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.profiling import list_captures, profile_dir
+
+
+class Command(BaseCommand):
+    help = '保存済みのリクエストプロファイルを一覧表示・集計します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('capture_id', nargs='?', help='集計するプロファイルのID（省略時は一覧表示）')
+        parser.add_argument('--limit', type=int, default=20, help='一覧の表示件数')
+        parser.add_argument('--top', type=int, default=25, help='集計で表示する関数・割り当て箇所の件数')
+        parser.add_argument(
+            '--sort', default='cumulative', choices=['cumulative', 'tottime', 'calls'],
+            help='関数の並び順',
+        )
+
+    def handle(self, *args, **options):
+        if options['capture_id']:
+            self.summarize(options['capture_id'], options['top'], options['sort'])
+            return
+
+        captures = list_captures(options['limit'])
+        if not captures:
+            self.stdout.write(f'プロファイルがありません（保存先: {profile_dir()}）')
+            return
+        for capture in captures:
+            self.stdout.write(
+                f"{capture['id']}  {capture['captured_at']}  {capture['method']} {capture['path']}  "
+                f"{capture['status_code']}  {capture['duration_ms']}ms  "
+                f"{capture['trigger']}{'  +memory' if capture['memory'] else ''}"
+            )
+
+    def summarize(self, capture_id, top, sort):
+        base = os.path.join(profile_dir(), os.path.basename(capture_id))
+        if not os.path.exists(base + '.prof'):
+            raise CommandError(f'プロファイル {capture_id} が見つかりません')
+
+        output = io.StringIO()
+        stats = pstats.Stats(base + '.prof', stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(top)
+        self.stdout.write(output.getvalue())
+
+        if os.path.exists(base + '.tracemalloc'):
+            snapshot = tracemalloc.Snapshot.load(base + '.tracemalloc')
+            statistics = snapshot.statistics('lineno')
+            total = sum(stat.size for stat in statistics)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'メモリ割り当て（計測終了時点で保持、合計 {total / 1024:.1f} KiB）'
+            ))
+            for stat in statistics[:top]:
+                self.stdout.write(f'  {stat}')
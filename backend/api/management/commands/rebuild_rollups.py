@@ -0,0 +1,22 @@
+# 集計テーブル再構築コマンド
+# HomeDataの生データから日別・月別の集計テーブルを作り直す
+
+from django.core.management.base import BaseCommand
+
+from api.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'HomeDataから日別・月別の集計テーブル（DailyRollup/MonthlyRollup）を再構築します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='対象ユーザーID（複数指定可、省略時は全ユーザー）',
+        )
+
+    def handle(self, *args, **options):
+        daily_count, monthly_count = rebuild(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'集計テーブルを再構築しました（日別: {daily_count}件, 月別: {monthly_count}件）'
+        ))
@@ -0,0 +1,17 @@
+# 書き込みバッファのWAL適用コマンド
+# 停止・異常終了したワーカーが残したWALファイルの加算をDBへ書き込む（動作中のワーカーのWALは対象外）
+# 通常は次に書き込みを開始したワーカーが自動で適用するため、バッファを無効化した後の残りの適用等に使用する
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ingestion import fcntl, recover, wal_dir
+
+
+class Command(BaseCommand):
+    help = '書き込みバッファのWALファイルのうち、終了したワーカーが残したものをDBへ適用します'
+
+    def handle(self, *args, **options):
+        if fcntl is None:
+            raise CommandError('この環境ではWALファイルのロックを取得できないため実行できません')
+        count = recover()
+        self.stdout.write(self.style.SUCCESS(f'{count}件の（ユーザー, 日付）に加算しました（WAL: {wal_dir()}）'))
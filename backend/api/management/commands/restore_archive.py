@@ -0,0 +1,38 @@
+# アーカイブ済みの営業データの復元コマンド
+# 監査等で生データが必要な場合に、アーカイブファイルの行をHomeDataに戻して集計テーブルを再計算する
+
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.archive import restore_month
+from api.models import ArchivedMonth
+
+
+class Command(BaseCommand):
+    help = 'アーカイブ済みの月の営業データをHomeDataに復元します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('year_month', help='復元する年月（YYYY-MM形式）')
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='対象ユーザーID（複数指定可、省略時は全ユーザー）',
+        )
+        parser.add_argument('--keep-file', action='store_true', help='復元後もアーカイブファイルを削除しない')
+
+    def handle(self, *args, **options):
+        if not re.fullmatch(r'\d{4}-(0[1-9]|1[0-2])', options['year_month']):
+            raise CommandError('年月はYYYY-MM形式で指定してください')
+
+        targets = ArchivedMonth.objects.filter(year_month=options['year_month']).order_by('user_id')
+        if options['user_ids']:
+            targets = targets.filter(user_id__in=options['user_ids'])
+        if not targets.exists():
+            raise CommandError(f'{options["year_month"]} のアーカイブがありません')
+
+        row_count = 0
+        for archived in targets:
+            count = restore_month(archived, keep_file=options['keep_file'])
+            row_count += count
+            self.stdout.write(f'ユーザー{archived.user_id} {archived.year_month}: {count}件')
+        self.stdout.write(self.style.SUCCESS(f'{row_count}行を復元しました'))
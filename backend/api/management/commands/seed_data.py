@@ -0,0 +1,47 @@
+# 負荷試験用データ投入コマンド
+# N人 × M日分の営業データと月間目標を一括作成する
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from api.seeding import clear, seed
+
+
+class Command(BaseCommand):
+    help = '負荷試験用にユーザー・営業データ・月間目標をbulk_createで一括作成します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='作成するユーザー数')
+        parser.add_argument('--days', type=int, default=90, help='ユーザーごとの日数（終了日から遡る）')
+        parser.add_argument('--end-date', help='最終日（YYYY-MM-DD、省略時は今日）')
+        parser.add_argument('--prefix', default='seed', help='作成するユーザー名の接頭辞（synthetic__ の後に付与）')
+        parser.add_argument('--password', default='password123', help='作成するユーザーの共通パスワード')
+        parser.add_argument('--random-seed', type=int, help='乱数シード（再現性のある投入用）')
+        parser.add_argument('--clear', action='store_true', help='同じ接頭辞で作成済みの合成データのユーザーを削除してから作成')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['days'] < 1:
+            raise CommandError('--users と --days は1以上を指定してください')
+        end_date = timezone.localdate()
+        if options['end_date']:
+            end_date = parse_date(options['end_date'])
+            if end_date is None:
+                raise CommandError('--end-date はYYYY-MM-DD形式で指定してください')
+
+        if options['clear']:
+            removed = clear(options['prefix'])
+            self.stdout.write(f'作成済みの合成データのユーザーを削除しました（{removed}件）')
+
+        users = seed(
+            options['users'],
+            options['days'],
+            end_date,
+            prefix=options['prefix'],
+            password=options['password'],
+            random_seed=options['random_seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(users)}ユーザー × {options["days"]}日分のデータを作成しました'
+            f'（ユーザー名: {users[0].username} 〜 {users[-1].username}）'
+        ))
@@ -0,0 +1,94 @@
+# マイグレーションファイル
+# 日別・月別の集計テーブル（ロールアップ）を追加し、既存データから初期値を構築
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+COUNTER_FIELDS = (
+    'call_count', 'catch_count', 're_call_count', 'prospective_count',
+    'approach_ng_count', 'product_explanation_ng_count', 'acquisition_count',
+)
+
+
+def build_rollups(apps, schema_editor):
+    """既存のHomeDataから集計テーブルの初期データを作成"""
+    HomeData = apps.get_model('api', 'HomeData')
+    DailyRollup = apps.get_model('api', 'DailyRollup')
+    MonthlyRollup = apps.get_model('api', 'MonthlyRollup')
+
+    rows = HomeData.objects.filter(date__isnull=False).values('user_id', 'date').annotate(
+        **{f'sum_{field}': Sum(field) for field in COUNTER_FIELDS}
+    ).order_by('user_id', 'date')
+
+    daily_objects = []
+    monthly_totals = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    for row in rows.iterator():
+        values = {field: row[f'sum_{field}'] or 0 for field in COUNTER_FIELDS}
+        daily_objects.append(DailyRollup(user_id=row['user_id'], date=row['date'], **values))
+        totals = monthly_totals[(row['user_id'], f"{row['date'].year}-{row['date'].month:02}")]
+        for field, value in values.items():
+            totals[field] += value
+
+    DailyRollup.objects.bulk_create(daily_objects, batch_size=1000)
+    MonthlyRollup.objects.bulk_create([
+        MonthlyRollup(user_id=user_id, year_month=year_month, **values)
+        for (user_id, year_month), values in monthly_totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    # 依存関係定義
+    dependencies = [
+        ('api', '0003_remove_homedata_target_acquisition_count_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # データベース操作定義
+    operations = [
+        # ユーザー別・日別の集計テーブル
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='記録日')),
+                ('call_count', models.IntegerField(default=0)),
+                ('catch_count', models.IntegerField(default=0)),
+                ('re_call_count', models.IntegerField(default=0)),
+                ('prospective_count', models.IntegerField(default=0)),
+                ('approach_ng_count', models.IntegerField(default=0)),
+                ('product_explanation_ng_count', models.IntegerField(default=0)),
+                ('acquisition_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'date')},
+            },
+        ),
+        # ユーザー別・月別の集計テーブル（YYYY-MM形式）
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year_month', models.CharField(max_length=7)),
+                ('call_count', models.IntegerField(default=0)),
+                ('catch_count', models.IntegerField(default=0)),
+                ('re_call_count', models.IntegerField(default=0)),
+                ('prospective_count', models.IntegerField(default=0)),
+                ('approach_ng_count', models.IntegerField(default=0)),
+                ('product_explanation_ng_count', models.IntegerField(default=0)),
+                ('acquisition_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'year_month')},
+            },
+        ),
+
+        # 既存データから集計値を構築
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# マイグレーションファイル
+# HomeDataにユーザー別の日付範囲検索用の複合インデックスを追加
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # 依存関係定義
+    dependencies = [
+        ('api', '0004_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # データベース操作定義
+    operations = [
+        # (user, date) 複合インデックス（一覧・月次集計の範囲検索用）
+        migrations.AddIndex(
+            model_name='homedata',
+            index=models.Index(fields=['user', 'date'], name='homedata_user_date_idx'),
+        ),
+        # (user, operation_date) 複合インデックス（営業日による検索用）
+        migrations.AddIndex(
+            model_name='homedata',
+            index=models.Index(fields=['user', 'operation_date'], name='homedata_user_opdate_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# マイグレーションファイル
+# 同一ユーザー・同一日付の重複データを統合し、(user, date) の一意制約を追加
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+COUNTER_FIELDS = (
+    'call_count', 'catch_count', 're_call_count', 'prospective_count',
+    'approach_ng_count', 'product_explanation_ng_count', 'acquisition_count',
+)
+
+
+def merge_duplicate_days(apps, schema_editor):
+    """同一日付の重複行を最も古い行に合算し、残りを削除（集計テーブルの合計値は変わらない）"""
+    HomeData = apps.get_model('api', 'HomeData')
+
+    duplicates = HomeData.objects.filter(date__isnull=False).values('user_id', 'date').annotate(
+        row_count=Count('id')
+    ).filter(row_count__gt=1)
+
+    for group in duplicates.iterator():
+        rows = list(HomeData.objects.filter(user_id=group['user_id'], date=group['date']).order_by('id'))
+        keeper, others = rows[0], rows[1:]
+        for field in COUNTER_FIELDS:
+            setattr(keeper, field, sum(getattr(row, field) or 0 for row in rows))
+        keeper.save(update_fields=COUNTER_FIELDS)
+        HomeData.objects.filter(pk__in=[row.pk for row in others]).delete()
+
+
+class Migration(migrations.Migration):
+
+    # 依存関係定義
+    dependencies = [
+        ('api', '0005_homedata_user_date_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # データベース操作定義
+    operations = [
+        # 既存の重複データを統合
+        migrations.RunPython(merge_duplicate_days, migrations.RunPython.noop),
+
+        # (user, date) の一意制約を追加（複合インデックスを兼ねるため通常インデックスは削除）
+        migrations.AddConstraint(
+            model_name='homedata',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='homedata_user_date_uniq'),
+        ),
+        migrations.RemoveIndex(
+            model_name='homedata',
+            name='homedata_user_date_idx',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# マイグレーションファイル
+# HomeDataに更新日時を追加（条件付きGETの検証子として使用）
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # 依存関係定義
+    dependencies = [
+        ('api', '0006_homedata_user_date_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # データベース操作定義
+    operations = [
+        # 更新日時フィールドの追加（既存行はマイグレーション実行時刻で初期化）
+        migrations.AddField(
+            model_name='homedata',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        # (user, updated_at) 複合インデックス（ユーザー別の最終更新日時取得用）
+        migrations.AddIndex(
+            model_name='homedata',
+            index=models.Index(fields=['user', 'updated_at'], name='homedata_user_updated_idx'),
+        ),
+    ]
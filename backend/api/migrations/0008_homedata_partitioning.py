@@ -0,0 +1,33 @@
+# マイグレーションファイル
+# HomeDataを記録日の月単位のレンジパーティションテーブルに変換（PostgreSQLかつHOMEDATA_PARTITIONING=Trueの場合のみ）
+# 既存行は作成した月別パーティションに移す。モデル定義は変更しない
+
+from django.conf import settings
+from django.db import migrations
+
+from api import partitioning
+
+
+def partition_home_data(apps, schema_editor):
+    if partitioning.enabled(schema_editor.connection):
+        partitioning.partition_table(schema_editor.connection)
+
+
+def unpartition_home_data(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        partitioning.unpartition_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    # 依存関係定義
+    dependencies = [
+        ('api', '0007_homedata_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # データベース操作定義
+    operations = [
+        # 月別パーティションテーブルへの変換（無効時・PostgreSQL以外は何もしない）
+        migrations.RunPython(partition_home_data, unpartition_home_data),
+    ]
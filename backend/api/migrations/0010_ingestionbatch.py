@@ -0,0 +1,26 @@
+# マイグレーションファイル
+# 書き込みバッファの適用済みWALファイルを記録するテーブルを追加
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # 依存関係定義
+    dependencies = [
+        ('api', '0009_archivedmonth'),
+    ]
+
+    # データベース操作定義
+    operations = [
+        # 適用済みのWALファイル（同一ファイルの二重適用防止用）
+        migrations.CreateModel(
+            name='IngestionBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=150, unique=True)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('applied_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# マイグレーションファイル
+# パーティションを切り離した月を記録するテーブルを追加
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # 依存関係定義
+    dependencies = [
+        ('api', '0010_ingestionbatch'),
+    ]
+
+    # データベース操作定義
+    operations = [
+        # 切り離した月（集計テーブルの再構築で対象外にする）
+        migrations.CreateModel(
+            name='DetachedMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year_month', models.CharField(max_length=7, unique=True)),
+                ('table_name', models.CharField(max_length=63)),
+                ('dropped', models.BooleanField(default=False)),
+                ('detached_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
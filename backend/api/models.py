@@ -1,9 +1,56 @@
 # データモデル定義
 # アプリケーションのデータ構造とデータベーススキーマを定義
 
-from django.db import models
+import datetime
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
+# 集計対象となる営業活動指標フィールド
+COUNTER_FIELDS = (
+    'call_count',
+    'catch_count',
+    're_call_count',
+    'prospective_count',
+    'approach_ng_count',
+    'product_explanation_ng_count',
+    'acquisition_count',
+)
+
+
+def month_bounds(year, month):
+    """指定年月の初日と翌月初日を返す（半開区間 [start, end)）"""
+    start = datetime.date(year, month, 1)
+    if month == 12:
+        return start, datetime.date(year + 1, 1, 1)
+    return start, datetime.date(year, month + 1, 1)
+
+
+class DateRangeQuerySet(models.QuerySet):
+    """
+    ユーザーと日付範囲で絞り込むクエリセット
+    date__year/date__monthは関数式となりインデックスが使えないため、
+    常に date >= start AND date < end の範囲条件で絞り込む
+    userにはUserインスタンス、トークン由来のユーザー（TokenUser）、ユーザーIDのいずれも指定可能
+    """
+    def for_user(self, user):
+        """指定ユーザーのデータに限定"""
+        return self.filter(user_id=getattr(user, 'pk', user))
+
+    def for_user_range(self, user, start, end):
+        """指定ユーザーの[start, end)期間のデータに限定"""
+        return self.for_user(user).filter(date__gte=start, date__lt=end)
+
+    def for_user_month(self, user, year, month):
+        """指定ユーザーの指定年月のデータに限定"""
+        start, end = month_bounds(year, month)
+        return self.for_user_range(user, start, end)
+
+    def for_user_date(self, user, day):
+        """指定ユーザーの指定日のデータに限定"""
+        return self.for_user(user).filter(date=day)
+
+
 class HomeData(models.Model):
     """
     日々の営業活動データを記録するモデル
@@ -23,15 +70,48 @@ class HomeData(models.Model):
     approach_ng_count = models.PositiveIntegerField(default=0, null=True, blank=True)  # アプローチNG数
     product_explanation_ng_count = models.PositiveIntegerField(default=0, null=True, blank=True)  # 商品説明NG数
     acquisition_count = models.IntegerField(default=0, null=True, blank=True)  # 獲得数
+    updated_at = models.DateTimeField(auto_now=True)  # 更新日時（条件付きGETの検証子に使用）
+
+    objects = DateRangeQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # 1ユーザー1日1件（一括登録のupsertキー、日付範囲検索のインデックスを兼ねる）
+            models.UniqueConstraint(fields=['user', 'date'], name='homedata_user_date_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'operation_date'], name='homedata_user_opdate_idx'),  # ユーザー別の営業日検索用
+            models.Index(fields=['user', 'updated_at'], name='homedata_user_updated_idx'),  # ユーザー別の最終更新日時取得用
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.operation_date}"  # 管理画面等での表示名
 
     def save(self, *args, **kwargs):
+        from .rollups import record_change
+
         # 営業日未設定時は記録日を使用
         if not self.operation_date:
             self.operation_date = self.date
-        super().save(*args, **kwargs)
+
+        # 本体の保存と集計テーブルの差分更新を同一トランザクションで実行
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = HomeData.objects.select_for_update().filter(pk=self.pk).values(
+                    'user_id', 'date', *COUNTER_FIELDS
+                ).first()
+            # 保存前の値（post_saveシグナルで時系列キャッシュの変更前の記録日も更新するために使用）
+            self._previous_values = previous
+            super().save(*args, **kwargs)
+            record_change(previous, self)
+
+
+# 負数を取り得ない指標（獲得数以外）
+NON_NEGATIVE_COUNTER_FIELDS = tuple(
+    field for field in COUNTER_FIELDS
+    if isinstance(HomeData._meta.get_field(field), models.PositiveIntegerField)
+)
 
 
 class MonthlyTarget(models.Model):
@@ -50,3 +130,100 @@ class MonthlyTarget(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.year_month}"  # 管理画面等での表示名
+
+
+class DailyRollup(models.Model):
+    """
+    ユーザー別・日別の営業実績集計モデル
+    HomeDataの保存と同一トランザクションで差分更新される
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')  # ユーザー参照
+    date = models.DateField(verbose_name="記録日")  # 集計対象日
+
+    # 営業活動指標の日別合計
+    call_count = models.IntegerField(default=0)
+    catch_count = models.IntegerField(default=0)
+    re_call_count = models.IntegerField(default=0)
+    prospective_count = models.IntegerField(default=0)
+    approach_ng_count = models.IntegerField(default=0)
+    product_explanation_ng_count = models.IntegerField(default=0)
+    acquisition_count = models.IntegerField(default=0)
+
+    objects = DateRangeQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'date')  # ユーザーと日付の組み合わせで一意
+
+    def __str__(self):
+        return f"{self.user.username} - {self.date}"
+
+
+class MonthlyRollup(models.Model):
+    """
+    ユーザー別・月別の営業実績集計モデル
+    MonthlySummaryAPIは生データではなくこの行を参照する
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_rollups')  # ユーザー参照
+    year_month = models.CharField(max_length=7)  # YYYY-MM形式（MonthlyTargetと同形式）
+
+    # 営業活動指標の月別合計
+    call_count = models.IntegerField(default=0)
+    catch_count = models.IntegerField(default=0)
+    re_call_count = models.IntegerField(default=0)
+    prospective_count = models.IntegerField(default=0)
+    approach_ng_count = models.IntegerField(default=0)
+    product_explanation_ng_count = models.IntegerField(default=0)
+    acquisition_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'year_month')  # ユーザーと年月の組み合わせで一意
+
+    def __str__(self):
+        return f"{self.user.username} - {self.year_month}"
+
+
+class ArchivedMonth(models.Model):
+    """
+    アーカイブ済みの月（ユーザー別）
+    該当月のHomeData・DailyRollupは削除済みで、日別の値はアーカイブファイル（ARCHIVE_DIR配下）から読み取る
+    月別の合計はMonthlyRollupに残す
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_months')  # ユーザー参照
+    year_month = models.CharField(max_length=7)  # YYYY-MM形式（MonthlyRollupと同形式）
+    path = models.CharField(max_length=255)  # アーカイブファイルのパス（ARCHIVE_DIRからの相対パス）
+    row_count = models.PositiveIntegerField(default=0)  # アーカイブした行数
+    archived_at = models.DateTimeField(auto_now_add=True)  # アーカイブ日時
+
+    class Meta:
+        unique_together = ('user', 'year_month')  # ユーザーと年月の組み合わせで一意
+
+    def __str__(self):
+        return f"{self.user.username} - {self.year_month}"
+
+
+class DetachedMonth(models.Model):
+    """
+    パーティションを切り離した月（全ユーザー共通、detach_partitionコマンドで記録）
+    該当月のHomeDataはテーブルから外れている（drop時は削除済み）ため、DailyRollup・MonthlyRollupの値を正とする
+    該当月への書き込み（登録・更新・一括登録・加算）は拒否する
+    """
+    year_month = models.CharField(max_length=7, unique=True)  # YYYY-MM形式（MonthlyRollupと同形式）
+    table_name = models.CharField(max_length=63)  # 切り離したパーティションのテーブル名
+    dropped = models.BooleanField(default=False)  # 切り離したテーブルを削除したか
+    detached_at = models.DateTimeField(auto_now_add=True)  # 切り離し日時
+
+    def __str__(self):
+        return self.year_month
+
+
+class IngestionBatch(models.Model):
+    """
+    書き込みバッファからDBへ適用済みのWALファイル
+    適用と同一トランザクションで記録し、WALファイルの削除前に異常終了した場合の二重適用を防ぐ
+    """
+    name = models.CharField(max_length=150, unique=True)  # WALファイル名
+    row_count = models.PositiveIntegerField(default=0)  # 加算した（ユーザー, 日付）の件数
+    applied_at = models.DateTimeField(auto_now_add=True)  # 適用日時
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,16 @@
+# ページネーション定義
+# 一覧APIのページ分割方式を定義
+
+from rest_framework.pagination import CursorPagination
+
+
+class DateCursorPagination(CursorPagination):
+    """
+    (date, id) 順のカーソルページネーション
+    OFFSET方式と異なり、深いページでも直前ページの位置からの範囲検索で取得できる
+    (user, date) が一意のため、日付をカーソル位置として安定した next を返す
+    """
+    ordering = ('date', 'id')
+    page_size = 100  # 1ページあたりの件数
+    page_size_query_param = 'page_size'  # クライアント指定の件数パラメータ
+    max_page_size = 1000  # 指定可能な最大件数
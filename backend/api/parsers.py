@@ -0,0 +1,32 @@
+# リクエストボディのパーサー定義
+# DRF標準で扱えない形式のリクエストボディを解析する
+
+import codecs
+import csv
+
+from rest_framework.parsers import BaseParser
+
+
+class CSVRowParser(BaseParser):
+    """
+    CSV形式のリクエストボディを1行ずつ辞書に変換するパーサー
+    ボディ全体をメモリに読み込まず、ストリームから逐次読み出す
+    1行目はヘッダー行（フィールド名）として扱い、空欄はNoneに変換
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding') or 'utf-8'
+        if encoding.lower().replace('_', '-') == 'utf-8':
+            encoding = 'utf-8-sig'  # Excel出力のBOM付きCSVに対応
+        lines = codecs.iterdecode(iter(stream.readline, b''), encoding) if stream else iter(())
+        return self.iter_rows(lines)
+
+    def iter_rows(self, lines):
+        """CSVの各行をヘッダー名をキーとした辞書として順に返す"""
+        for row in csv.DictReader(lines):
+            yield {
+                key.strip(): (value.strip() or None) if isinstance(value, str) else value
+                for key, value in row.items() if key
+            }
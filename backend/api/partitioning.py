@@ -0,0 +1,208 @@
+# HomeDataテーブルの月別パーティション管理（PostgreSQLのみ、HOMEDATA_PARTITIONING=Trueで有効）
+# api_homedataを記録日（date）の月単位のレンジパーティションテーブルとし、
+# 月単位の範囲条件（date >= 月初 AND date < 翌月初）のクエリが該当月のパーティションのみを走査するようにする
+# 対応する月のパーティションがない行（記録日未設定を含む）はデフォルトパーティションに格納する
+
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import DetachedMonth
+from .periods import add_months
+
+TABLE = 'api_homedata'
+DEFAULT_PARTITION = f'{TABLE}_default'
+# パーティションキーを含まない主キー(id)の代わりに設定する一意制約
+ID_DATE_CONSTRAINT = 'homedata_id_date_uniq'
+
+
+def enabled(connection):
+    return connection.vendor == 'postgresql' and getattr(settings, 'HOMEDATA_PARTITIONING', False)
+
+
+def partition_name(year, month):
+    return f'{TABLE}_p{year:04d}_{month:02d}'
+
+
+def is_partitioned(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))', [TABLE]
+        )
+        return cursor.fetchone()[0]
+
+
+def list_partitions(connection):
+    """接続中のパーティション名と範囲の一覧（名前順）"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) '
+            'FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s) ORDER BY child.relname',
+            [TABLE],
+        )
+        return cursor.fetchall()
+
+
+def create_partition(connection, year, month):
+    """
+    指定年月のパーティションを作成（作成済みの場合はFalse）
+    デフォルトパーティションに該当月の行がある場合は、新しいパーティションへ移してから作成する
+    """
+    name = partition_name(year, month)
+    if name in {partition for partition, _ in list_partitions(connection)}:
+        return False
+
+    start = datetime.date(year, month, 1)
+    end = datetime.date(*add_months(year, month, 1), 1)
+    quote = connection.ops.quote_name
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        # デフォルトパーティションに該当月の行が残っていると作成できないため一時テーブルへ退避
+        cursor.execute(f'CREATE TEMPORARY TABLE homedata_moving (LIKE {quote(TABLE)})')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)} WHERE date >= %s AND date < %s RETURNING *) '
+            'INSERT INTO homedata_moving SELECT * FROM moved',
+            [start, end],
+        )
+        cursor.execute(
+            f'CREATE TABLE {quote(name)} PARTITION OF {quote(TABLE)} FOR VALUES FROM (%s) TO (%s)',
+            [start, end],
+        )
+        cursor.execute(f'INSERT INTO {quote(TABLE)} SELECT * FROM homedata_moving')
+        cursor.execute('DROP TABLE homedata_moving')
+    return True
+
+
+def ensure_partitions(connection, ahead=None, first=None):
+    """
+    first（省略時は当月）から当月のahead（省略時はHOMEDATA_PARTITIONS_AHEAD）か月先までのパーティションを作成
+    作成したパーティション名のリストを返す
+    """
+    if ahead is None:
+        ahead = getattr(settings, 'HOMEDATA_PARTITIONS_AHEAD', 2)
+    today = datetime.date.today()
+    year, month = first or (today.year, today.month)
+    last = add_months(today.year, today.month, ahead)
+    created = []
+    while (year, month) <= last:
+        if create_partition(connection, year, month):
+            created.append(partition_name(year, month))
+        year, month = add_months(year, month, 1)
+    return created
+
+
+def detach_partition(connection, year, month, drop=False):
+    """
+    指定年月のパーティションを切り離す（メタデータの変更のみで、行の削除・移動は発生しない）
+    切り離したテーブルは独立したテーブルとして残る（drop=Trueで削除）
+    切り離した月はDetachedMonthに記録し、集計テーブルの再構築（rollups.rebuild）でも
+    DailyRollup/MonthlyRollupの値を残すため、月間サマリーの結果は変わらない
+    """
+    name = partition_name(year, month)
+    if name not in {partition for partition, _ in list_partitions(connection)}:
+        return False
+    quote = connection.ops.quote_name
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(name)}')
+        if drop:
+            cursor.execute(f'DROP TABLE {quote(name)}')
+        DetachedMonth.objects.using(connection.alias).update_or_create(
+            year_month=f'{year}-{month:02}',
+            defaults={'table_name': name, 'dropped': drop},
+        )
+    return True
+
+
+def detached_year_months():
+    """パーティションを切り離した年月の集合（書き込みの拒否判定用）"""
+    return set(DetachedMonth.objects.values_list('year_month', flat=True))
+
+
+def _definitions(cursor, table):
+    """テーブルの主キー・一意制約・外部キーと、制約以外のインデックスの定義を取得"""
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u', 'f') ORDER BY contype DESC, conname",
+        [table],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        'SELECT pg_get_indexdef(x.indexrelid) FROM pg_index x '
+        'WHERE x.indrelid = to_regclass(%s) AND NOT EXISTS ('
+        '  SELECT 1 FROM pg_constraint c WHERE c.conrelid = x.indrelid AND c.conindid = x.indexrelid'
+        ') ORDER BY x.indexrelid',
+        [table],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    return constraints, indexes
+
+
+def _rebuild(connection, partitioned):
+    """
+    api_homedataを作り直して既存行を移す（partitioned=Trueでパーティションテーブル、Falseで通常のテーブル）
+    パーティションテーブルの一意制約はパーティションキーを含む必要があるため、主キー(id)は(id, date)の一意制約に置き換える
+    idの採番は引き継ぐ
+    """
+    quote = connection.ops.quote_name
+    previous = f'{TABLE}_previous'
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        constraints, indexes = _definitions(cursor, TABLE)
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT attidentity <> '' FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = 'id'",
+            [TABLE],
+        )
+        identity = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} RENAME TO {quote(previous)}')
+        cursor.execute(
+            f'CREATE TABLE {quote(TABLE)} (LIKE {quote(previous)} INCLUDING DEFAULTS INCLUDING IDENTITY '
+            'INCLUDING CONSTRAINTS INCLUDING STORAGE INCLUDING COMMENTS)'
+            + (' PARTITION BY RANGE (date)' if partitioned else '')
+        )
+        if partitioned:
+            cursor.execute(f'CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {quote(TABLE)} DEFAULT')
+            cursor.execute(f'SELECT MIN(date) FROM {quote(previous)}')
+            oldest = cursor.fetchone()[0]
+            ensure_partitions(connection, first=(oldest.year, oldest.month) if oldest else None)
+        cursor.execute(f'INSERT INTO {quote(TABLE)} SELECT * FROM {quote(previous)}')
+
+        # 採番の引き継ぎ（identity列は新しい列のシーケンスを既存の最大値に合わせ、serial列はシーケンスの所有者を移す）
+        if identity:
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+            new_sequence = cursor.fetchone()[0]
+            cursor.execute(
+                f'SELECT setval(%s, COALESCE(MAX(id), 0) + 1, false) FROM {quote(TABLE)}', [new_sequence]
+            )
+        elif sequence:
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {quote(TABLE)}.id')
+        cursor.execute(f'DROP TABLE {quote(previous)}')
+        if identity and sequence:
+            cursor.execute(f'ALTER SEQUENCE {new_sequence} RENAME TO {sequence.rsplit(".", 1)[-1]}')
+
+        # 制約・インデックスを同じ名前で作り直す（データ投入後にまとめて作成）
+        for name, kind, definition in constraints:
+            if partitioned and kind == 'p':
+                name, definition = ID_DATE_CONSTRAINT, 'UNIQUE (id, date)'
+            elif not partitioned and name == ID_DATE_CONSTRAINT:
+                name, definition = f'{TABLE}_pkey', 'PRIMARY KEY (id)'
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(name)} {definition}')
+        for definition in indexes:
+            cursor.execute(definition)
+
+
+def partition_table(connection):
+    """api_homedataを月別パーティションテーブルに変換（変換済みの場合は何もしない）"""
+    if not is_partitioned(connection):
+        _rebuild(connection, partitioned=True)
+
+
+def unpartition_table(connection):
+    """
+    月別パーティションテーブルを通常のテーブルに戻す（接続中のパーティションの行のみ移す）
+    切り離し済みのパーティションは独立したテーブルとして残る
+    """
+    if is_partitioned(connection):
+        _rebuild(connection, partitioned=False)
@@ -0,0 +1,52 @@
+# 期間計算のユーティリティ
+# 集計区間（日・週・月）の開始日の列挙や前年同日の算出を行う
+
+import datetime
+
+
+def shift_year(day, years):
+    """指定年数だけずらした日付を返す（存在しない2/29は2/28とする）"""
+    try:
+        return day.replace(year=day.year + years)
+    except ValueError:
+        return day.replace(year=day.year + years, day=28)
+
+
+def add_months(year, month, count):
+    """指定年月からcountか月後（負数で前）の年月を返す"""
+    index = year * 12 + (month - 1) + count
+    return index // 12, index % 12 + 1
+
+
+def bucket_start(day, group_by):
+    """日付が属する区間の開始日（週は月曜日、月は1日）"""
+    if group_by == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if group_by == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def count_buckets(date_from, date_to, group_by):
+    """期間 [date_from, date_to] に含まれる区間の数（区間を列挙せずに求める）"""
+    if group_by == 'month':
+        return (date_to.year - date_from.year) * 12 + date_to.month - date_from.month + 1
+    days = (date_to - bucket_start(date_from, group_by)).days
+    return days // 7 + 1 if group_by == 'week' else days + 1
+
+
+def iter_bucket_starts(date_from, date_to, group_by):
+    """期間 [date_from, date_to] に含まれる区間の開始日を順に返す"""
+    current = bucket_start(date_from, group_by)
+    while current <= date_to:
+        yield current
+        try:
+            if group_by == 'week':
+                current += datetime.timedelta(days=7)
+            elif group_by == 'month':
+                current = (current + datetime.timedelta(days=32)).replace(day=1)
+            else:
+                current += datetime.timedelta(days=1)
+        except OverflowError:
+            # 次の区間が日付の上限（9999-12-31）を超える
+            return
@@ -0,0 +1,218 @@
+# リクエスト単位のプロファイル取得
+# 管理者ユーザーのヘッダー指定またはサンプリングで対象リクエストを選び、
+# cProfile（必要に応じてtracemallocのメモリ割り当て）の結果をファイルに保存する
+# 対象外のリクエストではヘッダーの有無を確認するのみで、計測処理は一切行わない
+
+import cProfile
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+from rest_framework.exceptions import APIException
+
+from .authentication import CachedJWTAuthentication
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'  # X-Profile: 1（cProfileのみ） / memory（tracemallocも取得）
+
+# cProfileは同一スレッドで同時に1つしか有効にできないため、取得は同時に1件までとする
+_capture_lock = threading.Lock()
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILE_DIR', None) or os.path.join(tempfile.gettempdir(), 'koruapokun_profiles')
+
+
+def list_captures(limit=None):
+    """保存済みのプロファイルのメタデータを新しい順に返す"""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    captures = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            captures.append(json.load(f))
+        if limit is not None and len(captures) >= limit:
+            break
+    return captures
+
+
+def _prune(directory, keep):
+    """保存件数の上限を超えた古いプロファイルを削除"""
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in names[:max(0, len(names) - keep)]:
+        capture_id = name[:-len('.json')]
+        for suffix in ('.json', '.prof', '.tracemalloc'):
+            path = os.path.join(directory, capture_id + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class Capture:
+    """
+    1リクエスト分のプロファイル取得
+    cProfileは有効にしたスレッドのみを計測するため、start・stop・abortはビューを実行するスレッドで呼び出す
+    scope: 計測範囲（request: WSGIのリクエスト処理スレッド、view_thread: ASGIで同期ビューを実行するスレッド、
+           event_loop: ASGIの非同期ビュー。待機中に同じイベントループで動く他のリクエストの処理も含む）
+    """
+
+    def __init__(self, request, trigger, memory, scope='request'):
+        self.request = request
+        self.trigger = trigger
+        self.memory = memory
+        self.scope = scope
+        self.profiler = cProfile.Profile()
+        self.capture_id = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:6]}"
+
+    def start(self):
+        if self.memory:
+            tracemalloc.start(getattr(settings, 'PROFILE_TRACEMALLOC_FRAMES', 10))
+        self.started = time.perf_counter()
+        self.profiler.enable()
+
+    def abort(self):
+        """例外発生時は結果を保存せずに計測を終了"""
+        self.profiler.disable()
+        if self.memory:
+            tracemalloc.stop()
+
+    def stop(self, response):
+        """計測を終了して結果を保存し、レスポンスにX-Profile-Idヘッダーを付与"""
+        self.profiler.disable()
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        snapshot = None
+        if self.memory:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+        directory = profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.capture_id)
+        self.profiler.dump_stats(base + '.prof')
+        if snapshot is not None:
+            snapshot.dump(base + '.tracemalloc')
+
+        match = getattr(self.request, 'resolver_match', None)
+        metadata = {
+            'id': self.capture_id,
+            'captured_at': datetime.now().isoformat(timespec='seconds'),
+            'method': self.request.method,
+            'path': self.request.path,
+            'route': match.route if match is not None else None,
+            'status_code': response.status_code,
+            'duration_ms': round(duration_ms, 1),
+            'trigger': self.trigger,
+            'scope': self.scope,
+            'memory': snapshot is not None,
+        }
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False)
+        _prune(directory, getattr(settings, 'PROFILE_MAX_CAPTURES', 200))
+        response['X-Profile-Id'] = self.capture_id
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    対象リクエストのビュー処理をcProfileで計測するミドルウェア
+    対象: X-Profileヘッダー付きの管理者ユーザー（JWTのis_staffクレームで判定）のリクエスト、
+    またはPROFILE_SAMPLE_RATEの確率で抽出したリクエスト
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def trigger_of(self, request):
+        """プロファイル対象なら（取得理由, メモリ計測の有無）を返す（対象外ならNone）"""
+        requested = request.META.get(PROFILE_HEADER)
+        if requested and self.is_staff(request):
+            return 'header', requested.lower() == 'memory'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sample', getattr(settings, 'PROFILE_SAMPLE_TRACEMALLOC', False)
+        return None
+
+    @staticmethod
+    def is_staff(request):
+        """JWTのクレームから管理者ユーザーか判定（DBアクセスなし）"""
+        try:
+            result = CachedJWTAuthentication().authenticate(request)
+        except APIException:
+            return False
+        return result is not None and result[0].is_staff
+
+    @staticmethod
+    def is_async_view(request):
+        """リクエストのビューが非同期ビューか（解決できないURLは同期として扱う）"""
+        try:
+            match = resolve(request.path_info, getattr(request, 'urlconf', None))
+        except Resolver404:
+            return False
+        return iscoroutinefunction(match.func)
+
+    def begin(self, request, scope='request'):
+        """プロファイル対象なら取得を開始せずに返す（対象外・他のリクエストを取得中ならNone）"""
+        trigger = self.trigger_of(request)
+        if trigger is None or not _capture_lock.acquire(blocking=False):
+            return None
+        return Capture(request, *trigger, scope=scope)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        capture = self.begin(request)
+        if capture is None:
+            return self.get_response(request)
+        capture.start()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            capture.abort()
+            _capture_lock.release()
+            raise
+        try:
+            return capture.stop(response)
+        finally:
+            _capture_lock.release()
+
+    async def __acall__(self, request):
+        # 同期ビュー（DRFのAPI）はリクエストごとのスレッド（sync_to_async、thread_sensitive）で実行されるため、
+        # 同じスレッドで計測を開始・終了する。非同期ビューはイベントループ上で計測する
+        capture = self.begin(request, 'event_loop' if self.is_async_view(request) else 'view_thread')
+        if capture is None:
+            return await self.get_response(request)
+        await self._in_scope(capture, capture.start)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            await self._in_scope(capture, capture.abort)
+            _capture_lock.release()
+            raise
+        try:
+            return await self._in_scope(capture, capture.stop, response)
+        finally:
+            _capture_lock.release()
+
+    @staticmethod
+    async def _in_scope(capture, method, *args):
+        """計測範囲のスレッドでcaptureのメソッドを呼び出す"""
+        if capture.scope == 'view_thread':
+            return await sync_to_async(method, thread_sensitive=True)(*args)
+        return method(*args)
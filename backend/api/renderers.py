@@ -0,0 +1,39 @@
+# レスポンスレンダラー定義
+# エクスポートAPIの ?format=csv / ?format=ndjson 指定をDRFのコンテンツネゴシエーションで受け付ける
+# 正常時はビューがストリーミングレスポンスを直接返すため、ここではエラー応答のみを描画する
+
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class CSVRenderer(BaseRenderer):
+    """CSV形式のレンダラー（エラー内容をヘッダー付き1行のCSVとして出力）"""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, dict):
+            data = {'detail': data}
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(data.keys())
+        writer.writerow(data.values())
+        return buffer.getvalue().encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """NDJSON形式のレンダラー（エラー内容を1行のJSONとして出力）"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data, ensure_ascii=False) + '\n').encode(self.charset)
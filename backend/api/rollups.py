@@ -0,0 +1,226 @@
+# 集計テーブル（ロールアップ）の更新処理
+# HomeDataの作成・更新・削除に合わせて日別・月別の合計値を差分更新する
+
+import datetime
+import operator
+from collections import defaultdict
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import COUNTER_FIELDS, ArchivedMonth, DailyRollup, DetachedMonth, HomeData, MonthlyRollup, month_bounds
+
+
+def year_month_of(day):
+    """日付をMonthlyTargetと同じYYYY-MM形式の文字列に変換"""
+    return f"{day.year}-{day.month:02}"
+
+
+def _as_date(value):
+    """文字列で渡された日付をdateに変換（未設定ならNone）"""
+    if value is None or isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value))
+
+
+def counter_values(source):
+    """モデルインスタンスまたは辞書から指標値を取り出す（Noneは0扱い）"""
+    if isinstance(source, dict):
+        return {field: source.get(field) or 0 for field in COUNTER_FIELDS}
+    return {field: getattr(source, field) or 0 for field in COUNTER_FIELDS}
+
+
+def apply_delta(user_id, day, delta, create=True):
+    """
+    指定ユーザー・日付の日別／月別集計に差分を加算
+    集計行が存在しない場合はcreate=Trueのときのみ作成する
+    """
+    day = _as_date(day)
+    if day is None or not any(delta.values()):
+        return
+
+    expressions = {field: F(field) + value for field, value in delta.items() if value}
+    targets = (
+        (DailyRollup, {'date': day}),
+        (MonthlyRollup, {'year_month': year_month_of(day)}),
+    )
+    for model, lookup in targets:
+        updated = model.objects.filter(user_id=user_id, **lookup).update(**expressions)
+        if not updated and create:
+            # 集計行がなければ差分をそのまま初期値として作成（同時作成された場合のみ再加算）
+            _, created = model.objects.get_or_create(user_id=user_id, **lookup, defaults=delta)
+            if not created:
+                model.objects.filter(user_id=user_id, **lookup).update(**expressions)
+
+
+def record_change(previous, instance):
+    """
+    HomeData保存時の差分を集計テーブルへ反映
+    previousは保存前のDB値（新規作成時はNone）
+    """
+    current = counter_values(instance)
+    if previous is not None:
+        before = counter_values(previous)
+        same_key = (
+            previous['user_id'] == instance.user_id
+            and _as_date(previous['date']) == _as_date(instance.date)
+        )
+        if same_key:
+            apply_delta(instance.user_id, instance.date, {
+                field: current[field] - before[field] for field in COUNTER_FIELDS
+            })
+            return
+        # ユーザーまたは日付が変わった場合は旧集計から差し引く
+        apply_delta(previous['user_id'], previous['date'], {
+            field: -value for field, value in before.items()
+        }, create=False)
+    apply_delta(instance.user_id, instance.date, current)
+
+
+def record_delete(instance):
+    """HomeData削除時に集計テーブルから値を差し引く"""
+    apply_delta(instance.user_id, instance.date, {
+        field: -value for field, value in counter_values(instance).items()
+    }, create=False)
+
+
+def refresh_dates(user_id, dates):
+    """
+    指定ユーザー・日付の集計を生データから再計算
+    bulk_createなどsave()を経由しない一括書き込みの後に呼び出す
+    """
+    days = sorted({_as_date(day) for day in dates if day is not None})
+    if not days:
+        return
+
+    sums = {
+        row['date']: {field: row[f'sum_{field}'] or 0 for field in COUNTER_FIELDS}
+        for row in HomeData.objects.filter(user_id=user_id, date__in=days).values('date').annotate(
+            **{f'sum_{field}': Sum(field) for field in COUNTER_FIELDS}
+        )
+    }
+    DailyRollup.objects.bulk_create(
+        [
+            DailyRollup(user_id=user_id, date=day, **sums.get(day, dict.fromkeys(COUNTER_FIELDS, 0)))
+            for day in days
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'date'],
+        update_fields=list(COUNTER_FIELDS),
+    )
+
+    # 影響を受けた月の合計を日別集計から再計算
+    for year, month in sorted({(day.year, day.month) for day in days}):
+        totals = DailyRollup.objects.for_user_month(user_id, year, month).aggregate(
+            **{field: Sum(field) for field in COUNTER_FIELDS}
+        )
+        MonthlyRollup.objects.update_or_create(
+            user_id=user_id,
+            year_month=f"{year}-{month:02}",
+            defaults={field: value or 0 for field, value in totals.items()},
+        )
+
+
+def refresh_keys(keys):
+    """
+    複数ユーザーの (user_id, 日付) の集計を生データから一括で再計算（refresh_datesの複数ユーザー版）
+    件数によらずクエリ数は一定（1ユーザー1日1行のため日別集計は生データの値をそのまま使用）
+    月別の合計は日別集計から再計算するため、アーカイブ済みの月の日付は渡さないこと
+    """
+    keys = sorted({(user_id, _as_date(day)) for user_id, day in keys if day is not None})
+    if not keys:
+        return
+
+    rows = HomeData.objects.filter(
+        reduce(operator.or_, (Q(user_id=user_id, date=day) for user_id, day in keys))
+    ).values('user_id', 'date', *COUNTER_FIELDS)
+    values = {(row['user_id'], row['date']): counter_values(row) for row in rows}
+    DailyRollup.objects.bulk_create(
+        [
+            DailyRollup(user_id=user_id, date=day, **values.get((user_id, day), dict.fromkeys(COUNTER_FIELDS, 0)))
+            for user_id, day in keys
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'date'],
+        update_fields=list(COUNTER_FIELDS),
+    )
+
+    # 影響を受けたユーザー・月の合計を日別集計から再計算
+    months = sorted({(user_id, day.year, day.month) for user_id, day in keys})
+    month_filter = reduce(operator.or_, (
+        Q(user_id=user_id, date__gte=start, date__lt=end)
+        for user_id, year, month in months
+        for start, end in [month_bounds(year, month)]
+    ))
+    totals = DailyRollup.objects.filter(month_filter).annotate(month=TruncMonth('date')).values(
+        'user_id', 'month'
+    ).annotate(**{f'sum_{field}': Sum(field) for field in COUNTER_FIELDS}).order_by()
+    MonthlyRollup.objects.bulk_create(
+        [
+            MonthlyRollup(
+                user_id=row['user_id'],
+                year_month=year_month_of(row['month']),
+                **{field: row[f'sum_{field}'] or 0 for field in COUNTER_FIELDS},
+            )
+            for row in totals
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'year_month'],
+        update_fields=list(COUNTER_FIELDS),
+    )
+
+
+def rebuild(user_ids=None):
+    """
+    生データから集計テーブルを再構築
+    user_idsを指定した場合は該当ユーザーのみ対象
+    アーカイブ済みの月は生データがないため、月別集計をそのまま残す
+    パーティションを切り離した月も生データがテーブルにないため、日別・月別集計をそのまま残す
+    戻り値は作成した（日別件数, 月別件数）
+    """
+    source = HomeData.objects.filter(date__isnull=False)
+    daily_rollups = DailyRollup.objects.all()
+    monthly_rollups = MonthlyRollup.objects.exclude(Exists(
+        ArchivedMonth.objects.filter(user_id=OuterRef('user_id'), year_month=OuterRef('year_month'))
+    ))
+    detached = list(DetachedMonth.objects.values_list('year_month', flat=True))
+    if detached:
+        detached_dates = reduce(operator.or_, (
+            Q(date__gte=start, date__lt=end)
+            for year_month in detached
+            for start, end in [month_bounds(*map(int, year_month.split('-')))]
+        ))
+        source = source.exclude(detached_dates)
+        daily_rollups = daily_rollups.exclude(detached_dates)
+        monthly_rollups = monthly_rollups.exclude(year_month__in=detached)
+    if user_ids is not None:
+        source = source.filter(user_id__in=user_ids)
+        daily_rollups = daily_rollups.filter(user_id__in=user_ids)
+        monthly_rollups = monthly_rollups.filter(user_id__in=user_ids)
+
+    daily_rows = source.values('user_id', 'date').annotate(
+        **{f'sum_{field}': Sum(field) for field in COUNTER_FIELDS}
+    ).order_by('user_id', 'date')
+
+    daily_objects = []
+    monthly_totals = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    for row in daily_rows.iterator():
+        values = {field: row[f'sum_{field}'] or 0 for field in COUNTER_FIELDS}
+        daily_objects.append(DailyRollup(user_id=row['user_id'], date=row['date'], **values))
+        totals = monthly_totals[(row['user_id'], year_month_of(row['date']))]
+        for field, value in values.items():
+            totals[field] += value
+
+    monthly_objects = [
+        MonthlyRollup(user_id=user_id, year_month=year_month, **values)
+        for (user_id, year_month), values in monthly_totals.items()
+    ]
+
+    with transaction.atomic():
+        daily_rollups.delete()
+        monthly_rollups.delete()
+        DailyRollup.objects.bulk_create(daily_objects, batch_size=1000)
+        MonthlyRollup.objects.bulk_create(monthly_objects, batch_size=1000)
+    return len(daily_objects), len(monthly_objects)
@@ -0,0 +1,95 @@
+# 読み取り専用レプリカへの振り分け
+# 参照系APIの読み取りクエリをreplicaに送り、書き込みは常にdefault（プライマリ）で行う
+# 書き込み直後のユーザーは一定時間プライマリから読み取り、保存したデータがすぐに集計へ反映されるようにする
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+
+# 処理中のリクエストの読み取り先（参照系APIの処理中のみreplica）
+_read_alias = ContextVar('read_alias', default=PRIMARY)
+
+
+def _cache():
+    return caches[getattr(settings, 'SUMMARY_CACHE_ALIAS', 'default')]
+
+
+def _sticky_key(user_id):
+    return f'replica:sticky:{user_id}'
+
+
+def replica_enabled():
+    return REPLICA in settings.DATABASES
+
+
+def stick_to_primary(user_id):
+    """
+    書き込みを行ったユーザーを一定時間（REPLICA_STICKY_SECONDS）プライマリからの読み取りに固定
+    ワーカープロセス間で共有するためキャッシュに記録する
+    """
+    if replica_enabled():
+        _cache().set(_sticky_key(user_id), True, getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+
+
+def read_alias_for(user_id):
+    """ユーザーの読み取り先（レプリカ未設定または書き込み直後ならプライマリ）"""
+    if not replica_enabled() or _cache().get(_sticky_key(user_id)):
+        return PRIMARY
+    return REPLICA
+
+
+async def aread_alias_for(user_id):
+    """read_alias_forの非同期版"""
+    if not replica_enabled() or await _cache().aget(_sticky_key(user_id)):
+        return PRIMARY
+    return REPLICA
+
+
+def current_read_alias():
+    return _read_alias.get()
+
+
+@contextmanager
+def reading_from(alias):
+    """ブロック内の読み取りクエリの接続先を指定"""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def read_from_replica(view_method):
+    """
+    参照系APIのメソッドの読み取りクエリをレプリカに送るデコレーター
+    条件付きGETの検証子の取得も含めるため、他のデコレーターより外側に付ける
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        with reading_from(read_alias_for(request.user.pk)):
+            return view_method(self, request, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    """
+    読み取りは処理中のリクエストで指定された接続先（既定はプライマリ）、書き込みは常にプライマリ
+    replicaはdefaultの複製のため、接続先をまたぐリレーションも許可する
+    """
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
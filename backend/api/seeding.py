@@ -0,0 +1,115 @@
+# 負荷試験用の合成データ生成
+# 実際の営業活動に近い分布のHomeData・MonthlyTargetをbulk_createで一括投入する
+
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+
+from .models import HomeData, MonthlyTarget
+from .rollups import rebuild, year_month_of
+
+BATCH_SIZE = 2000
+
+# 合成データのユーザーの目印（実ユーザーを削除しないよう、削除時は両方を満たすユーザーのみ対象とする）
+# ユーザー登録APIは英数字・日本語のみ受け付けるため、"_"を含む接頭辞の実ユーザーは作成されない
+SYNTHETIC_PREFIX = 'synthetic__'  # ユーザー名の接頭辞（指定の接頭辞の前に付与）
+SYNTHETIC_MARKER = 'synthetic-data'  # last_nameに設定する値
+
+
+def generate_counts(rng):
+    """
+    1日分の営業活動指標を生成
+    発信数→応対数→（再コール/見込み/NG/獲得）の順に絞り込まれる漏斗型の分布とする
+    """
+    call_count = max(0, int(rng.gauss(80, 25)))
+    catch_count = int(call_count * rng.uniform(0.2, 0.5))
+    acquisition_count = int(catch_count * rng.uniform(0.0, 0.12))
+    prospective_count = int(catch_count * rng.uniform(0.05, 0.2))
+    re_call_count = int(catch_count * rng.uniform(0.1, 0.3))
+    remaining = max(0, catch_count - acquisition_count - prospective_count - re_call_count)
+    approach_ng_count = int(remaining * rng.uniform(0.3, 0.7))
+    product_explanation_ng_count = remaining - approach_ng_count
+    return {
+        'call_count': call_count,
+        'catch_count': catch_count,
+        're_call_count': re_call_count,
+        'prospective_count': prospective_count,
+        'approach_ng_count': approach_ng_count,
+        'product_explanation_ng_count': product_explanation_ng_count,
+        'acquisition_count': acquisition_count,
+    }
+
+
+def seed(users, days, end_date, prefix='seed', password='password123', random_seed=None, weekend_ratio=0.2):
+    """
+    users人 × 直近days日分（end_dateまで）の営業データと月間目標を作成
+    ユーザー名は SYNTHETIC_PREFIX + prefix + 連番 とし、合成データの目印（SYNTHETIC_MARKER）を付ける
+    土日はweekend_ratioの確率でのみ稼働したものとする
+    集計テーブルはbulk_create後にまとめて再構築する
+    戻り値は作成したユーザーのリスト
+    """
+    rng = random.Random(random_seed)
+    hashed_password = make_password(password)  # 全ユーザー共通（ハッシュ計算は1回のみ）
+    dates = [end_date - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+    year_months = sorted({year_month_of(day) for day in dates})
+
+    with transaction.atomic():
+        created = User.objects.bulk_create(
+            [
+                User(username=f'{SYNTHETIC_PREFIX}{prefix}{index:05}', password=hashed_password,
+                     last_name=SYNTHETIC_MARKER)
+                for index in range(users)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        # SQLite等でbulk_createが主キーを返さない場合に備えて取得し直す
+        created = list(User.objects.filter(username__in=[user.username for user in created]).order_by('pk'))
+
+        records = []
+        for user in created:
+            for day in dates:
+                if day.weekday() >= 5 and rng.random() >= weekend_ratio:
+                    continue
+                records.append(HomeData(user=user, date=day, input_name=user.username, **generate_counts(rng)))
+                if len(records) >= BATCH_SIZE:
+                    HomeData.objects.bulk_create(records, batch_size=BATCH_SIZE)
+                    records = []
+        HomeData.objects.bulk_create(records, batch_size=BATCH_SIZE)
+
+        MonthlyTarget.objects.bulk_create(
+            [
+                MonthlyTarget(user=user, year_month=year_month, target_acquisition=rng.randint(20, 120))
+                for user in created
+                for year_month in year_months
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+        user_ids = [user.pk for user in created]
+        # 営業日はauto_now_addで投入日になるため記録日に合わせる
+        HomeData.objects.filter(user_id__in=user_ids).update(operation_date=F('date'))
+        rebuild(user_ids)
+    return created
+
+
+def synthetic_users(prefix=''):
+    """seedで作成した合成データのユーザー（指定の接頭辞のもの）"""
+    return User.objects.filter(username__startswith=f'{SYNTHETIC_PREFIX}{prefix}', last_name=SYNTHETIC_MARKER)
+
+
+def clear(prefix='seed'):
+    """指定の接頭辞で作成した合成データのユーザーと関連データを削除（戻り値は削除したユーザー数）"""
+    users = synthetic_users(prefix)
+    count = users.count()
+    users.delete()
+    return count
+
+
+def discard(users):
+    """seedで作成したユーザーのうち指定のものと関連データを削除（合成データの目印がないユーザーは削除しない）"""
+    return synthetic_users().filter(pk__in=[user.pk for user in users]).delete()[1].get(User._meta.label, 0)
+
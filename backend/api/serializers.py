@@ -5,8 +5,18 @@ import re
 from django.contrib.auth.models import User
 from django.contrib.auth.hashers import make_password
 from rest_framework import serializers
-from rest_framework_simplejwt.tokens import UntypedToken
-from .models import HomeData, MonthlyTarget
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken, UntypedToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.serializers import TokenVerifySerializer as BaseTokenVerifySerializer
+from .authentication import validate_token
+from .instrumentation import TimedSerializerMixin
+from .models import HomeData, MonthlyTarget, ArchivedMonth, DetachedMonth, COUNTER_FIELDS
+from .rollups import year_month_of
+
+ARCHIVED_MONTH_ERROR = 'アーカイブ済みの月のデータは登録・変更できません（restore_archiveで復元してください）'
+DETACHED_MONTH_ERROR = 'パーティションを切り離した月のデータは登録・変更できません'
 
 # ユーザー登録用シリアライザー
 class RegistrationSerializer(serializers.ModelSerializer):
@@ -62,7 +72,7 @@ class RegistrationSerializer(serializers.ModelSerializer):
 
 
 # ホーム画面データ用シリアライザー
-class HomeDataSerializer(serializers.ModelSerializer):
+class HomeDataSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     営業活動データの処理を担当するシリアライザー
     日々の営業実績データの変換と検証を処理
@@ -82,9 +92,79 @@ class HomeDataSerializer(serializers.ModelSerializer):
             'operation_date': {'read_only': True}
         }
 
+    def validate(self, attrs):
+        """同一ユーザー・同一日付のデータが既に存在しないか、アーカイブ済み・パーティションを切り離した月でないかチェック"""
+        request = self.context.get('request')
+        date = attrs.get('date')
+        if request is not None and date is not None:
+            if ArchivedMonth.objects.filter(user_id=request.user.pk, year_month=year_month_of(date)).exists():
+                raise serializers.ValidationError({'date': ARCHIVED_MONTH_ERROR})
+            if DetachedMonth.objects.filter(year_month=year_month_of(date)).exists():
+                raise serializers.ValidationError({'date': DETACHED_MONTH_ERROR})
+            duplicates = HomeData.objects.for_user_date(request.user, date)
+            if self.instance is not None:
+                duplicates = duplicates.exclude(pk=self.instance.pk)
+            if duplicates.exists():
+                raise serializers.ValidationError({'date': 'この日付のデータは既に登録されています'})
+        return attrs
+
+
+# 営業データ一括登録用シリアライザー
+class HomeDataBulkRowSerializer(TimedSerializerMixin, serializers.Serializer):
+    """
+    一括登録の1行分を検証するシリアライザー
+    モデルシリアライザーより軽量な検証のみを行う
+    未入力（項目なし・null・CSVの空欄）の指標は結果に含めない（新規作成時は0、既存の日付は元の値を維持）
+    """
+    date = serializers.DateField()
+    call_count = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    catch_count = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    re_call_count = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    prospective_count = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    approach_ng_count = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    product_explanation_ng_count = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    acquisition_count = serializers.IntegerField(required=False, allow_null=True)
+
+    def validate_date(self, value):
+        """アーカイブ済みの月（contextのarchived_months）・パーティションを切り離した月（detached_months）の日付は受け付けない"""
+        if year_month_of(value) in self.context.get('archived_months', ()):
+            raise serializers.ValidationError(ARCHIVED_MONTH_ERROR)
+        if year_month_of(value) in self.context.get('detached_months', ()):
+            raise serializers.ValidationError(DETACHED_MONTH_ERROR)
+        return value
+
+    def validate(self, attrs):
+        """未入力の指標を除外（既存の値を0で上書きしないため）"""
+        return {key: value for key, value in attrs.items() if value is not None}
+
+
+# 営業データ加算用シリアライザー
+class HomeDataIncrementSerializer(TimedSerializerMixin, serializers.Serializer):
+    """
+    当日の指標への加算値（{指標名: 差分}）を検証するシリアライザー
+    指定のない指標は加算しない（0として扱う）。負の差分で取り消しも可能
+    """
+    call_count = serializers.IntegerField(required=False)
+    catch_count = serializers.IntegerField(required=False)
+    re_call_count = serializers.IntegerField(required=False)
+    prospective_count = serializers.IntegerField(required=False)
+    approach_ng_count = serializers.IntegerField(required=False)
+    product_explanation_ng_count = serializers.IntegerField(required=False)
+    acquisition_count = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        """未知の項目を拒否し、0以外の差分が1つ以上あることを確認"""
+        unknown = sorted(set(self.initial_data) - set(COUNTER_FIELDS))
+        if unknown:
+            raise serializers.ValidationError({field: '加算できない項目です' for field in unknown})
+        deltas = {field: value for field, value in attrs.items() if value}
+        if not deltas:
+            raise serializers.ValidationError('加算する指標を1つ以上指定してください')
+        return deltas
+
 
 # ユーザー情報シリアライザー
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     ユーザー情報の処理を担当するシリアライザー
     ユーザーIDとユーザー名の取得、パスワード処理を管理
@@ -98,7 +178,7 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 # 月間目標管理用シリアライザー
-class MonthlyTargetSerializer(serializers.ModelSerializer):
+class MonthlyTargetSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     月間目標データの処理を担当するシリアライザー
     ユーザーごとの月間目標設定と取得を処理
@@ -126,3 +206,66 @@ class TokenVerifySerializer(serializers.Serializer):
             return attrs  # 検証済みデータを返す
         except Exception as e:
             raise serializers.ValidationError({'token': str(e)})
+
+
+
+USER_CLAIMS = ('username', 'is_staff')  # アクセストークンに含めるユーザー情報
+
+
+# ログイン（トークン発行）用シリアライザー
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    アクセストークンにユーザー名と管理者フラグを含めるシリアライザー
+    認証時にDBを参照せずクレームからユーザーを組み立てるために使用
+    リフレッシュトークンには含めず、アクセストークンの発行（ログイン・更新）のたびにDBのユーザーから設定する
+    """
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        data['access'] = str(self.get_access_token(self.user, RefreshToken(data['refresh'])))
+        return data
+
+    @classmethod
+    def get_access_token(cls, user, refresh=None):
+        """ユーザー情報のクレームを含むアクセストークン（refresh省略時は新しいリフレッシュトークンから発行）"""
+        access = (refresh or cls.get_token(user)).access_token
+        for claim in USER_CLAIMS:
+            access[claim] = getattr(user, claim)
+        return access
+
+
+# トークン更新（token/refresh/）用シリアライザー
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    アクセストークンの更新時にDBからユーザーを読み直し、最新のユーザー名・管理者フラグをクレームに設定するシリアライザー
+    （降格・名前変更はアクセストークンの有効期間内に反映される。旧形式のリフレッシュトークンのクレームは使用しない）
+    """
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(pk=refresh.payload.get(jwt_settings.USER_ID_CLAIM)).first()
+        if user is None or not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        for claim in USER_CLAIMS:
+            refresh.payload.pop(claim, None)
+
+        data = {'access': str(ClaimsTokenObtainPairSerializer.get_access_token(user, refresh))}
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # ブラックリストアプリ未導入
+                    pass
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
+
+
+# トークン検証（token/verify/）用シリアライザー
+class CachedTokenVerifySerializer(BaseTokenVerifySerializer):
+    """検証済みトークンのキャッシュを利用してトークンを検証するシリアライザー"""
+
+    def validate(self, attrs):
+        validate_token(UntypedToken, attrs['token'])
+        return {}
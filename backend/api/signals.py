@@ -0,0 +1,69 @@
+# シグナルハンドラー定義
+# モデルの変更に連動する処理を登録
+
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import leaderboard, summary_cache, timeseries
+from .routers import stick_to_primary
+from .instrumentation import install_query_timer
+from .models import HomeData, MonthlyTarget
+from .rollups import record_delete, year_month_of
+
+
+@receiver(post_delete, sender=HomeData)
+def subtract_deleted_home_data(sender, instance, **kwargs):
+    """営業データ削除時に集計テーブルから値を差し引く（一括削除にも対応）"""
+    record_delete(instance)
+
+
+@receiver(post_save, sender=HomeData)
+@receiver(post_delete, sender=HomeData)
+@receiver(post_save, sender=MonthlyTarget)
+@receiver(post_delete, sender=MonthlyTarget)
+def invalidate_summary_cache(sender, instance, **kwargs):
+    """営業データ・月間目標の変更時にユーザーのサマリーキャッシュを無効化"""
+    summary_cache.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=HomeData)
+@receiver(post_delete, sender=HomeData)
+def refresh_time_series(sender, instance, **kwargs):
+    """
+    営業データの変更時に時系列キャッシュの該当日を更新（記録日・ユーザーが変わった場合は変更前の日も）
+    サマリーキャッシュの世代更新より後に実行されるよう、invalidate_summary_cacheの後に登録する
+    """
+    previous = getattr(instance, '_previous_values', None)
+    if previous and previous['user_id'] != instance.user_id:
+        timeseries.record_saved(previous['user_id'], [previous['date']])
+        previous = None
+    timeseries.record_saved(instance.user_id, [instance.date, previous and previous['date']])
+
+
+@receiver(post_save, sender=HomeData)
+@receiver(post_delete, sender=HomeData)
+@receiver(post_save, sender=MonthlyTarget)
+@receiver(post_delete, sender=MonthlyTarget)
+def stick_writer_to_primary(sender, instance, **kwargs):
+    """書き込みを行ったユーザーの読み取りを一定時間プライマリに固定（レプリカの反映遅延対策）"""
+    stick_to_primary(instance.user_id)
+
+
+@receiver(post_save, sender=HomeData)
+@receiver(post_delete, sender=HomeData)
+def invalidate_leaderboard_for_home_data(sender, instance, **kwargs):
+    """営業データの変更時に該当月のランキングキャッシュを無効化"""
+    if instance.date:
+        leaderboard.invalidate(year_month_of(instance.date))
+
+
+@receiver(post_save, sender=MonthlyTarget)
+@receiver(post_delete, sender=MonthlyTarget)
+def invalidate_leaderboard_for_target(sender, instance, **kwargs):
+    """月間目標の変更時に該当月のランキングキャッシュを無効化"""
+    leaderboard.invalidate(instance.year_month)
+
+
+# DB接続ごとにSQL実行時間の計測を登録（リクエスト計測ミドルウェア用）
+connection_created.connect(install_query_timer, dispatch_uid='api.instrumentation.install_query_timer')
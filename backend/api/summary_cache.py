@@ -0,0 +1,125 @@
+# 月間サマリーのキャッシュ
+# (user_id, 年月, 当日) ごとに集計結果を保持し、データ更新時にユーザー単位で無効化する
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from . import events
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}  # プロセス内のヒット/ミス件数
+_bumps = threading.local()  # スレッドで最後に進めたユーザーごとの世代（versions: {user_id: (直前の世代, 進めた世代)}）
+
+
+def _cache():
+    return caches[getattr(settings, 'SUMMARY_CACHE_ALIAS', 'default')]
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _version_key(user_id):
+    return f'summary:version:{user_id}'
+
+
+def current_version(user_id):
+    """
+    ユーザーのキャッシュ世代を取得
+    世代キーが消えていても古いエントリを再利用しないよう、時刻ベースの値で初期化する
+    """
+    cache = _cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), time.time_ns(), None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def get_or_compute(user_id, year_month, day, compute):
+    """キャッシュ済みのサマリーを返す（なければcomputeで集計して保存）"""
+    cache = _cache()
+    key = f'summary:{user_id}:{current_version(user_id)}:{year_month}:{day.isoformat()}'
+    results = cache.get(key)
+    if results is not None:
+        _count('hits')
+        return results
+
+    _count('misses')
+    results = compute()
+    cache.set(key, results, getattr(settings, 'SUMMARY_CACHE_TIMEOUT', 300))
+    return results
+
+
+def versions(user_ids):
+    """複数ユーザーのキャッシュ世代を1回で取得（{user_id: 世代}、世代キーがないユーザーは含まない）"""
+    keys = {_version_key(user_id): user_id for user_id in user_ids}
+    return {keys[key]: version for key, version in _cache().get_many(list(keys)).items()}
+
+
+async def aget_or_compute(user_id, year_month, day, compute):
+    """get_or_computeの非同期版（computeはコルーチン関数）"""
+    cache = _cache()
+    version = await cache.aget(_version_key(user_id))
+    if version is None:
+        await cache.aadd(_version_key(user_id), time.time_ns(), None)
+        version = await cache.aget(_version_key(user_id))
+    key = f'summary:{user_id}:{version}:{year_month}:{day.isoformat()}'
+    results = await cache.aget(key)
+    if results is not None:
+        _count('hits')
+        return results
+
+    _count('misses')
+    results = await compute()
+    await cache.aset(key, results, getattr(settings, 'SUMMARY_CACHE_TIMEOUT', 300))
+    return results
+
+
+def invalidate(user_id):
+    """
+    ユーザーのサマリーキャッシュを無効化（世代を1進めて既存エントリを参照不可にする）
+    トランザクション中はコミット後に実行し、コミット前のデータが再キャッシュされるのを防ぐ
+    進めた世代の直前の世代はpop_bumpで取得できる（時系列キャッシュが他の書き込みの反映漏れを検出するために使用）
+    あわせてユーザーのサマリーの購読者（SSE接続）へ変更を通知する
+    """
+    def bump():
+        cache, key = _cache(), _version_key(user_id)
+        try:
+            # incrはRedis/Memcached/ローカルメモリでは原子的で、同時の書き込みでも世代が重複しない
+            # （ファイルキャッシュは読み取り〜書き込みのため、別プロセスとの同時の書き込みでは重複し得る）
+            version = cache.incr(key)
+            previous = version - 1
+        except ValueError:
+            # 世代キーがない（直前の世代は不明）
+            version, previous = time.time_ns(), None
+            cache.set(key, version, None)
+        if not hasattr(_bumps, 'versions'):
+            _bumps.versions = {}
+        _bumps.versions[user_id] = (previous, version)
+        _count('invalidations')
+        events.publish(user_id)
+
+    transaction.on_commit(bump)
+
+
+def pop_bump(user_id):
+    """
+    このスレッドで最後にinvalidateが進めたユーザーの世代を (直前の世代, 進めた世代) で返して消去する
+    コミット後の処理（invalidateより後に登録したon_commit）から呼び出す。進めていない場合はNone
+    """
+    return getattr(_bumps, 'versions', {}).pop(user_id, None)
+
+
+def stats():
+    """プロセス内のヒット/ミス件数とヒット率を返す"""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    lookups = snapshot['hits'] + snapshot['misses']
+    snapshot['hit_rate'] = round(snapshot['hits'] / lookups * 100, 1) if lookups else 0
+    return snapshot
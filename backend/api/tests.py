@@ -0,0 +1,1273 @@
+# テスト定義
+# python manage.py test api で実行
+
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import pstats
+import tempfile
+import threading
+import time
+import unittest
+from datetime import UTC, date, datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import analytics, events, ingestion, partitioning, profiling, summary_cache, timeseries
+from .models import COUNTER_FIELDS, DailyRollup, DetachedMonth, HomeData, MonthlyRollup, MonthlyTarget, User
+from .management.commands.benchmark_endpoints import QUERY_BUDGETS, STATEMENT_TIMEOUT_QUERIES
+from .periods import count_buckets, iter_bucket_starts
+from .rollups import rebuild
+from .routers import REPLICA, reading_from
+from .seeding import clear, discard, seed
+from .serializers import ClaimsTokenObtainPairSerializer
+from . import throttling
+from .throttling import AuthIPThrottle, TokenBucketThrottle, bucket_lock
+from .views import MonthlySummaryAPI, SummaryRangeAPI
+
+
+def bearer(user):
+    """ユーザーのアクセストークンのAuthorizationヘッダー"""
+    return {'Authorization': f'Bearer {ClaimsTokenObtainPairSerializer.get_access_token(user)}'}
+
+
+class DateRangeQuerySetTests(SimpleTestCase):
+    """年月・日付での絞り込みが範囲条件になる（インデックスを使えない関数式にならない）ことを確認"""
+
+    def assertRangePredicate(self, queryset):
+        sql = str(queryset.query)
+        self.assertIn('"date" >=', sql)
+        self.assertIn('"date" <', sql)
+        self.assertNotIn('EXTRACT', sql.upper())
+        self.assertNotIn('STRFTIME', sql.upper())
+
+    def test_for_user_month_uses_range(self):
+        self.assertRangePredicate(HomeData.objects.for_user_month(1, 2025, 3))
+
+    def test_for_user_month_december_rolls_over_year(self):
+        sql = str(HomeData.objects.for_user_month(1, 2025, 12).query)
+        self.assertIn('2025-12-01', sql)
+        self.assertIn('2026-01-01', sql)
+
+    def test_for_user_range_uses_range(self):
+        self.assertRangePredicate(HomeData.objects.for_user_range(1, date(2025, 1, 1), date(2025, 2, 1)))
+
+    def test_rollup_month_uses_range(self):
+        self.assertRangePredicate(DailyRollup.objects.for_user_month(1, 2025, 3))
+
+    def test_for_user_date_uses_equality(self):
+        sql = str(HomeData.objects.for_user_date(1, date(2025, 3, 5)).query)
+        self.assertIn('"date" = 2025-03-05', sql)
+        self.assertNotIn('EXTRACT', sql.upper())
+
+
+class RollupMaintenanceTests(TestCase):
+    """HomeDataの作成・更新・記録日の移動・削除で、日別・月別の集計行が再構築と同じ値に保たれることを確認"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='rollup_user', password='password')
+        self.other = User.objects.create_user(username='rollup_other', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, day, **counts):
+        response = self.client.post(reverse('daily-record-list'), {'date': day, **counts}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def update(self, pk, **values):
+        response = self.client.patch(reverse('daily-record-detail', args=[pk]), values, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def rollups(self):
+        """集計行の値（すべての指標が0の行は除く）"""
+        daily = {
+            (row['user_id'], row['date']): tuple(row[field] for field in COUNTER_FIELDS)
+            for row in DailyRollup.objects.values('user_id', 'date', *COUNTER_FIELDS)
+        }
+        monthly = {
+            (row['user_id'], row['year_month']): tuple(row[field] for field in COUNTER_FIELDS)
+            for row in MonthlyRollup.objects.values('user_id', 'year_month', *COUNTER_FIELDS)
+        }
+        return (
+            {key: values for key, values in daily.items() if any(values)},
+            {key: values for key, values in monthly.items() if any(values)},
+        )
+
+    def assertMatchesRebuild(self):
+        maintained = self.rollups()
+        rebuild()
+        self.assertEqual(maintained, self.rollups())
+
+    def month_calls(self, user, year_month):
+        return MonthlyRollup.objects.filter(user=user, year_month=year_month).values_list('call_count', flat=True).first()
+
+    def test_update_applies_difference(self):
+        pk = self.create('2025-03-10', call_count=10, catch_count=4)
+        self.create('2025-03-11', call_count=5)
+        self.update(pk, call_count=7, acquisition_count=-1)
+        self.assertEqual(DailyRollup.objects.get(user=self.user, date=date(2025, 3, 10)).call_count, 7)
+        monthly = MonthlyRollup.objects.get(user=self.user, year_month='2025-03')
+        self.assertEqual((monthly.call_count, monthly.catch_count, monthly.acquisition_count), (12, 4, -1))
+        self.assertMatchesRebuild()
+
+    def test_move_to_other_month(self):
+        pk = self.create('2025-03-31', call_count=10)
+        self.create('2025-03-01', call_count=1)
+        self.update(pk, date='2025-04-01', call_count=3)
+        self.assertEqual(self.month_calls(self.user, '2025-03'), 1)
+        self.assertEqual(self.month_calls(self.user, '2025-04'), 3)
+        self.assertEqual(DailyRollup.objects.get(user=self.user, date=date(2025, 3, 31)).call_count, 0)
+        self.assertMatchesRebuild()
+
+    def test_move_to_other_user(self):
+        record = HomeData.objects.get(pk=self.create('2025-03-10', call_count=10))
+        record.user = self.other
+        record.save()
+        self.assertEqual(self.month_calls(self.user, '2025-03'), 0)
+        self.assertEqual(self.month_calls(self.other, '2025-03'), 10)
+        self.assertMatchesRebuild()
+
+    def test_delete_subtracts(self):
+        pk = self.create('2025-03-10', call_count=10)
+        for day in ('2025-03-11', '2025-03-12'):
+            self.create(day, call_count=2)
+        HomeData.objects.get(pk=pk).delete()
+        self.assertEqual(self.month_calls(self.user, '2025-03'), 4)
+        # 一括削除（QuerySet.delete）も1行ずつ差し引く
+        HomeData.objects.filter(user=self.user, date=date(2025, 3, 11)).delete()
+        self.assertEqual(self.month_calls(self.user, '2025-03'), 2)
+        self.assertMatchesRebuild()
+
+    @override_settings(TIMESERIES_CACHE_ENABLED=False)
+    def test_summary_reads_rollups(self):
+        pk = self.create(timezone.localdate().isoformat(), call_count=10)
+        self.update(pk, call_count=6)
+        caches['default'].clear()
+        response = self.client.get(reverse('monthly-summary'))
+        self.assertEqual(response.data['monthly']['details']['total_call'], 6)
+        # 集計行のみを参照する（生データを書き換えても集計行を更新しなければ結果は変わらない）
+        HomeData.objects.filter(pk=pk).update(call_count=99)
+        caches['default'].clear()
+        response = self.client.get(reverse('monthly-summary'))
+        self.assertEqual(response.data['monthly']['details']['total_call'], 6)
+
+
+class HomeDataBulkUpsertTests(TestCase):
+    """一括登録で、行に含まれない指標が既存の値を上書きしないことを確認"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='bulk_user', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('daily-record-bulk')
+
+    def test_partial_row_keeps_other_counters(self):
+        HomeData.objects.create(
+            user=self.user, date=date(2025, 3, 5), input_name='bulk_user', call_count=10, catch_count=5
+        )
+        response = self.client.post(self.url, [{'date': '2025-03-05', 'call_count': 20}], format='json')
+        self.assertEqual(response.status_code, 200)
+        record = HomeData.objects.get(user=self.user, date=date(2025, 3, 5))
+        self.assertEqual((record.call_count, record.catch_count), (20, 5))
+        rollup = DailyRollup.objects.get(user=self.user, date=date(2025, 3, 5))
+        self.assertEqual((rollup.call_count, rollup.catch_count), (20, 5))
+
+    def test_csv_blank_cell_keeps_value_and_new_row_defaults_to_zero(self):
+        HomeData.objects.create(
+            user=self.user, date=date(2025, 3, 5), input_name='bulk_user', call_count=10, catch_count=5
+        )
+        body = 'date,call_count,catch_count\n2025-03-05,,7\n2025-03-06,3,\n'
+        response = self.client.post(self.url, body, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['saved'], 2)
+        existing = HomeData.objects.get(user=self.user, date=date(2025, 3, 5))
+        self.assertEqual((existing.call_count, existing.catch_count), (10, 7))
+        created = HomeData.objects.get(user=self.user, date=date(2025, 3, 6))
+        self.assertEqual((created.call_count, created.catch_count, created.acquisition_count), (3, 0, 0))
+
+
+class SummaryRangeLimitTests(TestCase):
+    """期間別サマリーの区間数の上限と、日付の範囲外となる期間の扱いを確認"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='range_user', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, **params):
+        return self.client.get(reverse('summary-range'), params)
+
+    def test_bucket_count_matches_iteration(self):
+        for group_by in ('day', 'week', 'month'):
+            for date_from, date_to in (
+                (date(2025, 3, 5), date(2025, 3, 5)),
+                (date(2024, 12, 30), date(2026, 2, 1)),
+                (date(2025, 1, 31), date(2025, 3, 2)),
+            ):
+                self.assertEqual(
+                    count_buckets(date_from, date_to, group_by),
+                    len(list(iter_bucket_starts(date_from, date_to, group_by))),
+                )
+
+    def test_too_many_buckets_is_rejected_for_every_group_by(self):
+        for group_by, date_to in (('day', '2025-01-01'), ('week', '2031-01-06'), ('month', '2054-07-01')):
+            with self.subTest(group_by=group_by):
+                response = self.get(**{'from': '2024-01-01', 'to': date_to, 'group_by': group_by})
+                self.assertEqual(response.status_code, 400)
+        response = self.get(**{'from': '1900-01-01', 'to': '2100-12-31', 'group_by': 'week', 'compare': 'true'})
+        self.assertEqual(response.status_code, 400)
+        response = self.get(**{'from': '2024-01-01', 'to': '2054-06-30', 'group_by': 'month'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['buckets']), SummaryRangeAPI.MAX_BUCKETS)
+
+    def test_out_of_range_periods_are_rejected(self):
+        for params in (
+            {'from': '0001-01-02', 'to': '0001-01-05', 'compare': 'true', 'group_by': 'day'},
+            {'from': '1000-01-01', 'to': '9000-12-31', 'compare': 'true', 'group_by': 'month'},
+            {'from': '9999-12-01', 'to': '9999-12-31', 'group_by': 'day'},
+        ):
+            with self.subTest(**params):
+                self.assertEqual(self.get(**params).status_code, 400)
+
+    def test_last_month_before_upper_bound(self):
+        response = self.get(**{'from': '9999-01-01', 'to': '9999-12-30', 'group_by': 'month', 'compare': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['buckets']), 12)
+
+
+@override_settings(TIMESERIES_CACHE_ENABLED=True)
+class MonthlyReportTests(TestCase):
+    """管理者向けの一括レポート（monthly_report）が、各ユーザー・各月の月間サマリーAPIと同じ値になることを確認"""
+    MONTHS = ('2025-01', '2025-03', '2025-04')
+    TODAY = date(2025, 4, 10)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f'report_user{index}', password='password') for index in range(3)]
+        for index, user in enumerate(cls.users):
+            for year_month in cls.MONTHS:
+                year, month = (int(part) for part in year_month.split('-'))
+                if index == 2 and month == 3:
+                    continue  # データも目標もない月
+                for day in range(1, 8):
+                    HomeData.objects.create(
+                        user=user, date=date(year, month, day * 3), input_name=user.username,
+                        call_count=40 + day * (index + 1), catch_count=13 + day + index, re_call_count=day % 3,
+                        prospective_count=day + index, approach_ng_count=(day * 7) % 5,
+                        product_explanation_ng_count=day % 2, acquisition_count=(day + index + month) % 4,
+                    )
+                if index != 1:
+                    MonthlyTarget.objects.create(user=user, year_month=year_month, target_acquisition=20 + index * 7 + month)
+
+    def setUp(self):
+        # 他のテストで同じユーザーIDのサマリー・時系列がキャッシュされている場合があるため破棄する
+        caches['default'].clear()
+        timeseries.store.clear()
+
+    def summary(self, user, now):
+        """指定時刻（UTC）の月間サマリーAPIの月間の値"""
+        client = APIClient()
+        client.force_authenticate(user)
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            response = client.get(reverse('monthly-summary'))
+        self.assertEqual(response.status_code, 200)
+        return response.data['monthly']
+
+    def assert_matches(self, row, monthly):
+        for field, key in SummaryRangeAPI.DETAIL_KEYS.items():
+            self.assertEqual(row[field], monthly['details'][f'total_{key}'], field)
+        for name in (*analytics.RATE_NUMERATORS, 'daily_required_acquisition', 'daily_required_catch', 'progress_rate',
+                     'virtual_progress_count', 'average_daily_acquisition', 'predicted_month_end_acquisition'):
+            self.assertEqual(row[name], monthly[name], name)
+
+    def test_matches_monthly_summary(self):
+        report = analytics.monthly_report(list(self.MONTHS), self.TODAY, [user.pk for user in self.users])
+        rows = {(row['user_id'], row['year_month']): row for row in report}
+        self.assertNotIn((self.users[2].pk, '2025-03'), rows)
+        self.assertEqual(len(rows), 8)
+
+        # 当月は今日時点、過去月（31日の月）は月末時点のサマリーと一致する
+        moments = {
+            '2025-01': datetime(2025, 1, 31, 3, tzinfo=UTC),
+            '2025-03': datetime(2025, 3, 31, 3, tzinfo=UTC),
+            '2025-04': datetime(2025, 4, 10, 3, tzinfo=UTC),
+        }
+        for user in self.users:
+            for year_month, now in moments.items():
+                with self.subTest(user=user.username, year_month=year_month):
+                    monthly = self.summary(user, now)
+                    row = rows.get((user.pk, year_month))
+                    if row is None:
+                        self.assertEqual(monthly['details']['total_call'], 0)
+                        continue
+                    self.assert_matches(row, monthly)
+
+    def test_command_outputs_report(self):
+        output = io.StringIO()
+        now = datetime(2025, 4, 10, 3, tzinfo=UTC)
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            call_command('monthly_report', '2025-04', '--user', str(self.users[0].pk), '--format', 'ndjson', stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual((row['user_id'], row['year_month']), (self.users[0].pk, '2025-04'))
+        self.assert_matches(row, self.summary(self.users[0], now))
+
+
+class ConditionalGetTests(TestCase):
+    """参照系APIが変更のない場合に検証子の取得（1クエリ）のみで304を返し、変更後は200を返すことを確認"""
+    URLS = {
+        'daily-record': lambda: reverse('daily-record-list'),
+        'monthly-target': lambda: reverse('monthly-target-detail', args=[f'{timezone.localdate():%Y-%m}']),
+        'monthly-summary': lambda: reverse('monthly-summary'),
+    }
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='conditional_user', password='password')
+        self.record = HomeData.objects.create(
+            user=self.user, date=timezone.localdate(), input_name='conditional_user', call_count=3
+        )
+        self.target = MonthlyTarget.objects.create(
+            user=self.user, year_month=f'{timezone.localdate():%Y-%m}', target_acquisition=10
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def first_response(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        return response
+
+    def test_unchanged_resources_return_304(self):
+        for name, url in self.URLS.items():
+            with self.subTest(name):
+                response = self.first_response(url())
+                with self.assertNumQueries(1):
+                    revalidated = self.client.get(url(), headers={'If-None-Match': response['ETag']})
+                self.assertEqual(revalidated.status_code, 304)
+                with self.assertNumQueries(1):
+                    revalidated = self.client.get(url(), headers={'If-Modified-Since': response['Last-Modified']})
+                self.assertEqual(revalidated.status_code, 304)
+
+    def test_home_data_change_returns_200(self):
+        etags = {name: self.first_response(url())['ETag'] for name, url in self.URLS.items()}
+        response = self.client.patch(
+            reverse('daily-record-detail', args=[self.record.pk]), {'call_count': 4}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        for name, url in self.URLS.items():
+            with self.subTest(name):
+                response = self.client.get(url(), headers={'If-None-Match': etags[name]})
+                # 月間目標は営業データの変更の影響を受けない
+                self.assertEqual(response.status_code, 304 if name == 'monthly-target' else 200)
+
+    def test_target_change_returns_200(self):
+        etags = {name: self.first_response(url())['ETag'] for name, url in self.URLS.items()}
+        MonthlyTarget.objects.filter(pk=self.target.pk).update(
+            target_acquisition=20, updated_at=self.target.updated_at + timedelta(seconds=1)
+        )
+        for name, url in self.URLS.items():
+            with self.subTest(name):
+                response = self.client.get(url(), headers={'If-None-Match': etags[name]})
+                self.assertEqual(response.status_code, 304 if name == 'daily-record' else 200)
+
+    def test_later_modification_returns_200(self):
+        last_modified = self.first_response(self.URLS['daily-record']())['Last-Modified']
+        HomeData.objects.filter(pk=self.record.pk).update(updated_at=timezone.now() + timedelta(minutes=1))
+        response = self.client.get(self.URLS['daily-record'](), headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_etag_differs_per_query(self):
+        url = self.URLS['daily-record']()
+        etag = self.first_response(url)['ETag']
+        response = self.client.get(url, {'date_from': '2025-01-01'}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(TIMESERIES_CACHE_ENABLED=False)
+class SummaryCacheTests(TestCase):
+    """月間サマリーのキャッシュが再利用され、営業データ・月間目標の変更時にそのユーザーの分だけ無効化されることを確認"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='cache_user', password='password')
+        self.other = User.objects.create_user(username='cache_other', password='password')
+        self.admin = User.objects.create_user(username='cache_admin', password='password', is_staff=True)
+        self.today = timezone.localdate()
+        self.record = HomeData.objects.create(user=self.user, date=self.today, input_name='cache_user', call_count=10)
+
+    def total_calls(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(reverse('monthly-summary'))
+        self.assertEqual(response.status_code, 200)
+        return response.data['monthly']['details']['total_call']
+
+    def counters(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get(reverse('admin-cache-stats'))
+        self.assertEqual(response.status_code, 200)
+        return response.data['hits'], response.data['misses']
+
+    def assertLookups(self, before, hits, misses):
+        after = self.counters()
+        self.assertEqual((after[0] - before[0], after[1] - before[1]), (hits, misses))
+
+    def test_repeated_reads_hit_cache(self):
+        before = self.counters()
+        self.assertEqual(self.total_calls(self.user), 10)
+        self.assertEqual(self.total_calls(self.user), 10)
+        self.assertLookups(before, 1, 1)
+
+    def test_home_data_save_and_delete_invalidate(self):
+        self.assertEqual(self.total_calls(self.user), 10)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(
+                reverse('daily-record-detail', args=[self.record.pk]), {'call_count': 15}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        before = self.counters()
+        self.assertEqual(self.total_calls(self.user), 15)
+        self.assertLookups(before, 0, 1)
+
+        self.record.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.record.delete()
+        self.assertEqual(self.total_calls(self.user), 0)
+
+    def test_target_update_invalidates(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        before = client.get(reverse('monthly-summary')).data['monthly']['daily_required_acquisition']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.put(
+                reverse('monthly-target-detail', args=[f'{self.today:%Y-%m}']), {'target_acquisition': 300}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        after = client.get(reverse('monthly-summary')).data['monthly']['daily_required_acquisition']
+        self.assertEqual(before, 0)
+        self.assertGreater(after, 0)
+
+    def test_other_users_entries_are_kept(self):
+        self.assertEqual(self.total_calls(self.other), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            HomeData.objects.create(user=self.user, date=date(2025, 1, 5), input_name='cache_user', call_count=1)
+        before = self.counters()
+        self.assertEqual(self.total_calls(self.other), 0)
+        self.assertLookups(before, 1, 0)
+
+    def test_key_includes_local_date(self):
+        self.assertEqual(self.total_calls(self.user), 10)
+        before = self.counters()
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=1)):
+            self.total_calls(self.user)
+        self.assertLookups(before, 0, 1)
+
+
+class TimeSeriesCacheTests(TestCase):
+    """時系列キャッシュが、他の書き込み（一括登録・別プロセス）の後の保存でも最新の値を返すことを確認"""
+
+    def setUp(self):
+        caches['default'].clear()
+        timeseries.store.clear()
+        self.user = User.objects.create_user(username='series_user', password='password')
+        HomeData.objects.create(user=self.user, date=date(2025, 3, 1), input_name='series_user', call_count=100)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def total_calls(self):
+        response = self.client.get(reverse('summary-range'), {'from': '2025-03-01', 'to': '2025-03-31'})
+        self.assertEqual(response.status_code, 200)
+        return response.data['total']['details']['call_count']
+
+    def save(self, day, call_count):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('daily-record-list'), {'date': day, 'call_count': call_count})
+        self.assertEqual(response.status_code, 201)
+
+    def test_bulk_upsert_then_save(self):
+        self.assertEqual(self.total_calls(), 100)  # 時系列を読み込む
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('daily-record-bulk'), [{'date': '2025-03-03', 'call_count': 1000}], format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.save('2025-03-04', 5)
+        self.assertEqual(self.total_calls(), 1105)
+
+    def test_write_in_other_process_then_save(self):
+        self.assertEqual(self.total_calls(), 100)
+        # 別プロセスでの書き込み（DBとサマリーキャッシュの世代のみ更新され、このプロセスの時系列は更新されない）
+        with mock.patch.object(timeseries, 'record_saved'):
+            self.save('2025-03-03', 1000)
+        self.save('2025-03-04', 5)
+        self.assertEqual(self.total_calls(), 1105)
+
+    def test_consecutive_saves_update_in_place(self):
+        self.assertEqual(self.total_calls(), 100)
+        before = timeseries.store.stats()
+        self.save('2025-03-03', 1000)
+        self.save('2025-03-04', 5)
+        self.assertEqual(self.total_calls(), 1105)
+        after = timeseries.store.stats()
+        self.assertEqual(
+            [after[key] - before[key] for key in ('loads', 'updates', 'discards')], [0, 2, 0]
+        )
+
+    def assertMatchesRollups(self, series, start, end):
+        """時系列の期間合計・日別の値が日別集計テーブルと一致することを確認"""
+        rows = DailyRollup.objects.for_user_range(self.user, start, end)
+        totals = rows.aggregate(**{field: Sum(field) for field in COUNTER_FIELDS})
+        self.assertEqual(series.totals(start, end), {field: value or 0 for field, value in totals.items()})
+        self.assertEqual(series.records(start, end), list(rows.order_by('date').values('date', *COUNTER_FIELDS)))
+
+    def test_range_totals_match_rollups(self):
+        for offset in range(0, 120, 3):
+            HomeData.objects.create(
+                user=self.user, date=date(2025, 1, 1) + timedelta(days=offset), input_name='series_user',
+                call_count=offset % 17, catch_count=offset % 5, acquisition_count=offset % 3 - 1,
+            )
+        series = timeseries.store.get(self.user.pk)
+        for start, end in (
+            (date(2025, 1, 1), date(2025, 2, 1)),
+            (date(2025, 2, 14), date(2025, 3, 2)),
+            (date(2024, 12, 1), date(2025, 6, 1)),  # 範囲外を含む
+            (date(2025, 3, 1), date(2025, 3, 2)),
+            (date(2025, 3, 2), date(2025, 3, 2)),  # 空の期間
+        ):
+            with self.subTest(start=start, end=end):
+                self.assertMatchesRollups(series, start, end)
+
+    def test_move_and_delete_update_series(self):
+        record = HomeData.objects.create(user=self.user, date=date(2025, 3, 20), input_name='series_user', call_count=7)
+        self.assertEqual(self.total_calls(), 107)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('daily-record-detail', args=[record.pk]), {'date': '2025-04-02'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.total_calls(), 100)
+        series = timeseries.store.get(self.user.pk)
+        self.assertEqual((series.day(date(2025, 3, 20)) or {}).get('call_count', 0), 0)
+        self.assertEqual(series.day(date(2025, 4, 2))['call_count'], 7)
+        self.assertMatchesRollups(series, date(2025, 3, 1), date(2025, 5, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            HomeData.objects.filter(user=self.user, date=date(2025, 3, 1)).delete()
+        self.assertEqual(self.total_calls(), 0)
+        self.assertMatchesRollups(timeseries.store.get(self.user.pk), date(2025, 3, 1), date(2025, 5, 1))
+
+    def test_summary_matches_database_path(self):
+        for day in (1, 2, 15):
+            HomeData.objects.update_or_create(
+                user=self.user, date=timezone.localdate().replace(day=day),
+                defaults={'input_name': 'series_user', 'call_count': day * 3, 'catch_count': day, 'acquisition_count': 1},
+            )
+        view = MonthlySummaryAPI()
+        now, today = timezone.now(), timezone.localdate()
+        from_series = view.build_summary(self.user, now, today)
+        with override_settings(TIMESERIES_CACHE_ENABLED=False):
+            from_database = view.build_summary(self.user, now, today)
+        self.assertEqual(from_series, from_database)
+
+    def test_memory_cap_evicts_least_recently_used(self):
+        users = [self.user] + [
+            User.objects.create_user(username=f'series_user{index}', password='password') for index in range(3)
+        ]
+        for user in users[1:]:
+            HomeData.objects.create(user=user, date=date(2025, 3, 1), input_name=user.username, call_count=1)
+        one_user = timeseries.store.get(self.user.pk).nbytes
+        before = timeseries.store.stats()
+        with override_settings(TIMESERIES_CACHE_MAX_BYTES=one_user * 2):
+            for user in users:
+                timeseries.store.get(user.pk)  # 2ユーザー分を超えた時点で古いものから破棄
+            timeseries.store.get(users[2].pk)  # 参照したユーザーは最新になる
+            timeseries.store.get(users[1].pk)  # 再読み込みで最も古く参照されたusers[3]を破棄
+            timeseries.store.get(users[2].pk)
+        after = timeseries.store.stats()
+        self.assertEqual(after['users'], 2)
+        self.assertLessEqual(after['bytes'], one_user * 2)
+        self.assertEqual(
+            [after[key] - before[key] for key in ('hits', 'loads', 'evictions')], [3, 4, 3]
+        )
+
+
+class DetachedMonthRebuildTests(TestCase):
+    """パーティションを切り離した月の集計値が、集計テーブルの再構築で失われないことを確認"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='detach_user', password='password')
+        for day, count in ((date(2025, 2, 10), 4), (date(2025, 3, 10), 6)):
+            HomeData.objects.create(user=self.user, date=day, input_name='detach_user', call_count=count)
+
+    def remove_february_rows(self):
+        """切り離し（行がテーブルから外れるが、集計テーブルは更新されない）を再現"""
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM api_homedata WHERE date < %s', [date(2025, 3, 1)])
+
+    def assertRollups(self, daily, monthly):
+        self.assertEqual(
+            dict(DailyRollup.objects.filter(user=self.user).values_list('date', 'call_count')), daily
+        )
+        self.assertEqual(
+            dict(MonthlyRollup.objects.filter(user=self.user).values_list('year_month', 'call_count')), monthly
+        )
+
+    def test_rebuild_keeps_detached_month(self):
+        self.remove_february_rows()
+        DetachedMonth.objects.create(year_month='2025-02', table_name='api_homedata_2025_02', dropped=True)
+        HomeData.objects.filter(user=self.user, date=date(2025, 3, 10)).update(call_count=7)
+        rebuild()
+        self.assertRollups(
+            {date(2025, 2, 10): 4, date(2025, 3, 10): 7},
+            {'2025-02': 4, '2025-03': 7},
+        )
+
+    def test_rebuild_without_record_drops_month(self):
+        self.remove_february_rows()
+        rebuild([self.user.pk])
+        self.assertRollups({date(2025, 3, 10): 6}, {'2025-03': 6})
+
+    @unittest.skipUnless(partitioning.enabled(connection), 'HOMEDATA_PARTITIONING=True のPostgreSQLのみ')
+    def test_detach_partition_records_month(self):
+        partitioning.create_partition(connection, 2025, 2)
+        # 作成直後の行の外部キー検査が保留中のためdropはできない（テーブルは切り離されれば十分）
+        self.assertTrue(partitioning.detach_partition(connection, 2025, 2))
+        detached = DetachedMonth.objects.get(year_month='2025-02')
+        self.assertEqual((detached.table_name, detached.dropped), (partitioning.partition_name(2025, 2), False))
+        self.assertFalse(HomeData.objects.filter(date__lt=date(2025, 3, 1)).exists())
+        rebuild()
+        self.assertRollups(
+            {date(2025, 2, 10): 4, date(2025, 3, 10): 6},
+            {'2025-02': 4, '2025-03': 6},
+        )
+
+
+class DetachedMonthWriteTests(TestCase):
+    """パーティションを切り離した月への登録・更新・一括登録・加算が拒否されることを確認"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='detached_writer', password='password')
+        self.record = HomeData.objects.create(user=self.user, date=date(2025, 3, 10), input_name='detached_writer')
+        DetachedMonth.objects.create(year_month='2025-02', table_name='api_homedata_2025_02')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_create_and_update_are_rejected(self):
+        response = self.client.post(
+            reverse('daily-record-list'), {'date': '2025-02-10', 'call_count': 3}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date', response.data)
+
+        response = self.client.patch(
+            reverse('daily-record-detail', args=[self.record.pk]), {'date': '2025-02-10'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date', response.data)
+        self.assertFalse(DailyRollup.objects.filter(user=self.user, date__lt=date(2025, 3, 1)).exists())
+
+    def test_bulk_rows_are_rejected(self):
+        response = self.client.post(reverse('daily-record-bulk'), [
+            {'date': '2025-02-10', 'call_count': 3},
+            {'date': '2025-03-11', 'call_count': 4},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['saved'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [1])
+        self.assertFalse(HomeData.objects.filter(user=self.user, date=date(2025, 2, 10)).exists())
+
+    def test_increment_is_rejected(self):
+        DetachedMonth.objects.create(year_month=f'{timezone.localdate():%Y-%m}', table_name='api_homedata_current')
+        response = self.client.post(reverse('daily-record-increment'), {'call_count': 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(HomeData.objects.filter(user=self.user, date=timezone.localdate()).exists())
+
+
+class HomeDataExportTests(TestCase):
+    """エクスポートがWSGIでは同期、ASGIでは非同期のイテレーターで逐次出力されることを確認"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='export_user', password='password')
+        HomeData.objects.bulk_create([
+            HomeData(user=cls.user, date=date(2025, 3, day), input_name='export_user', call_count=day)
+            for day in range(1, 11)
+        ])
+
+    def test_wsgi_streams_synchronously(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('daily-record-export'), {'format': 'ndjson'})
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 10)
+
+    async def test_asgi_streams_asynchronously(self):
+        response = await AsyncClient().get(
+            reverse('daily-record-export'), {'format': 'csv'}, headers=bearer(self.user)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8-sig')
+        lines = content.splitlines()
+        self.assertEqual(len(lines), 11)
+        self.assertTrue(lines[1].startswith('2025-03-01,1,'))
+
+
+class HomeDataIncrementTests(TestCase):
+    """当日の指標への加算が行の作成・加算・負数の拒否を正しく行い、集計テーブルにも反映されることを確認"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='increment_user', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.localdate()
+
+    def increment(self, **deltas):
+        return self.client.post(reverse('daily-record-increment'), deltas, format='json')
+
+    def counts(self, *fields):
+        record = HomeData.objects.for_user_date(self.user, self.today).values(*fields).get()
+        daily = DailyRollup.objects.for_user_date(self.user, self.today).values(*fields).get()
+        monthly = MonthlyRollup.objects.filter(user=self.user, year_month=f'{self.today:%Y-%m}').values(*fields).get()
+        self.assertEqual(record, daily)
+        self.assertEqual(record, monthly)
+        return tuple(record[field] for field in fields)
+
+    def test_creates_then_adds(self):
+        response = self.increment(call_count=1, acquisition_count=-1)
+        self.assertEqual(response.status_code, 201)
+        response = self.increment(call_count=2, catch_count=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['call_count'], 3)
+        self.assertEqual(self.counts('call_count', 'catch_count', 'acquisition_count'), (3, 1, -1))
+
+    def test_negative_result_is_rejected(self):
+        self.increment(call_count=2, catch_count=1)
+        response = self.increment(call_count=-1, catch_count=-2)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.counts('call_count', 'catch_count'), (2, 1))
+        # 初回の作成でも負数になる指標は拒否する
+        HomeData.objects.for_user_date(self.user, self.today).delete()
+        self.assertEqual(self.increment(call_count=-1).status_code, 400)
+        self.assertFalse(HomeData.objects.for_user_date(self.user, self.today).exists())
+
+    def test_invalid_payload_is_rejected(self):
+        self.assertEqual(self.increment(call_count=0).status_code, 400)
+        self.assertEqual(self.increment(input_name='x', call_count=1).status_code, 400)
+        self.assertFalse(HomeData.objects.for_user_date(self.user, self.today).exists())
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', '同時実行の検証はPostgreSQLのみ（SQLiteは書き込みがDB単位で直列化される）')
+class ConcurrentIncrementTests(TransactionTestCase):
+    """複数スレッドからの同時の加算で、当日の行の作成の競合を含めて更新が失われないことを確認"""
+    THREADS = 8
+    REPEAT = 5
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='concurrent_user', password='password')
+        self.today = timezone.localdate()
+
+    def run_concurrently(self, deltas):
+        """THREADS個のスレッドから同時にREPEAT回ずつ加算し、ステータスコードの一覧を返す"""
+        barrier = threading.Barrier(self.THREADS)
+        statuses = []
+
+        def worker():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                for _ in range(self.REPEAT):
+                    statuses.append(
+                        client.post(reverse('daily-record-increment'), deltas, format='json').status_code
+                    )
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_increments_are_not_lost(self):
+        statuses = self.run_concurrently({'call_count': 1, 'catch_count': 2})
+        total = self.THREADS * self.REPEAT
+        self.assertEqual(sorted(statuses), [200] * (total - 1) + [201])
+        record = HomeData.objects.for_user_date(self.user, self.today).get()
+        self.assertEqual((record.call_count, record.catch_count), (total, total * 2))
+        daily = DailyRollup.objects.for_user_date(self.user, self.today).get()
+        self.assertEqual((daily.call_count, daily.catch_count), (total, total * 2))
+
+    def test_decrements_stop_at_zero(self):
+        HomeData.objects.create(user=self.user, date=self.today, input_name='concurrent_user', call_count=10)
+        statuses = self.run_concurrently({'call_count': -1})
+        self.assertEqual(statuses.count(200), 10)
+        self.assertEqual(statuses.count(400), self.THREADS * self.REPEAT - 10)
+        self.assertEqual(HomeData.objects.for_user_date(self.user, self.today).get().call_count, 0)
+        self.assertEqual(DailyRollup.objects.for_user_date(self.user, self.today).get().call_count, 0)
+
+
+@override_settings(INGESTION_BUFFER_ENABLED=True, INGESTION_FLUSH_INTERVAL=3600)
+@unittest.skipIf(ingestion.fcntl is None, '書き込みバッファはfcntlが必要')
+class IngestionBufferTests(TransactionTestCase):
+    """書き込みバッファの未書き込みの加算が、DBへの適用の前後で二重にも欠けもせずサマリーに合算されることを確認"""
+
+    def setUp(self):
+        wal_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(INGESTION_WAL_DIR=wal_dir))
+        self.enterContext(mock.patch.object(ingestion, 'buffer', ingestion.IngestionBuffer()))
+        self.enterContext(mock.patch.object(ingestion.IngestionBuffer, '_start'))  # 書き込みはテストから呼び出す
+        self.user = User.objects.create_user(username='buffer_user', password='password')
+        self.today = timezone.localdate()
+        HomeData.objects.create(user=self.user, date=self.today, input_name='buffer_user', call_count=2)
+        ingestion.buffer.add(self.user.pk, 'buffer_user', self.today, {'call_count': 3})
+
+    def test_flush_drops_segment_when_rollup_becomes_visible(self):
+        seen = []
+
+        def publish(user_id):
+            # コミット後の変更通知の時点で読み取られる値
+            rollup = DailyRollup.objects.get(user=self.user, date=self.today).call_count
+            pending = ingestion.buffer.pending(self.user.pk).get(self.today, {}).get('call_count', 0)
+            seen.append(rollup + pending)
+
+        with mock.patch.object(events, 'publish', publish):
+            self.assertEqual(ingestion.buffer.flush(), 1)
+        self.assertEqual(seen, [5])
+        self.assertEqual(ingestion.buffer.pending(self.user.pk), {})
+
+    async def test_async_summary_merges_pending(self):
+        response = await AsyncClient().get(reverse('monthly-summary-async'), headers=bearer(self.user))
+        self.assertEqual(response.status_code, 200)
+        summary = response.json()
+        self.assertEqual(summary['monthly']['details']['total_call'], 5)
+        self.assertEqual(summary['daily']['details']['daily_call'], 5)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'events'}})
+class CacheVersionBrokerTests(SimpleTestCase):
+    """他のワーカーでの書き込み（共有キャッシュの世代の変化）が、購読直後の最初の1回から通知されることを確認"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.enterContext(mock.patch.object(events.CacheVersionBroker, '_run'))  # 取得はテストから呼び出す
+        self.broker = events.CacheVersionBroker()
+
+    def bump(self, user_id):
+        """他のワーカーでの書き込みを再現（サマリーキャッシュの世代を進める）"""
+        caches['default'].set(f'summary:version:{user_id}', summary_cache.current_version(user_id) + 1, None)
+
+    async def test_first_change_after_subscribe_is_notified(self):
+        subscription = self.broker.subscribe(1)
+        self.bump(1)
+        self.broker.poll()
+        self.assertTrue(await subscription.wait(0.1))
+
+    async def test_version_key_appearing_is_notified(self):
+        subscription = self.broker.subscribe(2)
+        caches['default'].delete('summary:version:2')
+        self.broker.poll()
+        self.assertTrue(await subscription.wait(0.1))  # 世代キーが消えた
+        self.bump(2)
+        self.broker.poll()
+        self.assertTrue(await subscription.wait(0.1))  # 世代キーが新たに設定された
+
+    async def test_unchanged_version_is_not_notified(self):
+        subscription = self.broker.subscribe(3)
+        self.broker.poll()
+        self.broker.poll()
+        self.assertFalse(await subscription.wait(0.1))
+        subscription.close()
+        self.broker.poll()
+        self.assertEqual(self.broker._versions, {})
+
+
+@override_settings(TIMESERIES_CACHE_ENABLED=False, REPLICA_STICKY_SECONDS=60)
+class ReplicaRoutingTests(TransactionTestCase):
+    """参照系APIの読み取りはレプリカ、書き込みと書き込み直後の読み取りはプライマリに送られることを確認"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # レプリカはdefaultの複製（TEST.MIRROR）として追加し、別の接続で同じテストDBを参照する
+        # （テストランナーのDB作成・システムチェックの対象外とするため、クラスの準備後に追加する）
+        replica = {**connections['default'].settings_dict, 'TEST': {'MIRROR': 'default'}}
+        cls.enterClassContext(mock.patch.dict(settings.DATABASES, {REPLICA: replica}))
+        cls.addClassCleanup(cls.close_replica)
+        cls.databases = cls.databases | {REPLICA}
+
+    @classmethod
+    def close_replica(cls):
+        replica = connections[REPLICA]
+        replica.close()
+        if hasattr(replica, 'close_pool'):
+            replica.close_pool()  # PostgreSQLの接続プール使用時はプールの接続も閉じる
+        del connections[REPLICA]
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='replica_user', password='password')
+        HomeData.objects.create(user=self.user, date=timezone.localdate(), input_name='replica_user', call_count=5)
+        caches['default'].clear()  # 準備データの書き込みによるプライマリへの固定を解除
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, name):
+        """GETを実行し、（レスポンス, プライマリのクエリ, レプリカのクエリ）を返す"""
+        with CaptureQueriesContext(connections['default']) as primary, CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.client.get(reverse(name))
+        self.assertEqual(response.status_code, 200)
+        return response, primary.captured_queries, replica.captured_queries
+
+    def test_reads_go_to_replica(self):
+        response, primary, replica = self.get('daily-record-list')
+        self.assertEqual(response.data['results'][0]['call_count'], 5)
+        self.assertEqual(primary, [])
+        self.assertTrue(replica)
+
+        response, primary, replica = self.get('monthly-summary')
+        self.assertEqual(response.data['monthly']['details']['total_call'], 5)
+        self.assertEqual(primary, [])
+        self.assertTrue(replica)
+
+    def test_writes_go_to_primary(self):
+        with CaptureQueriesContext(connections['default']) as primary, CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.client.post(reverse('daily-record-list'), {
+                'date': '2025-02-03', 'input_name': 'replica_user', 'call_count': 7,
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(replica.captured_queries, [])
+        self.assertTrue(any(query['sql'].startswith('INSERT') for query in primary.captured_queries))
+
+        # 読み取り先がレプリカの処理中でも書き込みはプライマリ
+        with CaptureQueriesContext(connections[REPLICA]) as replica, reading_from(REPLICA):
+            HomeData.objects.filter(user=self.user, date='2025-02-03').update(call_count=8)
+        self.assertEqual(replica.captured_queries, [])
+        self.assertEqual(HomeData.objects.get(user=self.user, date='2025-02-03').call_count, 8)
+
+    def test_reads_after_write_stick_to_primary(self):
+        other = User.objects.create_user(username='replica_other', password='password')
+        caches['default'].clear()
+        response = self.client.post(reverse('daily-record-list'), {
+            'date': '2025-02-03', 'input_name': 'replica_user', 'call_count': 7,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        # 書き込んだユーザーの読み取りは期間内はプライマリ
+        for name in ('daily-record-list', 'monthly-summary'):
+            _, primary, replica = self.get(name)
+            self.assertTrue(primary)
+            self.assertEqual(replica, [])
+
+        # 他のユーザーの読み取りはレプリカのまま
+        self.client.force_authenticate(other)
+        _, primary, replica = self.get('daily-record-list')
+        self.assertEqual(primary, [])
+        self.assertTrue(replica)
+
+        # 期間が過ぎればレプリカに戻る
+        self.client.force_authenticate(self.user)
+        expired = time.time() + 61
+        with mock.patch('time.time', return_value=expired):
+            _, primary, replica = self.get('daily-record-list')
+        self.assertEqual(primary, [])
+        self.assertTrue(replica)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """ASGIでも同期ビューの処理がプロファイルに含まれることを確認"""
+
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(PROFILING_ENABLED=True, PROFILE_SAMPLE_RATE=0, PROFILE_DIR=directory))
+        self.user = User.objects.create_user(username='profile_admin', password='password', is_staff=True)
+
+    def profiled_functions(self, capture_id):
+        stats = pstats.Stats(os.path.join(profiling.profile_dir(), f'{capture_id}.prof'))
+        return {name for _, _, name in stats.stats}
+
+    async def test_sync_view_is_profiled_in_view_thread(self):
+        response = await AsyncClient().get(
+            reverse('monthly-summary'), headers={**bearer(self.user), 'X-Profile': '1'}
+        )
+        self.assertEqual(response.status_code, 200)
+        capture = profiling.list_captures()[0]
+        self.assertEqual((capture['id'], capture['scope']), (response['X-Profile-Id'], 'view_thread'))
+        self.assertIn('current_summary', self.profiled_functions(capture['id']))
+
+    async def test_async_view_is_flagged(self):
+        response = await AsyncClient().get(
+            reverse('monthly-summary-async'), headers={**bearer(self.user), 'X-Profile': '1'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(profiling.list_captures()[0]['scope'], 'event_loop')
+
+    def test_wsgi_request_is_profiled(self):
+        response = self.client.get(reverse('monthly-summary'), headers={**bearer(self.user), 'X-Profile': '1'})
+        capture = profiling.list_captures()[0]
+        self.assertEqual((capture['id'], capture['scope']), (response['X-Profile-Id'], 'request'))
+        self.assertIn('current_summary', self.profiled_functions(capture['id']))
+
+
+class TokenClaimsTests(TestCase):
+    """ユーザー名・管理者フラグのクレームがアクセストークンのみに含まれ、更新時にDBから再設定されることを確認"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='staff_user', password='password', is_staff=True)
+        self.client = APIClient()
+
+    def refresh(self, refresh_token):
+        response = self.client.post(reverse('token_refresh'), {'refresh': refresh_token}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_login_puts_claims_on_access_token_only(self):
+        response = self.client.post(
+            reverse('token_obtain_pair'), {'username': 'staff_user', 'password': 'password'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        access = AccessToken(response.data['access'])
+        self.assertEqual((access['username'], access['is_staff']), ('staff_user', True))
+        refresh = RefreshToken(response.data['refresh'])
+        self.assertNotIn('username', refresh.payload)
+        self.assertNotIn('is_staff', refresh.payload)
+
+    def test_refresh_reloads_demoted_user(self):
+        refresh = str(ClaimsTokenObtainPairSerializer.get_token(self.user))
+        User.objects.filter(pk=self.user.pk).update(is_staff=False, username='renamed_user')
+
+        data = self.refresh(refresh)
+        access = AccessToken(data['access'])
+        self.assertEqual((access['username'], access['is_staff']), ('renamed_user', False))
+        response = self.client.get(reverse('admin-cache-stats'), HTTP_AUTHORIZATION=f'Bearer {data["access"]}')
+        self.assertEqual(response.status_code, 403)
+
+    def test_refresh_ignores_claims_in_legacy_refresh_token(self):
+        legacy = RefreshToken.for_user(self.user)
+        legacy['username'] = 'staff_user'
+        legacy['is_staff'] = True
+        User.objects.filter(pk=self.user.pk).update(is_staff=False)
+
+        data = self.refresh(str(legacy))
+        self.assertFalse(AccessToken(data['access'])['is_staff'])
+        self.assertNotIn('is_staff', RefreshToken(data['refresh']).payload)
+
+    def test_refresh_rejects_deleted_user(self):
+        refresh = str(ClaimsTokenObtainPairSerializer.get_token(self.user))
+        self.user.delete()
+        response = self.client.post(reverse('token_refresh'), {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class FiveLoginsThrottle(TokenBucketThrottle):
+    """テスト用（1分あたり5回、識別子は固定）"""
+    scope = 'test'
+
+    def get_rate(self):
+        return '5/min'
+
+    def get_ident_key(self, request, view):
+        return 'same-user'
+
+
+def _allow_in_child(results, attempts):
+    """子プロセスでの認証リクエストの許可件数"""
+    caches['default'].close()
+    allowed = sum(FiveLoginsThrottle().allow_request(SimpleNamespace(), None) for _ in range(attempts))
+    results.put(allowed)
+
+
+class TokenBucketThrottleTests(SimpleTestCase):
+    """同時リクエストでもバケットの容量を超えて許可しないことを確認"""
+
+    def test_concurrent_threads_do_not_overspend(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                                   'LOCATION': 'throttle-threads'}}):
+            allowed = []
+            threads = [
+                threading.Thread(target=lambda: allowed.append(
+                    FiveLoginsThrottle().allow_request(SimpleNamespace(), None)
+                ))
+                for _ in range(20)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(sum(allowed), 5)
+
+    def test_concurrent_processes_share_file_cache_bucket(self):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            self.skipTest('forkを利用できない環境')
+        with tempfile.TemporaryDirectory() as directory, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory,
+        }}):
+            context = multiprocessing.get_context('fork')
+            results = context.Queue()
+            processes = [context.Process(target=_allow_in_child, args=(results, 3)) for _ in range(8)]
+            for process in processes:
+                process.start()
+            allowed = sum(results.get(timeout=30) for _ in processes)
+            for process in processes:
+                process.join()
+            self.assertEqual(allowed, 5)
+
+    def test_rejection_reports_wait(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                                   'LOCATION': 'throttle-wait'}}):
+            throttle = FiveLoginsThrottle()
+            results = [throttle.allow_request(SimpleNamespace(), None) for _ in range(6)]
+            self.assertEqual(results, [True] * 5 + [False])
+            self.assertAlmostEqual(throttle.wait(), 12, delta=0.5)
+
+
+    def test_file_cache_lock_is_per_bucket(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory,
+        }}), mock.patch.object(throttling, 'BUCKET_LOCK_TIMEOUT', 0.05):
+            cache = caches['default']
+            def stripe(key):
+                return int(hashlib.sha256(key.encode()).hexdigest()[:8], 16) % throttling.BUCKET_LOCK_FILES
+
+            other = next(key for key in (f'throttle:test:{index}' for index in range(100)) if stripe(key) != stripe('a'))
+            with bucket_lock(cache, 'a') as locked:
+                self.assertTrue(locked)
+                # 他のバケットは待たずに取得でき、同じバケットは待ち時間の上限で諦める
+                with bucket_lock(cache, other) as other_locked:
+                    self.assertTrue(other_locked)
+                with bucket_lock(cache, 'a') as same_locked:
+                    self.assertFalse(same_locked)
+
+
+class AuthIPThrottleTests(SimpleTestCase):
+    """クライアントが送るX-Forwarded-Forを変えても、接続元IPごとのバケットが別にならないことを確認"""
+
+    def setUp(self):
+        self.enterContext(override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'throttle-ip',
+        }}))
+        caches['default'].clear()
+        self.capacity = AuthIPThrottle().capacity
+
+    def allowed(self, forwarded_for, remote_addr='10.0.0.1'):
+        request = RequestFactory().post('/api/token/', HTTP_X_FORWARDED_FOR=forwarded_for, REMOTE_ADDR=remote_addr)
+        return AuthIPThrottle().allow_request(request, None)
+
+    def test_spoofed_forwarded_for_behind_proxy(self):
+        # プロキシ（1段）が末尾に実際の接続元を追加する
+        results = [self.allowed(f'198.51.100.{index}, 203.0.113.5') for index in range(self.capacity + 1)]
+        self.assertEqual(results, [True] * self.capacity + [False])
+        self.assertTrue(self.allowed('198.51.100.1, 203.0.113.6'))
+
+    def test_spoofed_forwarded_for_without_proxy(self):
+        rest_framework = {**settings.REST_FRAMEWORK, 'NUM_PROXIES': 0}
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            results = [
+                self.allowed(f'198.51.100.{index}', remote_addr='203.0.113.5') for index in range(self.capacity + 1)
+            ]
+        self.assertEqual(results, [True] * self.capacity + [False])
+
+
+class SeedingCleanupTests(TestCase):
+    """合成データの削除が、seedで作成したユーザー以外を削除しないことを確認"""
+
+    def test_clear_and_discard_keep_real_users(self):
+        real = [
+            User.objects.create_user(username='bench_tanaka', password='password'),
+            User.objects.create_user(username='seed00000', password='password'),
+            # 合成データと同じ接頭辞でも目印のないユーザーは対象外
+            User.objects.create_user(username='synthetic__seed99999', password='password'),
+        ]
+        HomeData.objects.create(user=real[0], date=date(2025, 3, 5), input_name='bench_tanaka', call_count=1)
+        first = seed(2, 3, date(2025, 3, 10), prefix='seed', random_seed=1)
+        second = seed(2, 3, date(2025, 3, 10), prefix='bench', random_seed=1)
+
+        self.assertEqual(discard(second + real), 2)
+        self.assertEqual(clear('seed'), 2)
+        self.assertFalse(User.objects.filter(pk__in=[user.pk for user in first + second]).exists())
+        self.assertEqual(User.objects.filter(pk__in=[user.pk for user in real]).count(), 3)
+        self.assertTrue(HomeData.objects.filter(user=real[0]).exists())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class QueryBudgetTests(TestCase):
+    """
+    主要APIの1リクエストあたりのクエリ数がQUERY_BUDGETSの件数と一致することを確認（N+1の検出）
+    キャッシュを無効化して毎回DBから集計させ、データ量の異なるユーザーで同じ件数であることを確認する
+    日付は固定し、作成・加算は最も多くなる月初・日初の書き込み（集計行の作成を含む）とする
+    """
+    password = 'budgetpass123'
+
+    @classmethod
+    def setUpTestData(cls):
+        end_date = date(2025, 3, 20)
+        cls.users = [
+            seed(1, 1, end_date, prefix='budget_small', password=cls.password, random_seed=1)[0],
+            seed(3, 60, end_date, prefix='budget_large', password=cls.password, random_seed=1, weekend_ratio=1)[0],
+        ]
+
+    def assertWithinBudget(self, label, send, expected_status=200):
+        budget = QUERY_BUDGETS[label]
+        if connection.vendor != 'postgresql':
+            budget -= STATEMENT_TIMEOUT_QUERIES.get(label, 0)
+        for user in self.users:
+            with self.subTest(user=user.username):
+                client = APIClient()
+                with self.assertNumQueries(budget):
+                    response = send(client, bearer(user), user)
+                self.assertEqual(response.status_code, expected_status)
+
+    def test_monthly_summary(self):
+        self.assertWithinBudget(
+            'monthly-summary/', lambda client, headers, user: client.get('/api/monthly-summary/', headers=headers)
+        )
+
+    def test_daily_record_list(self):
+        self.assertWithinBudget(
+            'daily-record/ (一覧)', lambda client, headers, user: client.get('/api/daily-record/', headers=headers)
+        )
+
+    def test_daily_record_create_in_new_month(self):
+        self.assertWithinBudget('daily-record/ (作成)', lambda client, headers, user: client.post(
+            '/api/daily-record/', {'date': '2025-05-02', 'call_count': 10, 'catch_count': 3},
+            format='json', headers=headers,
+        ), 201)
+
+    def test_increment_creates_todays_record(self):
+        self.assertWithinBudget('daily-record/today/increment/', lambda client, headers, user: client.post(
+            '/api/daily-record/today/increment/', {'call_count': 1}, format='json', headers=headers,
+        ), 201)
+
+    def test_monthly_target(self):
+        self.assertWithinBudget(
+            'monthly-target/', lambda client, headers, user: client.get('/api/monthly-target/2025-03/', headers=headers)
+        )
+
+    def test_login(self):
+        self.assertWithinBudget('login/', lambda client, headers, user: client.post(
+            '/api/login/', {'username': user.username, 'password': self.password}, format='json',
+        ))
@@ -0,0 +1,179 @@
+# 認証エンドポイントのスロットリング・同時実行制御
+# パスワードハッシュ計算（PBKDF2）はCPU負荷が高いため、呼び出し頻度と同時実行数を制限する
+
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows等（ファイルキャッシュでもロックキーで排他する）
+    fcntl = None
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from rest_framework.exceptions import Throttled
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    トークンバケット方式のスロットリング基底クラス
+    レートはREST_FRAMEWORKのDEFAULT_THROTTLE_RATES[scope]（例: '10/min'）で指定し、
+    バケット容量=リクエスト数、補充速度=リクエスト数/期間 として扱う
+    バケットの状態はキャッシュに保存するためワーカープロセス間で共有される
+    状態の読み取り〜更新はbucket_lockで全ワーカープロセスにわたって排他し、同時リクエストでの超過を防ぐ
+    """
+    scope = None
+    cache_alias = 'default'
+
+    def __init__(self):
+        self.capacity, self.refill_rate = self.parse_rate(self.get_rate())
+        self.wait_seconds = None
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    @staticmethod
+    def parse_rate(rate):
+        """'回数/期間' を（容量, 1秒あたりの補充量）に変換（未設定ならNone）"""
+        if rate is None:
+            return None, None
+        num, period = rate.split('/')
+        duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+        return int(num), int(num) / duration
+
+    def get_ident_key(self, request, view):
+        """バケットを識別する値を返す（Noneなら制限対象外）"""
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        if self.capacity is None:
+            return True
+        ident = self.get_ident_key(request, view)
+        if ident is None:
+            return True
+
+        digest = hashlib.sha256(str(ident).encode()).hexdigest()[:32]
+        key = f'throttle:{self.scope}:{digest}'
+        cache = caches[self.cache_alias]
+        with bucket_lock(cache, key) as locked:
+            if not locked:
+                # ロックを取得できないほど同じバケットへのリクエストが集中している
+                self.wait_seconds = 1 / self.refill_rate
+                return False
+            now = time.time()
+            tokens, updated_at = cache.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            else:
+                self.wait_seconds = (1 - tokens) / self.refill_rate
+            # 満杯まで補充される時間だけ保持すれば十分
+            cache.set(key, (tokens, now), int(self.capacity / self.refill_rate) + 1)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+BUCKET_LOCK_TIMEOUT = 1  # ロックキーの保持・取得待ちの上限（秒）
+BUCKET_LOCK_FILES = 64  # ファイルキャッシュで使うロックファイルの数（バケットをこの数に振り分けて排他する）
+
+
+@contextmanager
+def bucket_lock(cache, key):
+    """
+    バケットの読み取り〜更新を全ワーカープロセスで排他する（取得できたかどうかを返す）
+    ファイルキャッシュはバケットごとに振り分けたロックファイル（flock、同一ホストのプロセス間で有効）、
+    それ以外はロックキーのcache.add（Redis/Memcachedでは原子的）で排他する
+    いずれも他のバケットの処理は待たず、同じバケットでBUCKET_LOCK_TIMEOUT秒以内に取得できなければFalse
+    """
+    deadline = time.monotonic() + BUCKET_LOCK_TIMEOUT
+    if isinstance(cache, FileBasedCache) and fcntl is not None:
+        os.makedirs(cache._dir, exist_ok=True)
+        stripe = int(hashlib.sha256(key.encode()).hexdigest()[:8], 16) % BUCKET_LOCK_FILES
+        with open(os.path.join(cache._dir, f'throttle-{stripe:02}.lock'), 'a') as lock_file:
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        yield False
+                        return
+                    time.sleep(0.005)
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return
+
+    lock_key = f'{key}:lock'
+    # ロックを保持したプロセスが異常終了してもBUCKET_LOCK_TIMEOUT秒で解放される
+    while not cache.add(lock_key, 1, BUCKET_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            yield False
+            return
+        time.sleep(0.005)
+    try:
+        yield True
+    finally:
+        cache.delete(lock_key)
+
+
+class AuthIPThrottle(TokenBucketThrottle):
+    """接続元IPアドレスごとの認証リクエスト制限"""
+    scope = 'auth_ip'
+
+    def get_ident_key(self, request, view):
+        return self.get_ident(request)
+
+
+class AuthUsernameThrottle(TokenBucketThrottle):
+    """ユーザー名ごとの認証リクエスト制限（同一アカウントへの総当たり対策）"""
+    scope = 'auth_username'
+
+    def get_ident_key(self, request, view):
+        try:
+            username = request.data.get('username')
+        except AttributeError:
+            return None
+        if not username or not isinstance(username, str):
+            return None
+        return username.strip().lower()
+
+
+AUTH_THROTTLE_CLASSES = [AuthIPThrottle, AuthUsernameThrottle]
+
+
+# パスワードハッシュ計算の同時実行数制限（プロセス単位）
+HASHING_CONCURRENCY = getattr(settings, 'AUTH_HASHING_CONCURRENCY', None) or os.cpu_count() or 1
+HASHING_RETRY_AFTER = getattr(settings, 'AUTH_HASHING_RETRY_AFTER', 1)  # 秒
+_hashing_slots = threading.BoundedSemaphore(HASHING_CONCURRENCY)
+
+
+class HashingBusy(Throttled):
+    """ハッシュ計算の同時実行数が上限に達している場合の例外（429、Retry-After付き）"""
+    default_detail = '認証処理が混み合っています。しばらくしてから再度お試しください'
+    extra_detail_singular = '（{wait}秒後に再試行可能）'
+    extra_detail_plural = '（{wait}秒後に再試行可能）'
+
+
+@contextmanager
+def hashing_slot():
+    """
+    パスワードハッシュ計算の実行枠を確保
+    空きがない場合は待機せずにHashingBusyを送出する
+    """
+    if not _hashing_slots.acquire(blocking=False):
+        raise HashingBusy(wait=HASHING_RETRY_AFTER)
+    try:
+        yield
+    finally:
+        _hashing_slots.release()
@@ -0,0 +1,241 @@
+# ユーザー別の営業実績の時系列キャッシュ（プロセス内）
+# 日別の7指標を記録日のオフセットで引ける配列と累積和（prefix sum）で保持し、
+# 任意期間の合計・比率を期間の長さによらず一定時間で求める
+# 初回参照時に読み込み、HomeDataの保存・削除時は該当日のみ更新する。メモリ使用量の上限を超えた場合は最も古く参照されたユーザーから破棄する
+# 該当日のみの更新は、保持している世代がその書き込みで進めた世代の直前の場合に限る（それ以外は破棄して再読み込み）
+
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from . import analytics, summary_cache
+from .models import COUNTER_FIELDS, DailyRollup
+from .routers import PRIMARY, reading_from
+
+
+def enabled():
+    return getattr(settings, 'TIMESERIES_CACHE_ENABLED', True)
+
+
+class UserSeries:
+    """
+    1ユーザー分の日別指標の時系列
+    origin: 先頭の日付、counts: (日数, 7指標) の配列（行はoriginからの日数）、present: 日別集計行の有無
+    prefix: countsの累積和（先頭に0の行を追加）。[start, end) の合計は prefix[end] - prefix[start]
+    更新時は新しい配列を作って一括で置き換えるため、読み取り側はロックなしで一貫した値を参照できる
+    """
+    def __init__(self, user_id, origin, counts, present, version):
+        self.user_id = user_id
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self._data = (origin, counts, present, self._prefix(counts))
+
+    @classmethod
+    def load(cls, user_id, version):
+        """日別集計（アーカイブ済みの月を含む）から読み込む"""
+        # 長期間保持するため、反映遅延のあるレプリカではなくプライマリから読み込む
+        with reading_from(PRIMARY):
+            matrix = analytics.load_matrix([user_id])
+        if not len(matrix):
+            return cls(user_id, None, np.zeros((0, len(COUNTER_FIELDS)), dtype=np.int64),
+                       np.zeros(0, dtype=bool), version)
+        offsets = (matrix.dates - matrix.dates[0]).astype(np.int64)
+        counts = np.zeros((int(offsets[-1]) + 1, len(COUNTER_FIELDS)), dtype=np.int64)
+        present = np.zeros(len(counts), dtype=bool)
+        counts[offsets] = matrix.counts
+        present[offsets] = True
+        return cls(user_id, matrix.dates[0].item(), counts, present, version)
+
+    @staticmethod
+    def _prefix(counts):
+        prefix = np.zeros((len(counts) + 1, len(COUNTER_FIELDS)), dtype=np.int64)
+        np.cumsum(counts, axis=0, out=prefix[1:])
+        return prefix
+
+    @property
+    def nbytes(self):
+        _, counts, present, prefix = self._data
+        return counts.nbytes + present.nbytes + prefix.nbytes
+
+    @staticmethod
+    def _offset(origin, length, day):
+        """日付の行番号（範囲外は0〜日数に丸める）"""
+        if origin is None:
+            return 0
+        return min(max((day - origin).days, 0), length)
+
+    def totals(self, start, end):
+        """期間 [start, end) の指標ごとの合計"""
+        origin, counts, _, prefix = self._data
+        first, last = self._offset(origin, len(counts), start), self._offset(origin, len(counts), end)
+        if last <= first:
+            return dict.fromkeys(COUNTER_FIELDS, 0)
+        return dict(zip(COUNTER_FIELDS, (prefix[last] - prefix[first]).tolist()))
+
+    def day(self, day):
+        """指定日の指標（日別集計行がなければNone）"""
+        origin, counts, present, _ = self._data
+        if origin is None or not 0 <= (day - origin).days < len(counts):
+            return None
+        offset = (day - origin).days
+        if not present[offset]:
+            return None
+        return dict(zip(COUNTER_FIELDS, counts[offset].tolist()))
+
+    def records(self, start, end):
+        """期間 [start, end) の日別集計行（date と各指標の辞書、日付順）"""
+        origin, counts, present, _ = self._data
+        first, last = self._offset(origin, len(counts), start), self._offset(origin, len(counts), end)
+        offsets = np.flatnonzero(present[first:last]) + first
+        return [
+            {'date': origin + datetime.timedelta(days=offset), **dict(zip(COUNTER_FIELDS, values))}
+            for offset, values in zip(offsets.tolist(), counts[offsets].tolist())
+        ]
+
+    def set_day(self, day, values):
+        """指定日の指標を置き換える（valuesがNoneの場合は集計行なし）。期間外の日付は配列を拡張する"""
+        if values is None and self.day(day) is None:
+            return
+        origin, counts, present, prefix = self._data
+        width = len(COUNTER_FIELDS)
+        if origin is None:
+            origin = day
+        before = max((origin - day).days, 0)
+        after = max((day - origin).days + 1 - len(counts), 0)
+        if before or after:
+            counts = np.concatenate([
+                np.zeros((before, width), dtype=np.int64), counts, np.zeros((after, width), dtype=np.int64)
+            ])
+            present = np.concatenate([np.zeros(before, dtype=bool), present, np.zeros(after, dtype=bool)])
+            origin = min(origin, day)
+            prefix = self._prefix(counts)
+        else:
+            counts, present, prefix = counts.copy(), present.copy(), prefix.copy()
+
+        offset = (day - origin).days
+        row = np.array([(values or {}).get(field) or 0 for field in COUNTER_FIELDS], dtype=np.int64)
+        # 変更日以降の累積和のみ差分を加算
+        prefix[offset + 1:] += row - counts[offset]
+        counts[offset] = row
+        present[offset] = values is not None
+        self._data = (origin, counts, present, prefix)
+
+
+class SeriesStore:
+    """
+    ユーザー別の時系列のLRUキャッシュ（メモリ使用量の上限付き）
+    別プロセスでの更新はサマリーキャッシュの世代（共有キャッシュ）の変化で検出して再読み込みする
+    """
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'loads': 0, 'updates': 0, 'discards': 0, 'evictions': 0}
+
+    def get(self, user_id):
+        """ユーザーの時系列（未読み込み・他プロセスで更新済み・有効期間切れの場合は読み込む）"""
+        version = summary_cache.current_version(user_id)
+        max_age = getattr(settings, 'TIMESERIES_CACHE_MAX_AGE', 300)
+        with self._lock:
+            series = self._entries.get(user_id)
+            if (
+                series is not None and version is not None and series.version == version
+                and time.monotonic() - series.loaded_at < max_age
+            ):
+                self._entries.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return series
+
+        series = UserSeries.load(user_id, version)
+        with self._lock:
+            self._stats['loads'] += 1
+            self._store(series)
+        return series
+
+    def _store(self, series):
+        previous = self._entries.pop(series.user_id, None)
+        if previous is not None:
+            self._bytes -= previous.nbytes
+        self._entries[series.user_id] = series
+        self._bytes += series.nbytes
+        max_bytes = getattr(settings, 'TIMESERIES_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        while self._bytes > max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self._stats['evictions'] += 1
+
+    def refresh_days(self, user_id, days, bump):
+        """
+        読み込み済みのユーザーの指定日を日別集計行から更新し、書き込みで進めた世代を採用する
+        （HomeDataの保存・削除のコミット後に、サマリーキャッシュの世代更新より後で呼ばれる）
+        bumpはその書き込みで進めた (直前の世代, 進めた世代)。保持している世代が直前の世代でなければ、
+        間に他の書き込み（別プロセス・一括登録等）があり該当日以外も変わり得るため、時系列を破棄する
+        """
+        with self._lock:
+            if user_id not in self._entries:
+                return
+        previous, version = bump or (None, None)
+        with self._lock:
+            series = self._entries.get(user_id)
+            if series is None:
+                return
+            if previous is None or series.version != previous:
+                self._entries.pop(user_id)
+                self._bytes -= series.nbytes
+                self._stats['discards'] += 1
+                return
+        with reading_from(PRIMARY):
+            rows = DailyRollup.objects.filter(user_id=user_id, date__in=days).values('date', *COUNTER_FIELDS)
+            values = {row.pop('date'): row for row in rows}
+        with self._lock:
+            # 読み取り中に同じユーザーの別の更新・破棄があった場合は、その結果を優先する
+            if self._entries.get(user_id) is not series or series.version != previous:
+                return
+            self._bytes -= series.nbytes
+            for day in days:
+                series.set_day(day, values.get(day))
+            series.version = version
+            self._bytes += series.nbytes
+            self._stats['updates'] += 1
+
+    def discard(self, user_id):
+        with self._lock:
+            series = self._entries.pop(user_id, None)
+            if series is not None:
+                self._bytes -= series.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'users': len(self._entries), 'bytes': self._bytes}
+
+
+store = SeriesStore()
+
+
+def record_saved(user_id, days):
+    """
+    HomeDataの保存・削除時に、コミット後に該当日を更新する
+    summary_cache.invalidateより後に呼び出す（コミット後の処理が登録順に実行され、進めた世代を参照するため）
+    """
+    if not enabled():
+        return
+
+    days = {
+        day if isinstance(day, datetime.date) else datetime.date.fromisoformat(str(day))
+        for day in days if day is not None
+    }
+
+    def refresh():
+        store.refresh_days(user_id, days, summary_cache.pop_bump(user_id))
+
+    transaction.on_commit(refresh)
@@ -3,17 +3,27 @@
 
 from django.urls import path
 from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
     TokenRefreshView,
     TokenVerifyView,
 )
+from . import async_views
 from .views import (
     RegistrationAPI,
+    ThrottledTokenObtainPairView,
     HomeDataListCreateAPIView,
+    HomeDataBulkUpsertAPIView,
+    HomeDataIncrementAPIView,
+    HomeDataExportAPIView,
+    AdminHomeDataExportAPIView,
     HomeDataRetrieveUpdateAPIView,
     MonthlyTargetAPIView,
     MonthlySummaryAPI,
     CurrentUserAPI,
+    SummaryCacheStatsAPI,
+    RequestMetricsAPI,
+    DatabasePoolStatsAPI,
+    SummaryRangeAPI,
+    LeaderboardAPI,
 )
 
 # URLパターン定義
@@ -21,16 +31,30 @@ urlpatterns = [
     # ユーザー認証関連
     path('register/', RegistrationAPI.as_view(), name='register'),  # 新規ユーザー登録処理
     path('current-user/', CurrentUserAPI.as_view(), name='current-user'),  # ログイン中ユーザー情報取得
-    path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),  # JWT認証トークン発行
+    path('login/', ThrottledTokenObtainPairView.as_view(), name='token_obtain_pair'),  # JWT認証トークン発行（レート制限付き）
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),  # JWT認証トークン更新
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),  # JWT認証トークン検証
     
     # 営業データ管理
     path('daily-record/', HomeDataListCreateAPIView.as_view(), name='daily-record-list'),  # 営業データ一覧表示・新規作成
+    path('daily-record/async/', async_views.daily_record_list, name='daily-record-list-async'),  # 営業データ一覧（非同期版）
+    path('daily-record/bulk/', HomeDataBulkUpsertAPIView.as_view(), name='daily-record-bulk'),  # 営業データ一括登録・更新（JSON配列/CSV）
+    path('daily-record/today/increment/', HomeDataIncrementAPIView.as_view(), name='daily-record-increment'),  # 当日の指標への加算（架電中の集計）
+    path('daily-record/export/', HomeDataExportAPIView.as_view(), name='daily-record-export'),  # 営業データのCSV/NDJSONストリーミング出力
     path('daily-record/<int:pk>/', HomeDataRetrieveUpdateAPIView.as_view(), name='daily-record-detail'),  # 営業データ詳細表示・更新
     
     # 目標・分析関連
     path('monthly-target/', MonthlyTargetAPIView.as_view(), name='monthly-target'),  # 月間目標設定・取得
     path('monthly-target/<str:year_month>/', MonthlyTargetAPIView.as_view(), name='monthly-target-detail'),  # 特定月の目標管理
     path('monthly-summary/', MonthlySummaryAPI.as_view(), name='monthly-summary'),  # 月間・日次実績集計・分析（統合API）
+    path('monthly-summary/async/', async_views.monthly_summary, name='monthly-summary-async'),  # 月間・日次実績集計（非同期版、ASGI向け）
+    path('monthly-summary/stream/', async_views.monthly_summary_stream, name='monthly-summary-stream'),  # 月間・日次実績の変更の配信（Server-Sent Events、ASGI専用）
+    path('summary/range/', SummaryRangeAPI.as_view(), name='summary-range'),  # 任意期間の日・週・月別集計と期間比較
+    path('leaderboard/', LeaderboardAPI.as_view(), name='leaderboard'),  # 月別の全ユーザーランキング
+
+    # 管理者用
+    path('admin/daily-record/export/', AdminHomeDataExportAPIView.as_view(), name='admin-daily-record-export'),  # 全ユーザーの営業データ出力
+    path('admin/cache-stats/', SummaryCacheStatsAPI.as_view(), name='admin-cache-stats'),  # サマリーキャッシュのヒット/ミス件数
+    path('admin/request-metrics/', RequestMetricsAPI.as_view(), name='admin-request-metrics'),  # ルート別の応答時間ヒストグラム
+    path('admin/db-pool/', DatabasePoolStatsAPI.as_view(), name='admin-db-pool'),  # コネクションプールの利用状況
 ]
@@ -4,16 +4,49 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions, generics
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import JSONParser
 from django.contrib.auth.hashers import make_password
-from .serializers import RegistrationSerializer, HomeDataSerializer, UserSerializer, MonthlyTargetSerializer, TokenVerifySerializer
-from .models import HomeData, User, MonthlyTarget
+from .serializers import DETACHED_MONTH_ERROR, RegistrationSerializer, HomeDataSerializer, HomeDataBulkRowSerializer, HomeDataIncrementSerializer, UserSerializer, MonthlyTargetSerializer, TokenVerifySerializer
+from .pagination import DateCursorPagination
+from .throttling import AUTH_THROTTLE_CLASSES, hashing_slot
+from .parsers import CSVRowParser
+from .renderers import CSVRenderer, NDJSONRenderer
+from .exports import aiter_batches, dict_rows, iter_csv, iter_ndjson, merge_rows, queryset_rows
+from .rollups import apply_delta, counter_values, refresh_dates, year_month_of
+from .periods import shift_year, bucket_start, count_buckets, iter_bucket_starts
+from .conditional import (
+    conditional_get,
+    home_data_etag, home_data_last_modified,
+    monthly_target_etag, monthly_target_last_modified,
+    monthly_summary_etag, monthly_summary_last_modified,
+)
+from . import analytics, archive, events, ingestion, leaderboard, partitioning, summary_cache, timeseries
+from .instrumentation import histograms
+from .dbutils import pool_stats, statement_timeout
+from .routers import read_from_replica, stick_to_primary
+from .models import HomeData, User, MonthlyTarget, DailyRollup, MonthlyRollup, DetachedMonth, COUNTER_FIELDS, NON_NEGATIVE_COUNTER_FIELDS, month_bounds
 from rest_framework_simplejwt.tokens import UntypedToken
-from rest_framework_simplejwt.views import TokenViewBase
+from rest_framework_simplejwt.views import TokenViewBase, TokenObtainPairView
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.utils import timezone
-from django.db.models import Sum
-from calendar import monthrange
-from django.http import JsonResponse
+from django.utils.dateparse import parse_date
+from django.utils.decorators import method_decorator
+from django.db import IntegrityError, transaction
+from django.db.models import DateField, F, Sum, Value
+from django.db.models.functions import Coalesce, Trunc
+from django.db.models.lookups import GreaterThanOrEqual
+from datetime import timedelta
+from collections import defaultdict
+from itertools import islice
+import csv
+import logging
+import re
+from django.http import JsonResponse, StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
 
 
 # ユーザー登録API
@@ -22,29 +55,64 @@ class RegistrationAPI(APIView):
     新規ユーザー登録を処理するAPIビュー
     POSTリクエストでユーザー情報を受け取り、バリデーション後にDBに保存
     """
+    throttle_classes = AUTH_THROTTLE_CLASSES
+
     def post(self, request):
-        # パスワードをハッシュ化してからシリアライザに渡す
-        request.data['password'] = make_password(request.data['password'])
-        
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            # 入力検証を通過した場合のみパスワードをハッシュ化（CPU負荷が高いため）
+            with hashing_slot():
+                password = make_password(serializer.validated_data['password'])
+            serializer.save(password=password)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+# ログイン（JWT発行）API
+class ThrottledTokenObtainPairView(TokenObtainPairView):
+    """
+    JWTトークン発行API（レート制限・ハッシュ計算の同時実行数制限付き）
+    """
+    throttle_classes = AUTH_THROTTLE_CLASSES
+
+    def post(self, request, *args, **kwargs):
+        with hashing_slot():
+            return super().post(request, *args, **kwargs)
+
+
+# 日付クエリパラメータ処理
+class DateParamMixin:
+    """クエリパラメータから日付を取得する共通処理"""
+
+    def get_date_param(self, name):
+        """クエリパラメータの日付（YYYY-MM-DD）を取得（不正な形式は400エラー）"""
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: '日付はYYYY-MM-DD形式で指定してください'})
+        return parsed
+
+
 # 営業データ一覧・作成API
-class HomeDataListCreateAPIView(generics.ListCreateAPIView):
+class HomeDataListCreateAPIView(DateParamMixin, generics.ListCreateAPIView):
     """
     営業データの一覧取得と新規作成を行うAPI
     
-    GET: ログインユーザーの営業データ一覧を取得（日付フィルタ可能）
+    GET: ログインユーザーの営業データ一覧を取得
+         date（完全一致）または date_from/date_to（両端を含む期間）で絞り込み可能
+         (date, id) 順のカーソルページネーションで返す（next のURLで次ページを取得）
     POST: 新規営業データを作成
     
     認証済みユーザーのみアクセス可能で、自分のデータのみ操作可能
     """
     serializer_class = HomeDataSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = DateCursorPagination
 
     def get_queryset(self):
         # 未認証の場合は空のクエリセットを返す
@@ -53,21 +121,35 @@ class HomeDataListCreateAPIView(generics.ListCreateAPIView):
             
         # 日付フィルタの取得
         date = self.request.query_params.get('date', None)
+        date_from = self.get_date_param('date_from')
+        date_to = self.get_date_param('date_to')
         try:
-            # ユーザーに紐づくデータのみ取得
-            queryset = HomeData.objects.filter(user=self.request.user)
-            # 日付指定があれば絞り込み
+            # ユーザーに紐づくデータのみ取得（日付指定があれば絞り込み）
             if date:
-                queryset = queryset.filter(date=date)
+                return HomeData.objects.for_user_date(self.request.user, date)
+
+            # カーソル位置に使うため日付未設定のデータは除外
+            queryset = HomeData.objects.for_user(self.request.user).filter(date__isnull=False)
+            if date_from:
+                queryset = queryset.filter(date__gte=date_from)
+            if date_to:
+                queryset = queryset.filter(date__lt=date_to + timedelta(days=1))
             return queryset
         except Exception as e:
-            print(f"データベースエラー: {str(e)}")
+            logger.exception('営業データの取得に失敗しました: %s', e)
             return HomeData.objects.none()
 
+    @read_from_replica
+    @method_decorator(conditional_get(home_data_etag, home_data_last_modified))
+    def get(self, request, *args, **kwargs):
+        # 変更がなければ一覧の取得・シリアライズを省略して304を返す
+        return super().get(request, *args, **kwargs)
+
+    @transaction.atomic
     def perform_create(self, serializer):
-        # 作成時にユーザー情報を自動設定
+        # 作成時にユーザー情報を自動設定（集計テーブル更新と同一トランザクション）
         serializer.save(
-            user=self.request.user,
+            user_id=self.request.user.pk,
             input_name=self.request.user.username
         )
 
@@ -82,7 +164,246 @@ class HomeDataRetrieveUpdateAPIView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return HomeData.objects.filter(user=self.request.user)
+        return HomeData.objects.for_user(self.request.user)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # 更新と集計テーブルの差分反映を同一トランザクションで実行
+        serializer.save()
+
+
+# 営業データ当日加算API
+class HomeDataIncrementAPIView(APIView):
+    """
+    当日の営業データの指標に差分を加算するAPI（架電中のリアルタイム集計用）
+
+    POST: {指標名: 差分} を受け付け、UPDATE ... SET 指標 = 指標 + 差分 の1文で加算する
+    当日のデータがなければ差分を初期値として作成する。同時に加算しても更新は失われない
+    加算後に負数となる指標（獲得数以外）がある場合、当月のパーティションを切り離している場合は加算せず400を返す
+    書き込みバッファの使用時は加算をバッファに追加して202を返す（DBへはまとめて書き込み、負数になる指標は0とする）
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = HomeDataIncrementSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        deltas = serializer.validated_data
+        today = timezone.localdate()
+        if DetachedMonth.objects.filter(year_month=year_month_of(today)).exists():
+            return Response({'error': DETACHED_MONTH_ERROR}, status=status.HTTP_400_BAD_REQUEST)
+
+        if ingestion.enabled():
+            # 書き込み前の加算は月間サマリーAPIの結果に合算される
+            ingestion.buffer.add(request.user.pk, request.user.username, today, deltas)
+            return Response({'date': today, 'accepted': deltas}, status=status.HTTP_202_ACCEPTED)
+
+        created = False
+        with transaction.atomic():
+            if not self.increment(request.user, today, deltas):
+                # 行があるのに更新できない場合は負数になる指標がある
+                if HomeData.objects.for_user_date(request.user, today).exists():
+                    return self.negative_error()
+                created = self.create(request.user, today, deltas)
+                # 同時に作成された場合は作成済みの行に加算する
+                if not created and not self.increment(request.user, today, deltas):
+                    return self.negative_error()
+
+        record = HomeData.objects.for_user_date(request.user, today).get()
+        return Response(
+            HomeDataSerializer(record).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    def negative_error(self):
+        return Response({'error': '加算後の値が0未満になる指標があります'}, status=status.HTTP_400_BAD_REQUEST)
+
+    def increment(self, user, day, deltas):
+        """既存の行に差分を加算し、更新できたかを返す（行がない、または負数になる場合はFalse）"""
+        conditions = [
+            GreaterThanOrEqual(Coalesce(F(field), Value(0)), -delta)
+            for field, delta in deltas.items()
+            if delta < 0 and field in NON_NEGATIVE_COUNTER_FIELDS
+        ]
+        updated = HomeData.objects.for_user_date(user, day).filter(*conditions).update(
+            updated_at=timezone.now(),
+            **{field: Coalesce(F(field), Value(0)) + delta for field, delta in deltas.items()},
+        )
+        if not updated:
+            return False
+
+        # save()を経由しないため、集計テーブルの差分更新とキャッシュの無効化を明示的に行う
+        apply_delta(user.pk, day, deltas)
+        summary_cache.invalidate(user.pk)
+        timeseries.record_saved(user.pk, [day])
+        stick_to_primary(user.pk)
+        leaderboard.invalidate(year_month_of(day))
+        return True
+
+    def create(self, user, day, deltas):
+        """差分を初期値として当日の行を作成し、作成できたかを返す（負数になる場合・同時に作成された場合はFalse）"""
+        if any(deltas[field] < 0 for field in NON_NEGATIVE_COUNTER_FIELDS if field in deltas):
+            return False
+        try:
+            # 一意制約違反（同時作成）時もトランザクションを継続できるようセーブポイント内で作成
+            with transaction.atomic():
+                HomeData(user_id=user.pk, date=day, input_name=user.username, **deltas).save()
+        except IntegrityError:
+            return False
+        return True
+
+
+# 営業データ一括登録API
+class HomeDataBulkUpsertAPIView(APIView):
+    """
+    営業データを一括で登録・更新するAPI
+
+    POST: JSON配列（application/json）またはCSV（text/csv、1行目はヘッダー）を受け付ける
+    一定件数ごとに検証し、(user, date) をキーとした一括upsertで書き込む
+    不正な行はエラーとして報告し、残りの行の登録は継続する
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser, CSVRowParser]
+    batch_size = 500  # 1回の書き込みでまとめる行数
+
+    def post(self, request):
+        rows = request.data
+        if isinstance(rows, dict):
+            return Response(
+                {'error': 'JSON配列またはCSVで送信してください'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        saved_count = 0
+        errors = []
+        rows = iter(rows)
+        row_number = 0
+        archived = archive.archived_year_months(request.user)  # アーカイブ済みの月は登録不可
+        detached = partitioning.detached_year_months()  # パーティションを切り離した月も登録不可
+        try:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+
+                # 行ごとに検証し、同一日付は後の行の入力済みの指標を優先
+                valid_rows = {}
+                for row in batch:
+                    row_number += 1
+                    serializer = HomeDataBulkRowSerializer(data=row, context={
+                        'archived_months': archived, 'detached_months': detached,
+                    })
+                    if serializer.is_valid():
+                        day = serializer.validated_data['date']
+                        valid_rows[day] = {**valid_rows.get(day, {}), **serializer.validated_data}
+                    else:
+                        errors.append({'row': row_number, 'errors': serializer.errors})
+
+                saved_count += self.upsert(request.user, list(valid_rows.values()))
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ParseError(f'{row_number + 1}行目付近のCSVを解析できません: {e}')
+
+        return Response(
+            {'saved': saved_count, 'errors': errors},
+            status=status.HTTP_200_OK if saved_count or not errors else status.HTTP_400_BAD_REQUEST
+        )
+
+    def upsert(self, user, rows):
+        """
+        検証済みの行を一括upsertし、集計テーブルを再計算
+        既存の日付は行に含まれる指標のみを更新する（含まれる指標の組み合わせごとに1回のupsert）
+        """
+        if not rows:
+            return 0
+        groups = defaultdict(list)
+        for row in rows:
+            groups[tuple(field for field in COUNTER_FIELDS if field in row)].append(row)
+        with transaction.atomic():
+            for fields, group in groups.items():
+                HomeData.objects.bulk_create(
+                    [HomeData(user_id=user.pk, input_name=user.username, **row) for row in group],
+                    update_conflicts=True,
+                    unique_fields=['user', 'date'],
+                    update_fields=['input_name', *fields, 'updated_at'],
+                )
+            refresh_dates(user.pk, [row['date'] for row in rows])
+            # bulk_createはシグナルを送信しないため明示的に無効化
+            summary_cache.invalidate(user.pk)
+            timeseries.record_saved(user.pk, [row['date'] for row in rows])
+            stick_to_primary(user.pk)
+            for year_month in {year_month_of(row['date']) for row in rows}:
+                leaderboard.invalidate(year_month)
+        return len(rows)
+
+
+# 営業データエクスポートAPI
+class HomeDataExportAPIView(DateParamMixin, APIView):
+    """
+    ログインユーザーの営業データをCSVまたはNDJSONで出力するAPI
+
+    GET: ?format=csv|ndjson&from=YYYY-MM-DD&to=YYYY-MM-DD（期間は両端を含む、省略可）
+    DBから一定件数ずつ読み出して逐次送信するため、件数に関わらずメモリ使用量は一定
+    （ASGIでは同期イテレーターが全件読み込まれるため、非同期イテレーターで出力する）
+    アーカイブ済みの月の行はアーカイブファイルから読み出し、出力順を保って結合する
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+    export_fields = ('date', *COUNTER_FIELDS)  # 出力列
+    ordering = ('date', 'id')  # 出力順（(user, date) インデックスに沿った順序）
+    merge_key = ('date',)  # アーカイブ済みの行と結合する際の順序（出力列のうちorderingに対応する列）
+    filename_prefix = 'daily-records'
+
+    def get_queryset(self):
+        return HomeData.objects.for_user(self.request.user).filter(date__isnull=False)
+
+    def get_archived_rows(self, date_from, date_to):
+        """期間 [date_from, date_to) のアーカイブ済みの行"""
+        return archive.iter_rows([self.request.user.pk], date_from, date_to)
+
+    def get(self, request):
+        date_from = self.get_date_param('from')
+        date_to = self.get_date_param('to')
+
+        queryset = self.get_queryset()
+        if date_from:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(date__lt=date_to + timedelta(days=1))
+        queryset = queryset.order_by(*self.ordering)
+        archived_rows = self.get_archived_rows(date_from, date_to + timedelta(days=1) if date_to else None)
+        rows = merge_rows(
+            self.export_fields,
+            self.merge_key,
+            queryset_rows(queryset, self.export_fields),
+            dict_rows(archived_rows, self.export_fields),
+        )
+
+        # ?format=未指定時はAcceptヘッダーで選択されたレンダラー（既定はCSV）に従う
+        if request.accepted_renderer.format == 'ndjson':
+            stream, extension = iter_ndjson(rows, self.export_fields), 'ndjson'
+        else:
+            stream, extension = iter_csv(rows, self.export_fields), 'csv'
+
+        if isinstance(request._request, ASGIRequest):
+            stream = aiter_batches(stream)
+        response = StreamingHttpResponse(stream, content_type=request.accepted_renderer.media_type + '; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{self.filename_prefix}.{extension}"'
+        return response
+
+
+# 営業データ全ユーザーエクスポートAPI（管理者用）
+class AdminHomeDataExportAPIView(HomeDataExportAPIView):
+    """全ユーザーの営業データを出力する管理者専用のエクスポートAPI"""
+    permission_classes = [permissions.IsAdminUser]
+    export_fields = ('user_id', 'user__username', 'date', *COUNTER_FIELDS)
+    ordering = ('user_id', 'date', 'id')
+    merge_key = ('user_id', 'date')
+    filename_prefix = 'all-daily-records'
+
+    def get_queryset(self):
+        return HomeData.objects.filter(date__isnull=False)
+
+    def get_archived_rows(self, date_from, date_to):
+        return archive.iter_rows(None, date_from, date_to)
 
 
 # 月間目標管理API
@@ -96,7 +417,13 @@ class MonthlyTargetAPIView(generics.RetrieveUpdateAPIView):
     
     def get_queryset(self):
         """ログインユーザーの月次目標データを取得"""
-        return MonthlyTarget.objects.filter(user=self.request.user)
+        return MonthlyTarget.objects.filter(user_id=self.request.user.pk)
+
+    @read_from_replica
+    @method_decorator(conditional_get(monthly_target_etag, monthly_target_last_modified))
+    def get(self, request, *args, **kwargs):
+        # 変更がなければ目標の取得を省略して304を返す
+        return super().get(request, *args, **kwargs)
 
     def get_object(self):
         """指定された年月の目標を取得（なければ作成）"""
@@ -108,7 +435,7 @@ class MonthlyTargetAPIView(generics.RetrieveUpdateAPIView):
         
         # 該当月の目標を取得または作成
         obj, created = MonthlyTarget.objects.get_or_create(
-            user=self.request.user,
+            user_id=self.request.user.pk,
             year_month=year_month,
             defaults={'target_acquisition': 0}
         )
@@ -117,7 +444,7 @@ class MonthlyTargetAPIView(generics.RetrieveUpdateAPIView):
     def perform_update(self, serializer):
         """更新時にユーザーと年月を自動設定"""
         serializer.save(
-            user=self.request.user,
+            user_id=self.request.user.pk,
             year_month=self.kwargs.get('year_month')
         )
 
@@ -148,11 +475,27 @@ class BaseSummaryAPI(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
     
-    def calculate_rate(self, numerator, denominator):
-        """比率を計算（ゼロ除算対策あり）"""
-        if denominator == 0:
-            return 0
-        return round((numerator / denominator) * 100, 1)
+    # 集計行の指標名とレスポンスのキー名の対応
+    DETAIL_KEYS = {
+        'call_count': 'call',
+        'catch_count': 'catch',
+        're_call_count': 're_call',
+        'prospective_count': 'prospective',
+        'approach_ng_count': 'approach_ng',
+        'product_explanation_ng_count': 'product_ng',
+        'acquisition_count': 'acquisition',
+    }
+
+    def calculate_rates(self, values):
+        """集計行の値（指標名をキーとする辞書）から電話応対数に対する各種比率を計算"""
+        return analytics.rates(values)
+
+    def to_details(self, values, prefix):
+        """集計行の値をレスポンス用のキー名（total_call等）に変換（未集計は0）"""
+        return {
+            f'{prefix}_{key}': values.get(field) or 0
+            for field, key in self.DETAIL_KEYS.items()
+        }
 
 
 # 月間実績サマリーAPI
@@ -161,131 +504,14 @@ class MonthlySummaryAPI(BaseSummaryAPI):
     月間および日次の営業実績サマリーを集計するAPI
     当月の実績と目標に対する進捗状況、および当日のデータを計算して返す
     """
+    @read_from_replica
+    @method_decorator(conditional_get(monthly_summary_etag, monthly_summary_last_modified))
     def get(self, request):
         try:
             # 現在の年月日を取得
             today = timezone.now()
-            year, month = today.year, today.month
-            
-            # 当月のデータ集計
-            monthly_data = HomeData.objects.filter(
-                user=request.user,
-                date__year=year,
-                date__month=month
-            ).aggregate(
-                total_call=Sum('call_count'),
-                total_catch=Sum('catch_count'),
-                total_re_call=Sum('re_call_count'),
-                total_prospective=Sum('prospective_count'),
-                total_approach_ng=Sum('approach_ng_count'),
-                total_product_ng=Sum('product_explanation_ng_count'),
-                total_acquisition=Sum('acquisition_count')
-            )
-            
-            # Noneを0に変換
-            monthly_data = {k: (v if v is not None else 0) for k, v in monthly_data.items()}
-
-            # 月の日数と経過日数を取得
-            try:
-                _, num_days = monthrange(year, month)
-                num_days = max(num_days, 30)  # 最低30日を保証
-                current_day = max(today.day, 1)  # 最低1日を保証
-            except:
-                num_days = 30
-                current_day = 1
-
-            # 月次目標を取得
-            target_acquisition = MonthlyTarget.objects.filter(
-                user=request.user,
-                year_month=f"{year}-{month:02}"
-            ).values_list('target_acquisition', flat=True).first() or 0
-
-            # 各種指標の計算
-            # 獲得率
-            acquisition_rate = self.calculate_rate(monthly_data['total_acquisition'], monthly_data['total_catch'])
-            
-            # 一日あたりの必要獲得数
-            daily_required_acquisition = target_acquisition / num_days if num_days > 0 else 0
-            
-            # 一日あたりの必要キャッチ数
-            daily_required_catch = (daily_required_acquisition * 100) / acquisition_rate if acquisition_rate > 0 else 0
-            
-            # 進捗率（時間経過に対する目標達成率）
-            time_progress = current_day / num_days if num_days > 0 else 0
-            target_progress = monthly_data['total_acquisition'] / target_acquisition if target_acquisition > 0 else 0
-            progress_rate = (target_progress / time_progress) * 100 if time_progress > 0 else 0
-            
-            # 仮想進捗件数（時間経過に応じた理想的な獲得数）
-            virtual_progress_count = time_progress * target_acquisition
-            
-            # 一日あたり平均獲得数
-            average_daily_acquisition = monthly_data['total_acquisition'] / current_day if current_day > 0 else 0
-            
-            # 月末獲得予測
-            predicted_month_end_acquisition = average_daily_acquisition * num_days
-
-            # 月間サマリー結果の整形
-            monthly_results = {
-                're_call_rate': self.calculate_rate(monthly_data['total_re_call'], monthly_data['total_catch']),
-                'prospective_rate': self.calculate_rate(monthly_data['total_prospective'], monthly_data['total_catch']),
-                'approach_ng_rate': self.calculate_rate(monthly_data['total_approach_ng'], monthly_data['total_catch']),
-                'product_ng_rate': self.calculate_rate(monthly_data['total_product_ng'], monthly_data['total_catch']),
-                'acquisition_rate': acquisition_rate,
-                'details': monthly_data,
-                'daily_required_acquisition': round(daily_required_acquisition, 1),
-                'daily_required_catch': round(daily_required_catch, 1),
-                'progress_rate': round(progress_rate, 1),
-                'virtual_progress_count': round(virtual_progress_count, 1),
-                'average_daily_acquisition': round(average_daily_acquisition, 1),
-                'predicted_month_end_acquisition': round(predicted_month_end_acquisition, 1)
-            }
-
-            # 日次データの集計（DailySummaryAPIと同じロジック）
             today_date = timezone.localdate()
-            daily_data = HomeData.objects.filter(
-                user=request.user,
-                date=today_date
-            ).aggregate(
-                daily_call=Sum('call_count'),
-                daily_catch=Sum('catch_count'),
-                daily_re_call=Sum('re_call_count'),
-                daily_prospective=Sum('prospective_count'),
-                daily_approach_ng=Sum('approach_ng_count'),
-                daily_product_ng=Sum('product_explanation_ng_count'),
-                daily_acquisition=Sum('acquisition_count')
-            )
-
-            # Noneを0に変換
-            daily_data = {k: (v if v is not None else 0) for k, v in daily_data.items()}
-            catch_count = daily_data['daily_catch']
-            
-            # 日次サマリー結果の整形
-            daily_results = {
-                're_call_rate': self.calculate_rate(daily_data['daily_re_call'], catch_count),
-                'prospective_rate': self.calculate_rate(daily_data['daily_prospective'], catch_count),
-                'approach_ng_rate': self.calculate_rate(daily_data['daily_approach_ng'], catch_count),
-                'product_ng_rate': self.calculate_rate(daily_data['daily_product_ng'], catch_count),
-                'acquisition_rate': self.calculate_rate(daily_data['daily_acquisition'], catch_count),
-                'details': daily_data
-            }
-
-            # 日毎のデータを取得（グラフ表示用）
-            daily_records = HomeData.objects.filter(
-                user=request.user,
-                date__year=year,
-                date__month=month
-            ).values('date', 'call_count', 'catch_count', 're_call_count', 
-                    'prospective_count', 'approach_ng_count', 
-                    'product_explanation_ng_count', 'acquisition_count')
-
-            # 統合結果
-            results = {
-                'monthly': monthly_results,
-                'daily': daily_results,
-                'daily_records': list(daily_records)
-            }
-
-            return Response(results)
+            return Response(self.current_summary(request.user, today, today_date))
 
         except Exception as e:
             return Response(
@@ -293,6 +519,302 @@ class MonthlySummaryAPI(BaseSummaryAPI):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def current_summary(self, user, today, today_date):
+        """
+        現時点のサマリー（GETとサマリーの配信ストリームで共通して使用）
+        書き込みバッファに未書き込みの加算があれば、キャッシュを使わずに集計して合算する（read-your-writes）
+        """
+        pending = ingestion.buffer.pending(
+            user.pk, *month_bounds(today.year, today.month)
+        ) if ingestion.enabled() else {}
+        if pending:
+            return self.build_summary(user, today, today_date, pending)
+
+        # 同じ条件の集計結果がキャッシュにあれば再利用（データ更新時に無効化）
+        return summary_cache.get_or_compute(
+            user.pk,
+            f"{today.year}-{today.month:02}",
+            today_date,
+            lambda: self.build_summary(user, today, today_date)
+        )
+
+    @staticmethod
+    def summary_querysets(user, today, today_date):
+        """
+        サマリーに必要な4つの独立したクエリを返す
+        (当月の集計行, 月次目標, 当日の集計行, 当月の日毎の集計行)
+        同期版・非同期版のサマリーAPIで共通して使用
+        """
+        year, month = today.year, today.month
+        return (
+            # 当月の集計行（HomeData保存時に差分更新済み）
+            MonthlyRollup.objects.filter(
+                user_id=user.pk,
+                year_month=f"{year}-{month:02}"
+            ).values(*COUNTER_FIELDS),
+            # 月次目標
+            MonthlyTarget.objects.filter(
+                user_id=user.pk,
+                year_month=f"{year}-{month:02}"
+            ).values_list('target_acquisition', flat=True),
+            # 当日の集計行
+            DailyRollup.objects.for_user_date(
+                user, today_date
+            ).values(*COUNTER_FIELDS),
+            # 日毎の集計行（グラフ表示用）
+            DailyRollup.objects.for_user_month(
+                user, year, month
+            ).order_by('date').values('date', *COUNTER_FIELDS),
+        )
+
+    def build_summary(self, user, today, today_date, pending=None):
+        """
+        月間・日次サマリーを集計（todayは当月判定、today_dateは当日判定に使用）
+        pendingは書き込みバッファの未書き込みの加算（{日付: {指標: 差分}}）で、集計行に合算する
+        """
+        if timeseries.enabled():
+            return self.build_summary_from_series(user, today, today_date, pending)
+        monthly_query, target_query, daily_query, records_query = self.summary_querysets(user, today, today_date)
+        with statement_timeout():
+            monthly_rollup = monthly_query.first() or {}
+            target_acquisition = target_query.first() or 0
+            daily_rollup = daily_query.first() or {}
+            daily_records = list(records_query)
+        if pending:
+            monthly_rollup, daily_rollup, daily_records = self.merge_pending(
+                today_date, monthly_rollup, daily_rollup, daily_records, pending
+            )
+        return self.assemble_summary(today, monthly_rollup, target_acquisition, daily_rollup, daily_records)
+
+    def build_summary_from_series(self, user, today, today_date, pending=None):
+        """月間・日次サマリーを時系列キャッシュから集計（DBアクセスは月次目標の取得のみ）"""
+        series = timeseries.store.get(user.pk)
+        start, end = month_bounds(today.year, today.month)
+        with statement_timeout():
+            target_acquisition = MonthlyTarget.objects.filter(
+                user_id=user.pk,
+                year_month=f"{today.year}-{today.month:02}"
+            ).values_list('target_acquisition', flat=True).first() or 0
+        monthly_rollup = series.totals(start, end)
+        daily_rollup = series.day(today_date) or {}
+        daily_records = series.records(start, end)
+        if pending:
+            monthly_rollup, daily_rollup, daily_records = self.merge_pending(
+                today_date, monthly_rollup, daily_rollup, daily_records, pending
+            )
+        return self.assemble_summary(today, monthly_rollup, target_acquisition, daily_rollup, daily_records)
+
+    @staticmethod
+    def merge_pending(today_date, monthly_rollup, daily_rollup, daily_records, pending):
+        """未書き込みの加算を当月・当日・日毎の集計行に合算（DBへの書き込み時と同じく負数を取り得ない指標は0を下限とする）"""
+        monthly_rollup = counter_values(monthly_rollup)
+        records = {record['date']: record for record in daily_records}
+        for day, deltas in pending.items():
+            before = counter_values(records.get(day, {}))
+            after = ingestion.add_deltas(before, deltas)
+            for field in COUNTER_FIELDS:
+                monthly_rollup[field] += after[field] - before[field]
+            records[day] = {'date': day, **after}
+            if day == today_date:
+                daily_rollup = after
+        return monthly_rollup, daily_rollup, [records[day] for day in sorted(records)]
+
+    def assemble_summary(self, today, monthly_rollup, target_acquisition, daily_rollup, daily_records):
+        """取得済みの集計行から月間・日次サマリーの各指標を計算（DBアクセスなし）"""
+        monthly_data = self.to_details(monthly_rollup, 'total')
+
+        # 各種比率と目標に対する進捗・月末予測（計算はanalyticsモジュールで一括実行）
+        monthly_results = {
+            **self.calculate_rates(monthly_rollup),
+            'details': monthly_data,
+            **analytics.pacing(
+                monthly_data['total_acquisition'],
+                monthly_data['total_catch'],
+                target_acquisition,
+                today,
+            ),
+        }
+
+        daily_data = self.to_details(daily_rollup, 'daily')
+        
+        # 日次サマリー結果の整形
+        daily_results = {
+            **self.calculate_rates(daily_rollup),
+            'details': daily_data
+        }
+
+        # 統合結果
+        results = {
+            'monthly': monthly_results,
+            'daily': daily_results,
+            'daily_records': daily_records
+        }
+        return results
+
+
+# 期間別サマリーAPI
+class SummaryRangeAPI(DateParamMixin, BaseSummaryAPI):
+    """
+    任意期間の営業実績を日・週・月単位で集計するAPI
+
+    GET: ?from=YYYY-MM-DD&to=YYYY-MM-DD&group_by=day|week|month&compare=true
+    各区間の合計と比率（MonthlySummaryAPIと同じ計算）を1回の集計クエリで返す
+    compare=true の場合、直前の同じ長さの期間と前年同期間の集計も併せて返す
+    """
+    GROUP_BY_KINDS = ('day', 'week', 'month')
+    MAX_BUCKETS = 366  # 1回に集計できる区間の数（日単位で約1年、週単位で約7年、月単位で約30年）
+
+    def get(self, request):
+        date_from = self.get_date_param('from')
+        date_to = self.get_date_param('to')
+        group_by = request.query_params.get('group_by', 'month')
+        compare = request.query_params.get('compare', '').lower() in ('1', 'true')
+
+        if date_from is None or date_to is None:
+            raise ValidationError({'error': 'from と to は必須です'})
+        if date_from > date_to:
+            raise ValidationError({'error': 'from は to 以前の日付を指定してください'})
+        if group_by not in self.GROUP_BY_KINDS:
+            raise ValidationError({'group_by': 'day / week / month のいずれかを指定してください'})
+        if count_buckets(date_from, date_to, group_by) > self.MAX_BUCKETS:
+            raise ValidationError({'error': f'集計区間の数が{self.MAX_BUCKETS}以内になるよう期間を指定してください'})
+        # 区間の終端（翌日）・比較対象の期間が日付の範囲（0001-01-01〜9999-12-31）に収まることを確認
+        periods = {}
+        try:
+            date_to + timedelta(days=1)
+            if compare:
+                span = date_to - date_from
+                previous_to = date_from - timedelta(days=1)
+                periods = {
+                    'previous': (previous_to - span, previous_to),
+                    'last_year': (shift_year(date_from, -1), shift_year(date_to, -1)),
+                }
+        except (OverflowError, ValueError):
+            raise ValidationError({'error': '集計・比較対象の期間が日付の範囲外です'})
+
+        with statement_timeout():
+            results = self.summarize_period(request.user, date_from, date_to, group_by)
+            if compare:
+                results['compare'] = {
+                    name: self.summarize_period(request.user, start, end, group_by)
+                    for name, (start, end) in periods.items()
+                }
+        return Response(results)
+
+    def summarize_period(self, user, date_from, date_to, group_by):
+        """期間内の区間ごとの合計・比率と期間全体の合計・比率を集計"""
+        if timeseries.enabled():
+            by_bucket = self.series_buckets(user, date_from, date_to, group_by)
+        else:
+            by_bucket = self.database_buckets(user, date_from, date_to, group_by)
+
+        # データのない区間も0で埋めて返す
+        buckets = []
+        total = dict.fromkeys(COUNTER_FIELDS, 0)
+        for bucket in iter_bucket_starts(date_from, date_to, group_by):
+            values = {field: by_bucket.get(bucket, {}).get(field) or 0 for field in COUNTER_FIELDS}
+            for field, value in values.items():
+                total[field] += value
+            buckets.append({'period_start': bucket, **self.calculate_rates(values), 'details': values})
+
+        return {
+            'from': date_from,
+            'to': date_to,
+            'group_by': group_by,
+            'total': {**self.calculate_rates(total), 'details': total},
+            'buckets': buckets,
+        }
+
+    def series_buckets(self, user, date_from, date_to, group_by):
+        """区間ごとの合計を時系列キャッシュの累積和から求める（区間あたり一定時間）"""
+        series = timeseries.store.get(user.pk)
+        starts = list(iter_bucket_starts(date_from, date_to, group_by))
+        ends = starts[1:] + [date_to + timedelta(days=1)]
+        return {
+            start: series.totals(max(start, date_from), min(end, date_to + timedelta(days=1)))
+            for start, end in zip(starts, ends)
+        }
+
+    def database_buckets(self, user, date_from, date_to, group_by):
+        """区間ごとの合計を日別集計テーブルから1回の集計クエリで求める"""
+        rows = DailyRollup.objects.for_user_range(
+            user, date_from, date_to + timedelta(days=1)
+        ).annotate(
+            bucket=Trunc('date', group_by, output_field=DateField())
+        ).values('bucket').annotate(
+            **{field: Sum(field) for field in COUNTER_FIELDS}
+        ).order_by('bucket')
+        by_bucket = {row.pop('bucket'): row for row in rows}
+
+        # アーカイブ済みの月の日別の値はアーカイブファイルから読み取って加算
+        for row in archive.iter_rows([user.pk], date_from, date_to + timedelta(days=1)):
+            values = by_bucket.setdefault(bucket_start(row['date'], group_by), {})
+            for field in COUNTER_FIELDS:
+                values[field] = (values.get(field) or 0) + row[field]
+        return by_bucket
+
+
+# チームランキングAPI
+class LeaderboardAPI(BaseSummaryAPI):
+    """
+    指定月の全ユーザーの順位を返すAPI
+
+    GET: ?year_month=YYYY-MM（省略時は当月）
+    獲得数・獲得率・目標進捗率（MonthlySummaryAPIのprogress_rateと同じ計算）それぞれの順位を
+    ウィンドウ関数による1クエリで集計し、月単位でキャッシュする
+    """
+    def get(self, request):
+        today = timezone.now()
+        year_month = request.query_params.get('year_month') or f"{today.year}-{today.month:02}"
+        if not re.match(r'^\d{4}-(0[1-9]|1[0-2])$', year_month):
+            raise ValidationError({'year_month': '年月はYYYY-MM形式で指定してください'})
+
+        return Response({
+            'year_month': year_month,
+            'rankings': leaderboard.get(year_month, today.date()),
+        })
+
+
+# サマリーキャッシュ統計API（管理者用）
+class SummaryCacheStatsAPI(APIView):
+    """月間サマリーキャッシュのヒット/ミス件数、時系列キャッシュの利用状況、サマリーの配信ストリームの接続数を返すAPI（ワーカープロセス単位）"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            **summary_cache.stats(),
+            'timeseries': timeseries.store.stats(),
+            'streams': events.broker().count(),
+        })
+
+
+# コネクションプール統計API（管理者用）
+class DatabasePoolStatsAPI(APIView):
+    """接続先ごとのコネクションプールの利用状況（空き待ち時間等）を返すAPI（ワーカープロセス単位）"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(pool_stats())
+
+
+# リクエスト計測API（管理者用）
+class RequestMetricsAPI(APIView):
+    """
+    ルート別の応答時間ヒストグラムを返すAPI（ワーカープロセス単位）
+    DELETEで集計をリセット
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'enabled': settings.REQUEST_METRICS_HISTOGRAMS,
+            'routes': histograms.snapshot(),
+        })
+
+    def delete(self, request):
+        histograms.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 # ログインユーザー情報API
 class CurrentUserAPI(APIView):
@@ -2,7 +2,9 @@
 # 環境設定、アプリケーション登録、セキュリティ設定などを管理
 
 from pathlib import Path
+import importlib.util
 import os
+import tempfile
 from dotenv import load_dotenv
 from datetime import timedelta
 import dj_database_url
@@ -39,6 +41,8 @@ INSTALLED_APPS = [
 
 # ミドルウェア設定
 MIDDLEWARE = [
+    'api.instrumentation.PerformanceMiddleware',  # 処理時間・SQL件数の計測（Server-Timingヘッダー、低速リクエストログ）
+    'api.profiling.ProfilingMiddleware',  # 指定リクエストのプロファイル取得（無効時は読み込まれない）
     'corsheaders.middleware.CorsMiddleware',  # CORS対応
     'django.middleware.security.SecurityMiddleware',  # セキュリティ対策
     'django.contrib.sessions.middleware.SessionMiddleware',  # セッション管理
@@ -88,9 +92,91 @@ else:
             'PASSWORD': os.getenv('DATABASE_PASSWORD'),  # DBパスワード
             'HOST': os.getenv('DATABASE_HOST'),  # DBホスト
             'PORT': os.getenv('DATABASE_PORT'),  # DBポート
+            'CONN_MAX_AGE': 600,  # 接続の再利用期間（秒）
         }
     }
 
+# コネクションプール設定（PostgreSQL + psycopg 3 使用時）
+DB_POOL_ENABLED = os.getenv('DB_POOL_ENABLED', 'True') == 'True'  # プールの使用有無
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))  # 常時確保する接続数
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))  # 最大接続数（ワーカープロセス単位）
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))  # 接続の空き待ちの上限（秒）
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000'))  # 全クエリ共通の実行時間上限（0で無制限）
+SUMMARY_STATEMENT_TIMEOUT_MS = int(os.getenv('SUMMARY_STATEMENT_TIMEOUT_MS', '5000'))  # 集計クエリの実行時間上限
+
+
+def _configure_database(config):
+    """
+    PostgreSQLの接続設定にプール・ヘルスチェック・statement_timeoutを適用
+    psycopg 3（psycopg_pool）がない場合やSQLiteの場合は永続接続＋ヘルスチェックで動作する
+    """
+    config['CONN_HEALTH_CHECKS'] = True  # 再利用前に接続の生存を確認（切断済み接続によるエラーを防止）
+    if config['ENGINE'] != 'django.db.backends.postgresql':
+        return config
+
+    options = config.setdefault('OPTIONS', {})
+    if DB_STATEMENT_TIMEOUT_MS:
+        options['options'] = f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
+    if DB_POOL_ENABLED and importlib.util.find_spec('psycopg') and importlib.util.find_spec('psycopg_pool'):
+        options['pool'] = {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+        }
+        config['CONN_MAX_AGE'] = 0  # プール使用時は永続接続を無効化（Djangoの制約）
+    return config
+
+
+# 読み取り専用レプリカ（設定時のみ、参照系APIの読み取りに使用）
+REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+if REPLICA_DATABASE_URL:
+    DATABASES['replica'] = dj_database_url.config(env='REPLICA_DATABASE_URL', conn_max_age=600)
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}  # テスト時はdefaultを参照
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))  # 書き込み後にプライマリから読み取る期間（秒）
+DATABASE_ROUTERS = ['api.routers.PrimaryReplicaRouter']
+
+# HomeDataの月別パーティション（PostgreSQLのみ、有効化後にmigrateで既存テーブルを変換）
+# 有効化前に0008を適用済みの場合は python manage.py migrate api 0007 の後に再度 migrate を実行する
+HOMEDATA_PARTITIONING = os.getenv('HOMEDATA_PARTITIONING', 'False') == 'True'
+HOMEDATA_PARTITIONS_AHEAD = int(os.getenv('HOMEDATA_PARTITIONS_AHEAD', '2'))  # 当月より先に作成しておくパーティションの月数
+
+# 過去月の営業データのアーカイブ（archive_monthsコマンド）
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive'))  # アーカイブファイルの保存先
+ARCHIVE_AFTER_MONTHS = int(os.getenv('ARCHIVE_AFTER_MONTHS', '12'))  # 当月よりこの月数以上前の月をアーカイブ対象とする
+
+DATABASES = {alias: _configure_database(config) for alias, config in DATABASES.items()}
+
+# キャッシュ設定
+# 既定はファイルキャッシュ（同一ホストの複数ワーカーで共有、Redis不要）
+# CACHE_BACKEND/CACHE_LOCATIONで変更可能（例: django.core.cache.backends.locmem.LocMemCache）
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'koruapokun_cache')),
+    }
+}
+SUMMARY_CACHE_TIMEOUT = int(os.environ.get('SUMMARY_CACHE_TIMEOUT', 300))  # サマリーキャッシュの有効期間（秒）
+
+# 時系列キャッシュ設定（プロセス内にユーザー別の日別指標と累積和を保持し、期間集計をDBを介さず行う）
+TIMESERIES_CACHE_ENABLED = os.getenv('TIMESERIES_CACHE_ENABLED', 'True') == 'True'  # サマリーAPIでの使用有無
+TIMESERIES_CACHE_MAX_BYTES = int(os.getenv('TIMESERIES_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))  # プロセスあたりのメモリ使用量の上限
+TIMESERIES_CACHE_MAX_AGE = int(os.getenv('TIMESERIES_CACHE_MAX_AGE', '300'))  # 再読み込みまでの最大保持期間（秒）
+
+# 書き込みバッファ設定（当日の指標への加算をプロセス内で合算し、まとめてDBへ書き込む。POSIX環境のみ）
+INGESTION_BUFFER_ENABLED = os.getenv('INGESTION_BUFFER_ENABLED', 'False') == 'True'  # 加算APIでの使用有無
+INGESTION_WAL_DIR = os.getenv('INGESTION_WAL_DIR', os.path.join(BASE_DIR, 'ingestion_wal'))  # WALファイルの保存先（同一ホストのワーカーで共有）
+INGESTION_FLUSH_INTERVAL = float(os.getenv('INGESTION_FLUSH_INTERVAL', '1.0'))  # DBへの書き込み間隔（秒）
+INGESTION_FLUSH_SIZE = int(os.getenv('INGESTION_FLUSH_SIZE', '500'))  # この件数の（ユーザー, 日付）が溜まったら間隔を待たずに書き込む
+INGESTION_WAL_FSYNC = os.getenv('INGESTION_WAL_FSYNC', 'False') == 'True'  # 追記ごとにfsyncする（OS障害時も保持。既定はプロセスの異常終了のみ対応）
+
+# サマリーの配信ストリーム設定（月間サマリーの変更をServer-Sent Eventsでダッシュボードへ送る。ASGIのみ）
+SUMMARY_EVENTS_BACKEND = os.getenv('SUMMARY_EVENTS_BACKEND', 'api.events.LocalBroker')  # 変更通知の配信方式（複数ワーカー構成では api.events.CacheVersionBroker）
+SUMMARY_EVENTS_POLL_INTERVAL = float(os.getenv('SUMMARY_EVENTS_POLL_INTERVAL', '2.0'))  # CacheVersionBrokerで他ワーカーの変更を確認する間隔（秒）
+SUMMARY_STREAM_HEARTBEAT = float(os.getenv('SUMMARY_STREAM_HEARTBEAT', '15'))  # 変更がない間に送るハートビートの間隔（秒）
+SUMMARY_STREAM_MAX_AGE = int(os.getenv('SUMMARY_STREAM_MAX_AGE', '3600'))  # 1接続の最大継続時間（秒、トークンの有効期限でも切断）
+SUMMARY_STREAM_MAX_PER_USER = int(os.getenv('SUMMARY_STREAM_MAX_PER_USER', '5'))  # ユーザーあたりの同時接続数の上限（ワーカープロセス単位）
+SUMMARY_STREAM_DEBOUNCE = float(os.getenv('SUMMARY_STREAM_DEBOUNCE', '0.2'))  # 変更通知から再集計までの待ち時間（秒、連続した変更を1回の送信にまとめる）
+
 # パスワードバリデーション設定
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -126,10 +212,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework設定
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',  # JWT認証使用
+        'api.authentication.CachedJWTAuthentication',  # JWT認証（クレームからユーザーを組み立て、DBアクセスなし）
     ),
+    'DEFAULT_THROTTLE_RATES': {
+        'auth_ip': os.getenv('AUTH_THROTTLE_IP_RATE', '20/min'),  # 認証APIの接続元IPごとの上限
+        'auth_username': os.getenv('AUTH_THROTTLE_USERNAME_RATE', '5/min'),  # 認証APIのユーザー名ごとの上限
+    },
+    # 接続元IPの判定に使うリバースプロキシの段数（X-Forwarded-Forの末尾からこの段数目を接続元とする）
+    # 既定はRenderのロードバランサー1段。プロキシを経由しない構成では0（REMOTE_ADDRを使用）
+    # 未設定（None）にするとクライアントが送ったX-Forwarded-For全体で識別され、IPごとの制限を回避できてしまう
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '1')),
 }
 
+# パスワードハッシュ計算の同時実行数（プロセス単位、未設定ならCPUコア数）
+AUTH_HASHING_CONCURRENCY = int(os.getenv('AUTH_HASHING_CONCURRENCY', '0')) or None
+
 # CORS設定
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  # フロントエンド開発サーバー
@@ -153,27 +250,66 @@ CORS_ALLOW_CREDENTIALS = True
 
 # JWT認証設定
 SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),  # アクセストークン有効期間
+    # アクセストークン有効期間（ユーザー名・管理者フラグのクレームはこの期間だけ信頼されるため短めにする）
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', '15'))),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),  # リフレッシュトークン有効期間
     'ROTATE_REFRESH_TOKENS': True,  # トークンローテーション有効
     'BLACKLIST_AFTER_ROTATION': True,  # ローテーション後の古いトークンを無効化
     'AUTH_HEADER_TYPES': ('Bearer',),  # 認証ヘッダータイプ
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),  # トークンクラス
-    'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',  # ユーザークラス
+    'TOKEN_USER_CLASS': 'api.authentication.ClaimsUser',  # ユーザークラス（トークンのクレームから生成）
+    'TOKEN_OBTAIN_SERIALIZER': 'api.serializers.ClaimsTokenObtainPairSerializer',  # ユーザー名等をアクセストークンのクレームに追加
+    'TOKEN_REFRESH_SERIALIZER': 'api.serializers.ClaimsTokenRefreshSerializer',  # 更新時にDBのユーザーからクレームを再設定
+    'TOKEN_VERIFY_SERIALIZER': 'api.serializers.CachedTokenVerifySerializer',  # 検証済みトークンのキャッシュを利用
     'SIGNING_KEY': SECRET_KEY,  # 署名キー
 }
 
+# 認証キャッシュ設定（プロセス内LRU）
+JWT_VERIFIED_TOKEN_CACHE_SIZE = 4096  # 検証済みトークンの保持件数
+JWT_USER_CACHE_SIZE = 1024  # ユーザーオブジェクトの保持件数
+JWT_USER_CACHE_TTL = 60  # ユーザーオブジェクトの保持期間（秒）
+
+# 性能計測設定
+SLOW_REQUEST_THRESHOLD_MS = int(os.getenv('SLOW_REQUEST_THRESHOLD_MS', '500'))  # 低速リクエストとしてログに記録する閾値（ミリ秒）
+REQUEST_METRICS_HISTOGRAMS = os.getenv('REQUEST_METRICS_HISTOGRAMS', 'True') == 'True'  # ルート別ヒストグラムの集計有無
+
+# プロファイル取得設定
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True') == 'True'  # X-Profileヘッダー・サンプリングによる取得の有効化
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))  # 自動取得するリクエストの割合（0で無効）
+PROFILE_SAMPLE_TRACEMALLOC = os.getenv('PROFILE_SAMPLE_TRACEMALLOC', 'False') == 'True'  # サンプリング時のメモリ割り当て取得
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'koruapokun_profiles'))  # 保存先
+PROFILE_MAX_CAPTURES = 200  # 保存件数の上限（超過分は古いものから削除）
+
 # ロギング設定
+# リクエスト処理スレッドはキューに積むのみで、JSON1行形式の出力は専用スレッドで行う
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG' if DEBUG else 'INFO')  # アプリケーション全体のログレベル
+DB_LOG_LEVEL = os.getenv('DB_LOG_LEVEL', 'WARNING')  # SQLログ（django.db.backends）のログレベル
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', 'django.db.backends=0.01')  # INFO以下を間引くロガーと出力割合
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # 出力待ちログの上限（超過分は破棄）
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'sampling': {
+            '()': 'api.logconfig.SamplingFilter',  # 大量に出力されるロガーの間引き
+            'rates': LOG_SAMPLE_RATES,
+        },
+    },
     'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',  # コンソール出力ハンドラー
+        'queue': {
+            '()': 'api.logconfig.QueueListenerHandler',  # キュー経由の非同期出力（JSON1行形式）
+            'maxsize': LOG_QUEUE_SIZE,
+            'filters': ['sampling'],
         },
     },
     'root': {
-        'handlers': ['console'],  # ルートロガーのハンドラー
-        'level': 'DEBUG',  # ログレベル
+        'handlers': ['queue'],  # ルートロガーのハンドラー
+        'level': LOG_LEVEL,  # ログレベル
+    },
+    'loggers': {
+        'django.db.backends': {
+            'level': DB_LOG_LEVEL,
+        },
     },
 }
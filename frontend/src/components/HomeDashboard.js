@@ -1,5 +1,5 @@
 "use client"; // クライアントサイドでのみ実行されるコンポーネントであることを示す
-import { useState, useEffect } from "react"; // 状態管理と副作用処理のためのフックをインポート
+import { useState, useEffect, useRef } from "react"; // 状態管理と副作用処理のためのフックをインポート
 import { 
   Box, 
   Container, 
@@ -190,6 +190,77 @@ const fetchData = async () => {
   // データ取得処理...
 };
 
+// 月間サマリーの配信ストリーム（Server-Sent Events）を読み取る
+// EventSourceではAuthorizationヘッダーを付けられないため、fetchのレスポンスを逐次解析する
+// 戻り値: 'closed'（サーバーが切断。アクセストークンの有効期限・最大継続時間による切断を含む）、
+//         'unauthorized'（401。アクセストークンの期限切れ）、'unsupported'（501。WSGIサーバー）、'error'（その他）
+const SUMMARY_STREAM_RETRY_MS = 5000;
+const SUMMARY_STREAM_MAX_FAILURES = 3; // 配信を受信できないまま続けて失敗した場合は定期取得に切り替える
+const SUMMARY_POLL_INTERVAL_MS = 30000; // 配信を利用できない場合の定期取得の間隔
+
+const streamMonthlySummary = async (onEvent, signal) => {
+  const response = await fetch(`${API_BASE_URL}/api/monthly-summary/stream/`, {
+    headers: {
+      'Accept': 'text/event-stream',
+      'Authorization': `Bearer ${localStorage.getItem('accessToken')}`
+    },
+    signal
+  });
+  if (response.status === 401) {
+    return 'unauthorized';
+  }
+  if (response.status === 501) {
+    return 'unsupported';
+  }
+  if (!response.ok || !response.body) {
+    return 'error';
+  }
+
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) {
+      return 'closed';
+    }
+    buffer += value;
+    // 空行区切りのイベントごとに処理（コメント行のハートビートは無視）
+    let index;
+    while ((index = buffer.indexOf('\n\n')) >= 0) {
+      const block = buffer.slice(0, index);
+      buffer = buffer.slice(index + 2);
+      let name = 'message';
+      let data = '';
+      block.split('\n').forEach((line) => {
+        if (line.startsWith('event: ')) name = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      });
+      if (data) {
+        onEvent(name, JSON.parse(data));
+      }
+    }
+  }
+};
+
+// 変更された項目のみを既存の値に反映（入れ子のオブジェクトは再帰的に反映）
+const mergeChanges = (current, changes) => {
+  const merged = { ...(current || {}) };
+  Object.entries(changes).forEach(([key, value]) => {
+    merged[key] = value && typeof value === 'object' && !Array.isArray(value)
+      ? mergeChanges(merged[key], value)
+      : value;
+  });
+  return merged;
+};
+
+// 日毎の集計行を日付単位で置き換え・削除
+const mergeDailyRecords = (records, changed = [], removed = []) => {
+  const byDate = new Map((records || []).filter((record) => record.date).map((record) => [record.date, record]));
+  removed.forEach((date) => byDate.delete(date));
+  changed.forEach((record) => byDate.set(record.date, record));
+  return [...byDate.values()].sort((a, b) => a.date.localeCompare(b.date));
+};
+
 const PerformanceIndicator = ({ label, value }) => (
   <Box sx={{ p: 2, border: '1px solid', borderColor: 'divider', borderRadius: 1, textAlign: 'center' }}>
     <Typography variant="subtitle2" gutterBottom>
@@ -563,7 +634,9 @@ export default function HomeDashboard() {
       if (response.ok) {
         // MonthlyTargetAPIの保存が成功した後に実行
         await fetchMonthlyTarget();  // 目標値を再取得
-        await fetchMonthlySummary(); // サマリーデータを再計算・取得
+        if (!summaryStreaming.current) {
+          await fetchMonthlySummary(); // サマリーデータを再計算・取得（配信中は変更分が届くため不要）
+        }
         
         setSnackbar({
           open: true,
@@ -607,8 +680,8 @@ export default function HomeDashboard() {
         }
       }
       
-      // データ取得処理を続行
-      const res = await fetch(`${API_BASE_URL}/api/daily-record/`, {
+      // データ取得処理を続行（グラフ表示用に当月分のみ取得）
+      const res = await fetch(`${API_BASE_URL}/api/daily-record/?date_from=${getCurrentYearMonth()}-01`, {
         headers: {
           'Authorization': `Bearer ${localStorage.getItem('accessToken')}`
         }
@@ -616,7 +689,7 @@ export default function HomeDashboard() {
       
       if (res.ok) {
         const data = await res.json();
-        setHomeData(data);
+        setHomeData(data.results);  // ページネーション形式（results/next）
       } else {
         console.error('ホームデータ取得エラー:', res.status, res.statusText);
       }
@@ -753,9 +826,11 @@ export default function HomeDashboard() {
       );
 
       if (response.ok) {
-        // 保存成功後に全てのデータを再取得
+        // 保存成功後に全てのデータを再取得（配信中はサマリーの変更分が届くため再取得しない）
         await fetchHomeData();
-        await fetchMonthlySummary();
+        if (!summaryStreaming.current) {
+          await fetchMonthlySummary();
+        }
         
         setSnackbar({
           open: true,
@@ -800,7 +875,7 @@ export default function HomeDashboard() {
       
       if (response.ok) {
         const data = await response.json();
-        return data.length > 0 ? data[0] : null;
+        return data.results.length > 0 ? data.results[0] : null;
       }
       return null;
     } catch (error) {
@@ -809,7 +884,7 @@ export default function HomeDashboard() {
     }
   };
 
-  const fetchMonthlySummary = async () => {
+  const fetchMonthlySummary = async (retried = false) => {
     try {
       const response = await fetch(`${API_BASE_URL}/api/monthly-summary/`, {
         headers: {
@@ -817,6 +892,11 @@ export default function HomeDashboard() {
         }
       });
 
+      // アクセストークンの期限切れ（定期取得中を含む）は更新して1回だけ取得し直す
+      if (response.status === 401 && !retried && await refreshToken()) {
+        return fetchMonthlySummary(true);
+      }
+
       if (!response.ok) {
         // データが存在しない場合は空のデータをセット
         if (response.status === 404) {
@@ -894,8 +974,79 @@ export default function HomeDashboard() {
     }
   };
 
+  // 月間サマリーの配信を購読し、初回は全体、以降は変更された指標のみを反映する
+  // アクセストークンの期限切れで切断・拒否された場合はトークンを更新して再接続する
+  // 配信を利用できない場合（501・接続の失敗が続く場合）は定期的に取得し、保存のたびにも再取得する
+  const summaryStreaming = useRef(false);
   useEffect(() => {
-    fetchMonthlySummary();
+    const controller = new AbortController();
+
+    const applySummaryEvent = (name, data) => {
+      if (name === 'summary') {
+        summaryStreaming.current = true;
+        setMonthlyPerformance(data.monthly);
+        setDailyPerformance(data.daily);
+        if (data.daily_records && data.daily_records.length > 0) {
+          setHomeData(data.daily_records);
+        }
+      } else if (name === 'delta') {
+        if (data.monthly) setMonthlyPerformance((prev) => mergeChanges(prev, data.monthly));
+        if (data.daily) setDailyPerformance((prev) => mergeChanges(prev, data.daily));
+        if (data.daily_records || data.removed_dates) {
+          setHomeData((prev) => mergeDailyRecords(prev, data.daily_records, data.removed_dates));
+        }
+      }
+    };
+
+    const wait = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+    // 配信を利用できない場合は一定間隔で取得し直す（保存時の再取得は各保存処理で行う）
+    const poll = async () => {
+      while (!controller.signal.aborted) {
+        await fetchMonthlySummary();
+        await wait(SUMMARY_POLL_INTERVAL_MS);
+      }
+    };
+
+    const subscribe = async () => {
+      let failures = 0;
+      while (!controller.signal.aborted) {
+        let result;
+        try {
+          result = await streamMonthlySummary(applySummaryEvent, controller.signal);
+        } catch (error) {
+          if (controller.signal.aborted) return;
+          console.error('サマリー配信エラー:', error.message);
+          result = 'error';
+        }
+        const wasStreaming = summaryStreaming.current;
+        summaryStreaming.current = false;
+        if (result === 'unsupported') {
+          poll();
+          return;
+        }
+        // 受信できていた接続の切断は失敗として数えない
+        failures = wasStreaming ? 0 : failures + 1;
+        if (failures >= SUMMARY_STREAM_MAX_FAILURES) {
+          console.error('サマリー配信に接続できないため定期取得に切り替えます');
+          poll();
+          return;
+        }
+        if (result === 'unauthorized') {
+          // 配信はアクセストークンの有効期限で切断されるため、再接続が拒否されたらトークンを更新して直ちに再接続する
+          if (!(await refreshToken())) {
+            poll();
+            return;
+          }
+          continue;
+        }
+        // 再接続時は全体（summary）から受信し直す
+        await wait(SUMMARY_STREAM_RETRY_MS);
+      }
+    };
+
+    subscribe();
+    return () => controller.abort();
   }, []);
 
   // ユーザー名取得
@@ -915,7 +1066,6 @@ export default function HomeDashboard() {
 
   useEffect(() => {
     fetchCurrentUser();
-    fetchMonthlySummary();
   }, []);
 
   // 月次目標の表示部分を修正